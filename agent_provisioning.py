@@ -0,0 +1,227 @@
+import argparse
+import csv
+import io
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from config import Config
+
+REQUIRED_FIELDS = (
+    'name',
+    'email',
+    'vicidial_user',
+    'vicidial_user_pass',
+    'vicidial_phone_login',
+    'vicidial_phone_pass'
+)
+
+
+class RateLimiter:
+    """Token bucket compartido entre hilos (peticiones por segundo)"""
+
+    def __init__(self, rate_per_second, burst=None):
+        self.rate = rate_per_second
+        self.capacity = burst or max(1, int(rate_per_second))
+        self.tokens = float(self.capacity)
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Esperar hasta que haya un token disponible"""
+        if not self.rate:
+            return
+
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                wait = (1 - self.tokens) / self.rate
+
+            time.sleep(wait)
+
+
+def parse_agents(content, filename=''):
+    """Leer agentes desde texto CSV o JSON"""
+    text = content.decode('utf-8-sig') if isinstance(content, bytes) else content
+    stripped = text.lstrip()
+
+    if filename.endswith('.json') or stripped.startswith('[') or stripped.startswith('{'):
+        data = json.loads(text)
+        return data.get('agents', []) if isinstance(data, dict) else data
+
+    reader = csv.DictReader(io.StringIO(text))
+    return [{key.strip(): (value or '').strip() for key, value in row.items() if key} for row in reader]
+
+
+def load_agents(path):
+    """Leer agentes desde archivo CSV o JSON"""
+    with open(path, 'rb') as f:
+        return parse_agents(f.read(), path)
+
+
+def validate_agent(agent_data):
+    """Validar campos obligatorios; devuelve mensaje de error o None"""
+    missing = [field for field in REQUIRED_FIELDS if not agent_data.get(field)]
+    if missing:
+        return f"Faltan campos: {', '.join(missing)}"
+    return None
+
+
+def is_success(response):
+    return bool(response) and 'SUCCESS' in response
+
+
+class BulkProvisioner:
+    """Alta masiva de agentes en Vicidial con concurrencia y rate limiting acotados"""
+
+    def __init__(self, vicidial_api, save_batch=None, max_workers=None,
+                 rate_per_second=None, batch_size=None):
+        self.vicidial_api = vicidial_api
+        self.save_batch = save_batch
+        self.max_workers = max_workers or Config.BULK_PROVISION_WORKERS
+        self.batch_size = batch_size or Config.BULK_PROVISION_BATCH_SIZE
+        rate = Config.BULK_PROVISION_RATE if rate_per_second is None else rate_per_second
+        self.rate_limiter = RateLimiter(rate)
+
+    def _provision_one(self, agent_data):
+        """Ejecutar add_user, add_phone y update_user para un agente"""
+        start = time.perf_counter()
+        result = {'vicidial_user': agent_data.get('vicidial_user'), 'email': agent_data.get('email')}
+
+        try:
+            responses = self.vicidial_api.create_agent_complete(agent_data, throttle=self.rate_limiter.acquire)
+            result.update(responses)
+
+            if is_success(responses['user_response']):
+                result['status'] = 'created'
+                if not is_success(responses['phone_response']) or not is_success(responses['update_response']):
+                    result['status'] = 'partial'
+            else:
+                result['status'] = 'failed'
+                result['error'] = responses['user_response'] or 'Sin respuesta de Vicidial'
+
+        except Exception as e:
+            result['status'] = 'failed'
+            result['error'] = str(e)
+
+        result['elapsed_ms'] = round((time.perf_counter() - start) * 1000, 1)
+        return result
+
+    def _flush(self, pending, results_by_user):
+        """Guardar un lote de usuarios locales en una sola transacción"""
+        if not pending or not self.save_batch:
+            pending.clear()
+            return
+
+        try:
+            self.save_batch(list(pending))
+        except Exception as e:
+            print(f"❌ Error guardando lote de {len(pending)} agentes: {e}")
+            for agent_data in pending:
+                results_by_user[agent_data['vicidial_user']]['local_error'] = str(e)
+
+        pending.clear()
+
+    def provision(self, agents, existing=None):
+        """Provisionar lista de agentes y devolver reporte por agente y throughput"""
+        start = time.perf_counter()
+        existing = existing or set()
+        results = []
+        to_create = []
+        seen = set()
+
+        # Validación previa: campos, duplicados en el archivo y usuarios ya existentes
+        for agent_data in agents:
+            error = validate_agent(agent_data)
+            key = agent_data.get('vicidial_user')
+
+            if not error and (key in seen or agent_data.get('email') in seen):
+                error = 'Duplicado en el archivo'
+            if not error and (key in existing or agent_data.get('email') in existing):
+                error = 'Ya existe un usuario con ese email o usuario Vicidial'
+
+            if error:
+                results.append({'vicidial_user': key, 'email': agent_data.get('email'),
+                                'status': 'skipped', 'error': error})
+                continue
+
+            seen.add(key)
+            seen.add(agent_data.get('email'))
+            to_create.append(agent_data)
+
+        agents_by_user = {agent_data['vicidial_user']: agent_data for agent_data in to_create}
+        results_by_user = {}
+        pending = []
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [executor.submit(self._provision_one, agent_data) for agent_data in to_create]
+
+            for future in as_completed(futures):
+                result = future.result()
+                results.append(result)
+                results_by_user[result['vicidial_user']] = result
+
+                # Solo se guardan localmente los agentes creados en Vicidial
+                if result['status'] in ('created', 'partial'):
+                    pending.append(agents_by_user[result['vicidial_user']])
+                    if len(pending) >= self.batch_size:
+                        self._flush(pending, results_by_user)
+
+        self._flush(pending, results_by_user)
+
+        elapsed = time.perf_counter() - start
+        summary = {status: len([r for r in results if r['status'] == status])
+                   for status in ('created', 'partial', 'failed', 'skipped')}
+
+        print(f"📦 Alta masiva: {len(to_create)} agentes en {elapsed:.1f}s {summary}")
+
+        return {
+            'total': len(agents),
+            'summary': summary,
+            'elapsed_seconds': round(elapsed, 2),
+            'agents_per_minute': round(len(to_create) / elapsed * 60, 1) if elapsed else 0.0,
+            'results': results
+        }
+
+
+# Uso por línea de comandos
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Alta masiva de agentes en Vicidial')
+    parser.add_argument('file', help='Archivo CSV o JSON con los agentes')
+    parser.add_argument('--workers', type=int, default=Config.BULK_PROVISION_WORKERS)
+    parser.add_argument('--rate', type=float, default=Config.BULK_PROVISION_RATE,
+                        help='Peticiones por segundo a non_agent_api.php (0 = sin límite)')
+    parser.add_argument('--batch-size', type=int, default=Config.BULK_PROVISION_BATCH_SIZE)
+    parser.add_argument('--output', help='Guardar reporte JSON en este archivo')
+    args = parser.parse_args()
+
+    from app import app, vicidial_api, find_existing_agents, save_agents_batch
+
+    agents = load_agents(args.file)
+    provisioner = BulkProvisioner(
+        vicidial_api,
+        save_batch=save_agents_batch,
+        max_workers=args.workers,
+        rate_per_second=args.rate,
+        batch_size=args.batch_size
+    )
+
+    with app.app_context():
+        report = provisioner.provision(agents, existing=find_existing_agents(agents))
+
+    for result in report['results']:
+        if result['status'] != 'created':
+            print(f"   {result['vicidial_user']}: {result['status']} {result.get('error', '')}")
+
+    print(f"📊 {report['summary']} en {report['elapsed_seconds']}s ({report['agents_per_minute']} agentes/min)")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
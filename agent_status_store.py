@@ -0,0 +1,129 @@
+import atexit
+import itertools
+import threading
+from sqlalchemy.orm.attributes import set_committed_value
+from config import Config
+
+STATUS_FIELDS = ('agent_status', 'is_logged_in_vicidial')
+
+
+class AgentStatusStore:
+    """Estado de agentes en memoria (autoritativo) con escritura diferida a la base local
+
+    Los cambios se aplican en memoria al instante y un hilo los escribe en lote
+    (una transacción cada flush_interval). Solo se descarta un cambio pendiente
+    si lo que se escribió es su versión más reciente, así un cambio hecho durante
+    el flush nunca queda pisado por uno anterior. Ante una caída se pierden como
+    mucho los cambios del último intervalo; sync_agent_status los recupera desde Vicidial.
+    """
+
+    def __init__(self, writer=None, flush_interval=None):
+        self.writer = writer
+        self.flush_interval = flush_interval or Config.AGENT_STATUS_FLUSH_INTERVAL
+        self._states = {}  # {user_id: {'agent_status', 'is_logged_in_vicidial'}}
+        self._dirty = {}   # {user_id: seq del último cambio sin escribir}
+        self._seq = itertools.count(1)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._listeners = []
+        self.stats = {'changes': 0, 'flushes': 0, 'rows_written': 0, 'flush_errors': 0}
+
+    def start(self):
+        """Iniciar el hilo de escritura (se llama solo con el primer cambio)"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='agent-status-flusher')
+            self._thread.daemon = True
+            self._thread.start()
+        atexit.register(self.stop)
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def stop(self):
+        """Detener el hilo y escribir lo pendiente (flush-on-shutdown)"""
+        self._stop.set()
+        self.flush()
+
+    def add_listener(self, callback):
+        """Registrar callback(user_id, state) que se llama en cada cambio"""
+        self._listeners.append(callback)
+
+    def set(self, user_id, agent_status=None, is_logged_in=None):
+        """Cambiar estado de un agente (inmediato en memoria, diferido en la base)"""
+        with self._lock:
+            state = self._states.setdefault(user_id, {})
+            if agent_status is not None:
+                state['agent_status'] = agent_status
+            if is_logged_in is not None:
+                state['is_logged_in_vicidial'] = is_logged_in
+            self._dirty[user_id] = next(self._seq)
+            self.stats['changes'] += 1
+            snapshot = dict(state)
+
+        if self.writer and self._thread is None:
+            self.start()
+
+        for callback in self._listeners:
+            try:
+                callback(user_id, snapshot)
+            except Exception as e:
+                print(f"⚠️ Error en listener de estado: {e}")
+
+    def get(self, user_id):
+        """Estado en memoria de un agente (None si no cambió desde el arranque)"""
+        with self._lock:
+            state = self._states.get(user_id)
+            return dict(state) if state else None
+
+    def current(self, user):
+        """Estado efectivo de un User: memoria si existe, si no lo guardado en la base"""
+        state = {field: getattr(user, field) for field in STATUS_FIELDS}
+        state.update(self.get(user.id) or {})
+        return state
+
+    def apply_to(self, users):
+        """Reflejar el estado en memoria en objetos User sin marcarlos como modificados"""
+        for user in users:
+            if user is None:
+                continue
+            for field, value in (self.get(user.id) or {}).items():
+                set_committed_value(user, field, value)
+        return users
+
+    def flush(self):
+        """Escribir en una sola transacción todos los cambios pendientes"""
+        if not self.writer:
+            return 0
+
+        with self._flush_lock:
+            with self._lock:
+                if not self._dirty:
+                    return 0
+                pending = sorted(self._dirty.items(), key=lambda item: item[1])
+                changes = [(user_id, dict(self._states[user_id])) for user_id, _ in pending]
+
+            try:
+                self.writer(changes)
+            except Exception as e:
+                with self._lock:
+                    self.stats['flush_errors'] += 1
+                print(f"❌ Error escribiendo {len(changes)} estados de agente: {e}")
+                return 0
+
+            with self._lock:
+                for user_id, seq in pending:
+                    if self._dirty.get(user_id) == seq:
+                        del self._dirty[user_id]
+                self.stats['flushes'] += 1
+                self.stats['rows_written'] += len(changes)
+
+            return len(changes)
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self.stats, pending=len(self._dirty), tracked=len(self._states))
@@ -0,0 +1,381 @@
+import heapq
+import json
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from config import Config
+from timeseries import ALL_CAMPAIGNS, LIVE_METRICS, snapshot_values
+
+# Métricas de antigüedad: la señal es el instante de inicio y el valor crece solo
+# (segundos de la llamada más vieja en cola por campaña, de pausa por agente)
+AGE_METRICS = ('oldest_wait', 'paused_seconds')
+ANY_SCOPE = '*'
+
+OK, PENDING, FIRING, RESOLVING = 'ok', 'pending', 'firing', 'resolving'
+
+
+class Rule:
+    """Umbral sobre una métrica en vivo, con histéresis
+
+    op '>': se activa con valor > threshold y se resuelve con valor <= clear.
+    op '<': se activa con valor < threshold y se resuelve con valor >= clear.
+    scope: campaña, agente, 'all' (total) o '*' (cada campaña/agente por separado).
+    for_seconds / clear_seconds: tiempo que la condición debe mantenerse antes
+    de activar / resolver.
+    """
+
+    def __init__(self, name, metric, threshold, op='>', clear=None, scope=ANY_SCOPE, for_seconds=0,
+                 clear_seconds=0, severity='warning', message=None):
+        if metric not in LIVE_METRICS + AGE_METRICS:
+            raise ValueError(f'Métrica desconocida en regla {name}: {metric}')
+        if op not in ('>', '<'):
+            raise ValueError(f'Operador inválido en regla {name}: {op}')
+        self.name = name
+        self.metric = metric
+        self.threshold = float(threshold)
+        self.op = op
+        self.clear = self.threshold if clear is None else float(clear)
+        self.scope = scope
+        self.for_seconds = float(for_seconds)
+        self.clear_seconds = float(clear_seconds)
+        self.severity = severity
+        self.message = message or '{scope}: {metric} = {value:g} (umbral {threshold:g})'
+
+    def triggered(self, value):
+        return value > self.threshold if self.op == '>' else value < self.threshold
+
+    def cleared(self, value):
+        return value <= self.clear if self.op == '>' else value >= self.clear
+
+    def to_dict(self):
+        return {'name': self.name, 'metric': self.metric, 'op': self.op, 'threshold': self.threshold,
+                'clear': self.clear, 'scope': self.scope, 'for_seconds': self.for_seconds,
+                'clear_seconds': self.clear_seconds, 'severity': self.severity}
+
+
+def default_rules():
+    """Reglas de Config.ALERT_*; ALERT_RULES_FILE (lista JSON de reglas) las reemplaza"""
+    if Config.ALERT_RULES_FILE:
+        with open(Config.ALERT_RULES_FILE) as f:
+            return [Rule(**rule) for rule in json.load(f)]
+
+    return [
+        Rule('queue_depth', 'queue_depth', Config.ALERT_QUEUE_DEPTH, clear=Config.ALERT_QUEUE_DEPTH_CLEAR,
+             for_seconds=Config.ALERT_FOR_SECONDS, severity='critical',
+             message='{scope}: {value:g} llamadas en cola (máximo {threshold:g})'),
+        Rule('oldest_wait', 'oldest_wait', Config.ALERT_OLDEST_WAIT, clear=Config.ALERT_OLDEST_WAIT_CLEAR,
+             severity='critical', message='{scope}: llamada esperando {value:.0f} s (máximo {threshold:g} s)'),
+        Rule('min_ready', 'available_agents', Config.ALERT_MIN_READY, op='<', clear=Config.ALERT_MIN_READY_CLEAR,
+             scope=ALL_CAMPAIGNS, for_seconds=Config.ALERT_FOR_SECONDS,
+             message='Solo {value:g} agentes disponibles (mínimo {threshold:g})'),
+        Rule('long_pause', 'paused_seconds', Config.ALERT_MAX_PAUSE, severity='info',
+             message='Agente {scope} en pausa hace {value:.0f} s (máximo {threshold:g} s)'),
+    ]
+
+
+class AlertState:
+    __slots__ = ('state', 'due', 'value', 'peak', 'started_at')
+
+    def __init__(self):
+        self.state = OK
+        self.due = None
+        self.value = 0.0
+        self.peak = 0.0
+        self.started_at = None
+
+
+class AlertEngine:
+    """Evaluación incremental de reglas sobre el estado en vivo
+
+    update() recibe las señales ya calculadas de la última foto del monitor (sin
+    consultar la BD) y solo evalúa las reglas de las señales que cambiaron: el
+    costo depende de lo que cambió, no de cuántas reglas hay. Los vencimientos
+    (for_seconds, clear_seconds y el instante en que una antigüedad cruza el
+    umbral) van a un heap que atiende el hilo de run().
+
+    notify(alert) se llama al activarse y al resolverse cada alerta.
+    """
+
+    def __init__(self, notify=None, rules=None, history_size=100):
+        self.notify = notify
+        self.rules = list(rules) if rules is not None else default_rules()
+        self._by_scope = {}  # {(métrica, scope): [índices de reglas]}
+        self._any_scope = {}  # {métrica: [índices de reglas con scope '*']}
+        for index, rule in enumerate(self.rules):
+            if rule.scope == ANY_SCOPE:
+                self._any_scope.setdefault(rule.metric, []).append(index)
+            else:
+                self._by_scope.setdefault((rule.metric, rule.scope), []).append(index)
+
+        self._gauges = {}  # {(métrica, scope): valor}
+        self._since = {}  # {(métrica, scope): epoch de inicio}
+        self._states = {}  # {(regla, scope): AlertState}, solo las que no están en OK
+        self._heap = []  # (epoch, regla, scope)
+        self._scheduled = {}  # {(regla, scope): epoch del vencimiento vigente}
+        self._history = deque(maxlen=history_size)
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self.counters = {'updates': 0, 'changed_signals': 0, 'evaluations': 0, 'fired': 0, 'resolved': 0}
+
+    # Entrada
+
+    def update(self, gauges, ages, now=None):
+        """Aplicar una foto: gauges {(métrica, scope): valor}, ages {(métrica, scope): epoch de inicio}
+
+        Las señales conocidas que no vienen en la foto pasan a 0 (campaña sin
+        cola, agente que dejó la pausa).
+        """
+        now = now or time.time()
+        alerts = []
+        with self._lock:
+            self.counters['updates'] += 1
+            changed = [key for key in self._gauges.keys() - gauges.keys() if self._gauges.pop(key)]
+            changed += list(self._since.keys() - ages.keys())
+            for key in changed:
+                self._since.pop(key, None)
+            for key, value in gauges.items():
+                value = float(value)
+                # Una clave nueva se evalúa aunque valga 0 (p. ej. min_ready al arrancar sin agentes)
+                if self._gauges.get(key) != value:
+                    self._gauges[key] = value
+                    changed.append(key)
+            for key, since in ages.items():
+                if self._since.get(key) != since:
+                    self._since[key] = since
+                    changed.append(key)
+
+            self.counters['changed_signals'] += len(changed)
+            for metric, scope in changed:
+                for index in self._rules_for(metric, scope):
+                    self._evaluate(index, scope, now, alerts)
+
+        self._wakeup.set()
+        self._send(alerts)
+
+    def _rules_for(self, metric, scope):
+        indexes = self._by_scope.get((metric, scope), [])
+        if scope != ALL_CAMPAIGNS and metric in self._any_scope:
+            indexes = indexes + self._any_scope[metric]
+        return indexes
+
+    def _value(self, metric, scope, now):
+        if metric in AGE_METRICS:
+            since = self._since.get((metric, scope))
+            return max(now - since, 0.0) if since is not None else 0.0
+        return self._gauges.get((metric, scope), 0.0)
+
+    # Máquina de estados: ok -> pending -> firing -> resolving -> ok
+
+    def _evaluate(self, index, scope, now, alerts):
+        self.counters['evaluations'] += 1
+        rule = self.rules[index]
+        key = (index, scope)
+        value = self._value(rule.metric, scope, now)
+        entry = self._states.get(key)
+
+        if entry is None:
+            if not rule.triggered(value):
+                self._schedule_crossing(index, scope, rule, now)
+                return
+            entry = self._states[key] = AlertState()
+
+        entry.value = value
+        entry.peak = max(entry.peak, value) if rule.op == '>' else min(entry.peak, value)
+        state = entry.state
+
+        if state == OK:
+            if rule.for_seconds > 0:
+                entry.state, entry.due = PENDING, now + rule.for_seconds
+            else:
+                self._fire(index, scope, entry, now, alerts)
+        elif state == PENDING:
+            if not rule.triggered(value):
+                del self._states[key]
+                self._schedule_crossing(index, scope, rule, now)
+                return
+            if now >= entry.due:
+                self._fire(index, scope, entry, now, alerts)
+        elif state == FIRING:
+            if rule.cleared(value):
+                if rule.clear_seconds > 0:
+                    entry.state, entry.due = RESOLVING, now + rule.clear_seconds
+                else:
+                    self._resolve(index, scope, entry, now, alerts)
+                    return
+        elif state == RESOLVING:
+            if not rule.cleared(value):
+                entry.state, entry.due = FIRING, None
+            elif now >= entry.due:
+                self._resolve(index, scope, entry, now, alerts)
+                return
+
+        if entry.state in (PENDING, RESOLVING):
+            self._schedule(key, entry.due)
+        else:
+            self._schedule_crossing(index, scope, rule, now)
+
+    def _schedule_crossing(self, index, scope, rule, now):
+        """Las antigüedades cambian sin eventos: agendar cuándo cruzan threshold o clear"""
+        if rule.metric not in AGE_METRICS:
+            return
+        since = self._since.get((rule.metric, scope))
+        if since is None:
+            return
+        upcoming = [when for when in (since + rule.threshold, since + rule.clear) if when > now]
+        if upcoming:
+            # el cruce exacto no dispara la regla (> estricto): revisar apenas después
+            self._schedule((index, scope), min(upcoming) + 0.001)
+
+    def _schedule(self, key, when):
+        if self._scheduled.get(key) == when:
+            return
+        self._scheduled[key] = when
+        heapq.heappush(self._heap, (when, key))
+
+    def _fire(self, index, scope, entry, now, alerts):
+        entry.state, entry.due, entry.started_at = FIRING, None, now
+        entry.peak = entry.value
+        self.counters['fired'] += 1
+        alerts.append(self._alert(index, scope, entry, now, FIRING))
+
+    def _resolve(self, index, scope, entry, now, alerts):
+        del self._states[(index, scope)]
+        self.counters['resolved'] += 1
+        alerts.append(self._alert(index, scope, entry, now, 'resolved'))
+        self._schedule_crossing(index, scope, self.rules[index], now)
+
+    def _alert(self, index, scope, entry, now, state):
+        rule = self.rules[index]
+        alert = {
+            'id': f'{rule.name}:{scope}',
+            'rule': rule.name,
+            'metric': rule.metric,
+            'scope': scope,
+            'severity': rule.severity,
+            'state': state,
+            'value': round(entry.value, 1),
+            'peak': round(entry.peak, 1),
+            'threshold': rule.threshold,
+            'message': rule.message.format(scope=scope, metric=rule.metric, value=entry.value,
+                                           threshold=rule.threshold),
+            'started_at': datetime.fromtimestamp(entry.started_at).strftime('%Y-%m-%d %H:%M:%S'),
+            'at': datetime.fromtimestamp(now).strftime('%Y-%m-%d %H:%M:%S')
+        }
+        self._history.append(alert)
+        return alert
+
+    def _send(self, alerts):
+        for alert in alerts:
+            icon = '🚨' if alert['state'] == FIRING else '✅'
+            print(f"{icon} Alerta {alert['state']}: {alert['message']}")
+            if self.notify is None:
+                continue
+            try:
+                self.notify(alert)
+            except Exception as e:
+                print(f"⚠️ Error notificando alerta {alert['id']}: {e}")
+
+    # Vencimientos
+
+    def process_due(self, now=None):
+        """Evaluar las reglas con vencimiento <= now; devuelve el próximo vencimiento o None"""
+        now = now or time.time()
+        alerts = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                when, key = heapq.heappop(self._heap)
+                if self._scheduled.get(key) != when:
+                    continue  # reemplazado por otro vencimiento
+                del self._scheduled[key]
+                self._evaluate(key[0], key[1], now, alerts)
+            next_due = self._heap[0][0] if self._heap else None
+        self._send(alerts)
+        return next_due
+
+    def run(self, stop_event=None):
+        """Atender vencimientos hasta que stop_event se active; update() despierta el hilo"""
+        while not (stop_event and stop_event.is_set()):
+            next_due = self.process_due()
+            timeout = None if next_due is None else max(next_due - time.time(), 0)
+            self._wakeup.wait(timeout)
+            self._wakeup.clear()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.run, name='alert-engine')
+            self._thread.daemon = True
+            self._thread.start()
+        return self
+
+    # Consulta
+
+    def active(self):
+        """Alertas activas (firing o resolviendo), las más graves primero"""
+        now = time.time()
+        with self._lock:
+            result = [self._alert_view(index, scope, entry, now)
+                      for (index, scope), entry in self._states.items() if entry.state in (FIRING, RESOLVING)]
+        order = {'critical': 0, 'warning': 1, 'info': 2}
+        return sorted(result, key=lambda alert: (order.get(alert['severity'], 3), alert['started_at']))
+
+    def _alert_view(self, index, scope, entry, now):
+        rule = self.rules[index]
+        value = self._value(rule.metric, scope, now)
+        return {
+            'id': f'{rule.name}:{scope}',
+            'rule': rule.name,
+            'metric': rule.metric,
+            'scope': scope,
+            'severity': rule.severity,
+            'state': entry.state,
+            'value': round(value, 1),
+            'threshold': rule.threshold,
+            'message': rule.message.format(scope=scope, metric=rule.metric, value=value, threshold=rule.threshold),
+            'started_at': datetime.fromtimestamp(entry.started_at).strftime('%Y-%m-%d %H:%M:%S')
+        }
+
+    def history(self):
+        with self._lock:
+            return list(self._history)
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self.counters, rules=len(self.rules), signals=len(self._gauges) + len(self._since),
+                        tracked=len(self._states), scheduled=len(self._scheduled))
+
+
+def _epoch(value):
+    """Epoch calculado en MySQL (UNIX_TIMESTAMP usa la zona horaria de la BD); None si no sirve
+
+    Una fecha cero da 0 y se descarta sin frenar el resto de la foto.
+    """
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if value > 0 else None
+
+
+def snapshot_signals(snapshot):
+    """Señales de alerta a partir de una foto de AdaptiveMonitor: (gauges, ages)"""
+    gauges = snapshot_values(snapshot)
+    ages = {}
+
+    for call in snapshot['calls']:
+        if call.get('status') != 'QUEUE':
+            continue
+        since = _epoch(call.get('start_epoch'))
+        if since is None:
+            continue
+        for key in (('oldest_wait', call.get('campaign_id') or ''), ('oldest_wait', ALL_CAMPAIGNS)):
+            ages[key] = min(ages.get(key, since), since)
+
+    for agent in snapshot['agents']:
+        if agent.get('status') == 'PAUSED':
+            since = _epoch(agent.get('last_state_epoch'))
+            if since is not None:
+                ages[('paused_seconds', agent.get('user'))] = since
+
+    return gauges, ages
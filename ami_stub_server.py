@@ -0,0 +1,216 @@
+import argparse
+import random
+import socketserver
+import threading
+import time
+
+
+class AMIStubServer:
+    """Servidor TCP local que emula el AMI de Asterisk para pruebas de carga
+
+    Responde Login, Ping, MeetmeList (siempre sin conferencias), Originate y el
+    resto de acciones con 'Response: Success' devolviendo el ActionID.
+    Con event_rate > 0 genera llamadas simuladas (Newchannel y, call_seconds
+    después, Hangup) hacia las extensiones de `extensions`.
+
+    latency_ms / jitter_ms: latencia simulada por acción
+    """
+
+    def __init__(self, host='127.0.0.1', port=5039, username='cron', secret='1234',
+                 latency_ms=0, jitter_ms=0, event_rate=0.0, call_seconds=20, extensions=None):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.secret = secret
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.event_rate = event_rate
+        self.call_seconds = call_seconds
+        self.extensions = list(extensions or [])
+        self.server = None
+        self.thread = None
+        self._clients = set()
+        self._lock = threading.Lock()
+        self._running = False
+        self._sequence = 0
+        self.counters = {'connections': 0, 'actions': 0, 'events': 0, 'failed_logins': 0}
+
+    def start(self):
+        """Iniciar servidor (y generador de eventos) en hilos en segundo plano"""
+        stub = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                stub._serve_client(self)
+
+        self.server = socketserver.ThreadingTCPServer((self.host, self.port), Handler)
+        self.server.daemon_threads = True
+        self.server.allow_reuse_address = True
+        self.port = self.server.server_address[1]
+        self._running = True
+
+        self.thread = threading.Thread(target=self.server.serve_forever, name='ami-stub')
+        self.thread.daemon = True
+        self.thread.start()
+
+        if self.event_rate > 0:
+            generator = threading.Thread(target=self._generate_calls, name='ami-stub-events')
+            generator.daemon = True
+            generator.start()
+
+        print(f"🧪 AMI simulado escuchando en {self.host}:{self.port}")
+        return self
+
+    def stop(self):
+        self._running = False
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+    # Protocolo
+
+    def _serve_client(self, handler):
+        with self._lock:
+            self.counters['connections'] += 1
+        handler.write_lock = threading.Lock()  # respuestas y eventos no se intercalan
+        self._write(handler, 'Asterisk Call Manager/1.1\r\n')
+        logged_in = False
+
+        try:
+            while self._running:
+                message = self._read_message(handler.rfile)
+                if message is None:
+                    break
+
+                action = message.get('Action', '').lower()
+                response = self._dispatch(action, message, logged_in)
+                if action == 'login' and response.get('Response') == 'Success':
+                    logged_in = True
+                    with self._lock:
+                        self._clients.add(handler)
+
+                if 'ActionID' in message:
+                    response['ActionID'] = message['ActionID']
+                self._send(handler, response)
+
+                if action == 'logoff':
+                    break
+        finally:
+            with self._lock:
+                self._clients.discard(handler)
+
+    def _read_message(self, rfile):
+        message = {}
+        while True:
+            line = rfile.readline()
+            if not line:
+                return None
+            line = line.decode('utf-8', 'replace').rstrip('\r\n')
+            if not line:
+                if message:
+                    return message
+                continue
+            key, _, value = line.partition(':')
+            message[key.strip()] = value.strip()
+
+    def _dispatch(self, action, message, logged_in):
+        with self._lock:
+            self.counters['actions'] += 1
+
+        delay = self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)
+        if delay > 0:
+            time.sleep(delay / 1000)
+
+        if action == 'login':
+            if message.get('Username') == self.username and message.get('Secret') == self.secret:
+                return {'Response': 'Success', 'Message': 'Authentication accepted'}
+            with self._lock:
+                self.counters['failed_logins'] += 1
+            return {'Response': 'Error', 'Message': 'Authentication failed'}
+        if not logged_in:
+            return {'Response': 'Error', 'Message': 'Permission denied'}
+        if action == 'logoff':
+            return {'Response': 'Goodbye', 'Message': 'Thanks for all the fish.'}
+        if action == 'ping':
+            return {'Response': 'Success', 'Ping': 'Pong', 'Timestamp': f'{time.time():.6f}'}
+        if action == 'meetmelist':
+            return {'Response': 'Error', 'Message': 'No active conferences.'}
+        if action == 'originate':
+            return {'Response': 'Success', 'Message': 'Originate successfully queued'}
+        return {'Response': 'Success', 'Message': f"{message.get('Action', '')} accepted"}
+
+    def _send(self, handler, fields):
+        payload = ''.join(f'{key}: {value}\r\n' for key, value in fields.items()) + '\r\n'
+        self._write(handler, payload)
+
+    def _write(self, handler, payload):
+        try:
+            with handler.write_lock:
+                handler.wfile.write(payload.encode('utf-8'))
+                handler.wfile.flush()
+        except OSError:
+            with self._lock:
+                self._clients.discard(handler)
+
+    # Eventos
+
+    def emit_event(self, fields):
+        """Enviar un evento a todos los clientes autenticados"""
+        with self._lock:
+            clients = list(self._clients)
+            self.counters['events'] += 1
+        for handler in clients:
+            self._send(handler, fields)
+
+    def simulate_call(self, extension, phone_number=None):
+        """Newchannel hacia SIP/<extension> y su Hangup tras call_seconds"""
+        with self._lock:
+            self._sequence += 1
+            sequence = self._sequence
+        uniqueid = f'{time.time():.0f}.{sequence}'
+        channel = f'SIP/{extension}-{sequence:08x}'
+        phone_number = phone_number or f'9{random.randint(10000000, 99999999)}'
+
+        self.emit_event({'Event': 'Newchannel', 'Privilege': 'call,all', 'Channel': channel,
+                         'ChannelState': '4', 'ChannelStateDesc': 'Ring', 'CallerIDNum': phone_number,
+                         'CallerIDName': '', 'Exten': str(extension), 'Context': 'default',
+                         'Uniqueid': uniqueid})
+
+        timer = threading.Timer(self.call_seconds, self.emit_event, args=({
+            'Event': 'Hangup', 'Privilege': 'call,all', 'Channel': channel, 'Uniqueid': uniqueid,
+            'CallerIDNum': phone_number, 'Cause': '16', 'Cause-txt': 'Normal Clearing'},))
+        timer.daemon = True
+        timer.start()
+        return uniqueid
+
+    def _generate_calls(self):
+        while self._running:
+            time.sleep(random.expovariate(self.event_rate))
+            if self.extensions and self._clients:
+                self.simulate_call(random.choice(self.extensions))
+
+
+# Uso por línea de comandos
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Servidor local que emula el AMI de Asterisk')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5039)
+    parser.add_argument('--username', default='cron')
+    parser.add_argument('--secret', default='1234')
+    parser.add_argument('--latency-ms', type=float, default=5)
+    parser.add_argument('--jitter-ms', type=float, default=2)
+    parser.add_argument('--event-rate', type=float, default=0.0, help='Llamadas simuladas por segundo')
+    parser.add_argument('--call-seconds', type=float, default=20)
+    parser.add_argument('--extensions', nargs='*', default=[], help='Extensiones destino de las llamadas')
+    args = parser.parse_args()
+
+    server = AMIStubServer(args.host, args.port, args.username, args.secret, args.latency_ms,
+                           args.jitter_ms, args.event_rate, args.call_seconds, args.extensions).start()
+    print(f"   Exporta VICIDIAL_AMI_HOST={server.host} VICIDIAL_AMI_PORT={server.port} "
+          f"para apuntar el CRM aquí. Ctrl+C para salir...")
+
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
@@ -1,12 +1,31 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for, flash, session
+from flask import Flask, render_template, request, jsonify, redirect, url_for, flash, session, g
 from flask_sqlalchemy import SQLAlchemy
 from flask_socketio import SocketIO, emit, join_room, leave_room
 from datetime import datetime
 import json
-import pymysql
 import threading
+import time
 from config import Config
+from agent_provisioning import BulkProvisioner, parse_agents
+from alerts import AlertEngine, snapshot_signals
+from agent_status_store import AgentStatusStore
+from call_monitor import AdaptiveMonitor, VicidialCallMonitor
+from cache import SingleFlight
+from circuit_breaker import get_all_states
+from jobs import JobRunner, Parallel, Step
+from lead_lookup import LeadLookup
+from local_db import apply_migrations, engine_options
+from metrics import HTTP_REQUEST_SECONDS, SOCKETIO_EMITS, registry, room_label
+from profiler import profiler
+from timeseries import TimeSeriesStore, snapshot_values
+from tracing import traced, tracer
+from startup import StartupManager
+from reporting import service_level_reports
+from row_serializer import json_response, row_to_list, rows_to_dicts, rows_to_lists
+from state_versions import conditional_json, state_versions
 from vicidial_api import VicidialAPI
+from vicidial_api_async import run_fan_out
+from vicidial_db import get_vicidial_connection, vicidial_pool
 from vicidial_ami import VicidialAMI
 from vicidial_realtime import VicidialRealtime
 
@@ -14,17 +33,177 @@ app = Flask(__name__)
 app.config.from_object(Config)
 
 # Configurar SQLAlchemy
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///crm_test.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = Config.LOCAL_DATABASE_URI
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options()
 db = SQLAlchemy(app)
 
+class InstrumentedSocketIO(SocketIO):
+    """SocketIO que cuenta los eventos emitidos por sala (incluye emit() dentro de handlers)"""
+
+    def emit(self, event, *args, **kwargs):
+        SOCKETIO_EMITS.inc(event, room_label(kwargs.get('to') or kwargs.get('room')))
+        return super().emit(event, *args, **kwargs)
+
+
 # Configurar SocketIO
-socketio = SocketIO(app, cors_allowed_origins="*")
+socketio = InstrumentedSocketIO(app, cors_allowed_origins="*")
+
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+def record_request_latency(response):
+    start = g.pop('request_start', None)
+    if start is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, route, request.method, str(response.status_code))
+    return response
+
+
+@app.before_request
+def start_trace():
+    rule = request.url_rule.rule if request.url_rule else 'unmatched'
+    span = tracer.trace(f'{request.method} {rule}', path=request.path)
+    g.trace_span = span.__enter__()
+
+
+@app.after_request
+def add_trace_header(response):
+    trace_id = tracer.current_trace_id()
+    if trace_id:
+        response.headers['X-Trace-Id'] = trace_id
+    return response
+
+
+@app.teardown_request
+def end_trace(exception=None):
+    span = g.pop('trace_span', None)
+    if span is not None:
+        span.__exit__(type(exception) if exception else None, exception, None)
+
+
+@app.route('/admin/traces')
+def admin_traces():
+    """Trazas más lentas (?name=POST /vicidial_agent_login, ?limit=)"""
+    if not admin_allowed():
+        return jsonify({'success': False, 'message': 'No autorizado'}), 403
+
+    traces = tracer.memory.slowest(request.args.get('name'), request.args.get('limit', 20, type=int))
+    summaries = []
+    for trace in traces:
+        summary = trace.to_dict()
+        spans = summary.pop('spans')
+        summary['span_count'] = len(spans)
+        summary['slowest_spans'] = sorted(
+            (span for span in spans if span['parent_id']), key=lambda span: span['duration_ms'] or 0, reverse=True
+        )[:5]
+        summaries.append(summary)
+
+    return jsonify({'success': True, 'traces': summaries})
+
+
+@app.route('/admin/traces/<trace_id>')
+def admin_trace(trace_id):
+    """Todos los spans de una traza"""
+    if not admin_allowed():
+        return jsonify({'success': False, 'message': 'No autorizado'}), 403
+
+    trace = tracer.memory.get(trace_id)
+    if not trace:
+        return jsonify({'success': False, 'message': 'Traza no encontrada'}), 404
+
+    return jsonify({'success': True, 'trace': trace.to_dict()})
+
+
+@app.before_request
+def start_profiling():
+    if profiler.enabled:
+        g.profile_token = profiler.begin(f"route:{request.url_rule.rule if request.url_rule else 'unmatched'}")
+
+
+@app.teardown_request
+def stop_profiling(exception=None):
+    profiler.end(g.pop('profile_token', None))
+
+
+def admin_allowed():
+    """ADMIN_TOKEN en la cabecera X-Admin-Token; sin token configurado solo desde localhost"""
+    if Config.ADMIN_TOKEN:
+        return request.headers.get('X-Admin-Token') == Config.ADMIN_TOKEN
+    return request.remote_addr in ('127.0.0.1', '::1')
+
+
+@app.route('/admin/profiler', methods=['GET', 'POST'])
+def admin_profiler():
+    """Ver o cambiar el profiler (POST {enabled, mode, sample_rate, interval})"""
+    if not admin_allowed():
+        return jsonify({'success': False, 'message': 'No autorizado'}), 403
+
+    try:
+        if request.method == 'POST':
+            data = request.get_json() or {}
+            if data.get('reset'):
+                profiler.reset()
+            profiler.configure(
+                enabled=data.get('enabled'),
+                mode=data.get('mode'),
+                sample_rate=data.get('sample_rate'),
+                interval=data.get('interval')
+            )
+
+        limit = request.args.get('limit', 20, type=int)
+        return jsonify({
+            'success': True,
+            'profiler': profiler.get_state(),
+            'top_functions': profiler.top_functions(request.args.get('scope'), limit),
+            'top_stacks': profiler.top_stacks(limit)
+        })
+
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)})
+
+
+@app.route('/admin/profiler/pstats')
+def admin_profiler_pstats():
+    """Descargar datos cProfile (?scope=route:/...) para pstats/snakeviz"""
+    if not admin_allowed():
+        return jsonify({'success': False, 'message': 'No autorizado'}), 403
+
+    data = profiler.pstats_bytes(request.args.get('scope'))
+    if data is None:
+        return jsonify({'success': False, 'message': 'Sin datos (usar modo cprofile)'}), 404
+
+    response = app.response_class(data, mimetype='application/octet-stream')
+    response.headers['Content-Disposition'] = 'attachment; filename=crm.pstats'
+    return response
+
+
+@app.route('/admin/profiler/flamegraph')
+def admin_profiler_flamegraph():
+    """Descargar pilas en formato folded (flamegraph.pl, speedscope)"""
+    if not admin_allowed():
+        return jsonify({'success': False, 'message': 'No autorizado'}), 403
+
+    response = app.response_class(profiler.folded_stacks(), mimetype='text/plain')
+    response.headers['Content-Disposition'] = 'attachment; filename=crm.folded'
+    return response
+
+
+@app.route('/metrics')
+def metrics():
+    """Métricas en formato Prometheus"""
+    return app.response_class(registry.render(), mimetype='text/plain; version=0.0.4')
+
 
 # Instancias globales
 vicidial_api = VicidialAPI()
 vicidial_ami = VicidialAMI()
-vicidial_realtime = VicidialRealtime(socketio)
+lead_lookup = LeadLookup()
+vicidial_realtime = VicidialRealtime(socketio, lead_lookup=lead_lookup)
 
 def init_ami():
     """Inicializar conexión AMI"""
@@ -36,23 +215,19 @@ def init_ami():
         return False
 
 def init_realtime():
-    """Inicializar AMI en tiempo real en hilo separado"""
-    def start_realtime():
-        if vicidial_realtime.connect_ami():
-            print("🚀 AMI Tiempo Real iniciado")
-        else:
-            print("❌ Error iniciando AMI Tiempo Real")
-
-    # Ejecutar en hilo separado para no bloquear Flask
-    thread = threading.Thread(target=start_realtime)
-    thread.daemon = True
-    thread.start()
+    """Inicializar AMI en tiempo real (se llama desde un hilo de arranque)"""
+    if vicidial_realtime.connect_ami():
+        print("🚀 AMI Tiempo Real iniciado")
+        return True
+    else:
+        print("❌ Error iniciando AMI Tiempo Real")
+        return False
 
 # Modelos de base de datos
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
-    email = db.Column(db.String(100), nullable=False)  # Quitamos unique=True
+    email = db.Column(db.String(100), nullable=False, index=True)  # Quitamos unique=True
 
     # Campos Vicidial
     vicidial_user = db.Column(db.String(20), unique=True)
@@ -81,6 +256,55 @@ class AgentSession(db.Model):
     phone_login = db.Column(db.String(20))
     status = db.Column(db.String(20), default='ACTIVE')
 
+    __table_args__ = (
+        db.Index('ix_agent_session_user_status', 'user_id', 'status'),
+    )
+
+def write_agent_statuses(changes):
+    """Escribir un lote de estados de agente en una sola transacción"""
+    with app.app_context():
+        try:
+            now = datetime.utcnow()
+            db.session.bulk_update_mappings(User, [
+                dict(fields, id=user_id, updated_at=now) for user_id, fields in changes
+            ])
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+# Estado de agentes en memoria con escritura diferida a la base local
+agent_status_store = AgentStatusStore(write_agent_statuses)
+
+def notify_job_progress(job):
+    """Enviar progreso del job a la sala Socket.IO del agente"""
+    socketio.emit('job_progress', job.to_dict(), room=job.room)
+
+# Workflows de varios pasos (login/logout) fuera del hilo HTTP
+job_runner = JobRunner(notify=notify_job_progress, context_factory=app.app_context)
+
+def agent_state_keys(user):
+    """Claves de versión de un agente: cambios de estado local y eventos de su extensión"""
+    return (f'agent:{user.id}', f'ext:{user.vicidial_phone_login}')
+
+
+# Cada cambio de estado o evento de la extensión despierta a los long-polls del agente
+agent_status_store.add_listener(lambda user_id, state: state_versions.bump(f'agent:{user_id}'))
+vicidial_realtime.add_listener(lambda extension, event: state_versions.bump(f'ext:{extension}'))
+
+# Alertas de SLA: se evalúan con cada cambio del estado en vivo y se envían a la sala de supervisores
+alert_engine = AlertEngine(notify=lambda alert: socketio.emit('sla_alert', alert, room='supervisors'))
+
+# Monitor de llamadas en vivo (intervalo adaptativo) con historial en memoria para sparklines
+live_history = TimeSeriesStore()
+live_monitor = AdaptiveMonitor(VicidialCallMonitor(),
+                               on_change=lambda snapshot, *changed: alert_engine.update(*snapshot_signals(snapshot)),
+                               on_tick=lambda snapshot: live_history.record(snapshot_values(snapshot)))
+
+# De-duplicación de pausa/despausa: en curso por agente y por Idempotency-Key
+agent_action_flight = SingleFlight(name='agent_actions')
+agent_action_replay = SingleFlight(Config.IDEMPOTENCY_TTL, name='agent_action_keys')
+
 # Rutas
 @app.route('/')
 def index():
@@ -93,12 +317,14 @@ def dashboard():
 
     user = User.query.get(session['user_id'])
     agents = User.query.filter(User.vicidial_user.isnot(None)).all()
+    agent_status_store.apply_to(agents + [user])
 
     return render_template('dashboard.html', user=user, agents=agents)
 
 @app.route('/agent_view/<int:agent_id>')
 def agent_view(agent_id):
     user = User.query.get_or_404(agent_id)
+    agent_status_store.apply_to([user])
     return render_template('agent_view.html', agent=user)
 
 @app.route('/login', methods=['POST'])
@@ -171,6 +397,73 @@ def create_agent():
             'message': f'Error al crear agente: {str(e)}'
         }), 500
 
+def find_existing_agents(agents):
+    """Emails y usuarios Vicidial que ya existen en la base local (una sola consulta)"""
+    emails = [a.get('email') for a in agents if a.get('email')]
+    vicidial_users = [a.get('vicidial_user') for a in agents if a.get('vicidial_user')]
+
+    existing = set()
+    for user in User.query.filter(User.email.in_(emails) | User.vicidial_user.in_(vicidial_users)).all():
+        existing.add(user.email)
+        existing.add(user.vicidial_user)
+    return existing
+
+def save_agents_batch(agents):
+    """Insertar un lote de agentes en la base local en una sola transacción"""
+    try:
+        db.session.add_all([
+            User(
+                name=data['name'],
+                email=data['email'],
+                vicidial_user=data['vicidial_user'],
+                vicidial_user_pass=data['vicidial_user_pass'],
+                vicidial_phone_login=data['vicidial_phone_login'],
+                vicidial_phone_pass=data['vicidial_phone_pass'],
+                vicidial_user_level=data.get('vicidial_user_level', 1),
+                vicidial_user_group=data.get('vicidial_user_group', 'AGENTS')
+            )
+            for data in agents
+        ])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+@app.route('/bulk_create_agents', methods=['POST'])
+def bulk_create_agents():
+    """Alta masiva de agentes desde JSON o archivo CSV/JSON"""
+    try:
+        if 'file' in request.files:
+            upload = request.files['file']
+            agents = parse_agents(upload.read(), upload.filename or '')
+        else:
+            data = request.get_json()
+            agents = data.get('agents', []) if isinstance(data, dict) else data
+
+        if not agents:
+            return jsonify({'success': False, 'message': 'No se recibieron agentes'}), 400
+
+        provisioner = BulkProvisioner(
+            vicidial_api,
+            save_batch=save_agents_batch,
+            max_workers=request.args.get('workers', type=int),
+            rate_per_second=request.args.get('rate', type=float)
+        )
+        report = provisioner.provision(agents, existing=find_existing_agents(agents))
+
+        return jsonify({
+            'success': True,
+            'message': f"{report['summary']['created']} agentes creados en {report['elapsed_seconds']}s",
+            'report': report
+        })
+
+    except Exception as e:
+        print(f"Error en alta masiva: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': f'Error en alta masiva: {str(e)}'
+        }), 500
+
 @app.route('/agent_login', methods=['POST'])
 def agent_login():
     try:
@@ -192,8 +485,7 @@ def agent_login():
 
         if response and 'SUCCESS' in response:
             # Actualizar estado local
-            user.is_logged_in_vicidial = True
-            user.agent_status = 'READY'
+            agent_status_store.set(user.id, 'READY', is_logged_in=True)
 
             # Crear sesión
             session_record = AgentSession(
@@ -238,8 +530,7 @@ def agent_logout():
         response = vicidial_api.agent_logout(user.vicidial_user)
 
         # Actualizar estado local
-        user.is_logged_in_vicidial = False
-        user.agent_status = 'LOGOUT'
+        agent_status_store.set(user.id, 'LOGOUT', is_logged_in=False)
 
         # Cerrar sesión activa
         active_session = AgentSession.query.filter_by(
@@ -272,17 +563,21 @@ def get_agent_status(user_id):
         if not user:
             return jsonify({'success': False, 'message': 'Usuario no encontrado'})
 
-        # Obtener estado desde Vicidial
-        vicidial_status = vicidial_api.get_agent_status(user.vicidial_user)
+        def build():
+            # Obtener estado desde Vicidial
+            vicidial_status = vicidial_api.get_agent_status(user.vicidial_user)
+            local_status = agent_status_store.current(user)
 
-        return jsonify({
-            'success': True,
-            'local_status': {
-                'agent_status': user.agent_status,
-                'is_logged_in': user.is_logged_in_vicidial
-            },
-            'vicidial_status': vicidial_status
-        })
+            return {
+                'success': True,
+                'local_status': {
+                    'agent_status': local_status['agent_status'],
+                    'is_logged_in': local_status['is_logged_in_vicidial']
+                },
+                'vicidial_status': vicidial_status
+            }
+
+        return conditional_json(build, agent_state_keys(user))
 
     except Exception as e:
         return jsonify({
@@ -290,17 +585,62 @@ def get_agent_status(user_id):
             'message': f'Error: {str(e)}'
         })
 
+def agents_for_bulk(data):
+    """Agentes indicados en agent_ids (o todos los que tienen usuario Vicidial)"""
+    query = User.query.filter(User.vicidial_user.isnot(None))
+    if data and data.get('agent_ids'):
+        query = query.filter(User.id.in_(data['agent_ids']))
+    return query.all()
+
+@app.route('/bulk_agent_status', methods=['POST'])
+def bulk_agent_status():
+    """Estado de muchos agentes en Vicidial en paralelo"""
+    try:
+        users = agents_for_bulk(request.get_json(silent=True))
+        results = run_fan_out('get_many_agent_statuses', [u.vicidial_user for u in users], client=vicidial_api)
+
+        return jsonify({
+            'success': True,
+            'statuses': {user_id: str(result) if isinstance(result, Exception) else result
+                         for user_id, result in results.items()}
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'Error: {str(e)}'})
+
+@app.route('/bulk_agent_logout', methods=['POST'])
+def bulk_agent_logout():
+    """Logout masivo (external_logout) de agentes en paralelo"""
+    try:
+        users = agents_for_bulk(request.get_json(silent=True))
+        results = run_fan_out('logout_many', [u.vicidial_user for u in users], client=vicidial_api)
+
+        for user in users:
+            result = results.get(user.vicidial_user)
+            if isinstance(result, str) and 'SUCCESS' in result:
+                agent_status_store.set(user.id, 'LOGOUT', is_logged_in=False)
+
+        return jsonify({
+            'success': True,
+            'results': {user_id: str(result) if isinstance(result, Exception) else result
+                        for user_id, result in results.items()}
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'Error: {str(e)}'})
+
 @app.route('/test_vicidial_connection')
 def test_vicidial_connection():
     """Probar conexión con Vicidial"""
     try:
-        # Probar obtener campañas
-        campaigns = vicidial_api.get_campaigns()
+        # ?fresh=1 fuerza una consulta real en lugar de usar la caché
+        if request.args.get('fresh'):
+            vicidial_api.reference_cache.invalidate('campaigns_list')
+
+        campaigns = vicidial_api.list_campaigns()
 
         return jsonify({
             'success': True,
             'message': 'Conexión exitosa con Vicidial',
-            'campaigns': campaigns
+            'campaigns': [campaign.to_dict() for campaign in campaigns]
         })
 
     except Exception as e:
@@ -309,10 +649,174 @@ def test_vicidial_connection():
             'message': f'Error de conexión: {str(e)}'
         })
 
+@app.route('/health')
+def health():
+    """Estado de los circuit breakers de cada dependencia"""
+    circuits = get_all_states()
+    degraded = [name for name, state in circuits.items() if state['state'] != 'CLOSED']
+
+    return jsonify({
+        'success': True,
+        'status': 'degraded' if degraded else 'ok',
+        'degraded_dependencies': degraded,
+        'circuits': circuits,
+        'agent_status_writes': agent_status_store.get_stats(),
+        'vicidial_db_pool': vicidial_pool.get_stats(),
+        'jobs': job_runner.get_stats(),
+        'call_monitor': live_monitor.get_stats(),
+        'live_history': live_history.get_stats(),
+        'alerts': alert_engine.get_stats(),
+        'lead_lookup': lead_lookup.get_stats(),
+        'reports_cache': service_level_reports.get_stats(),
+        'agent_actions': {
+            'in_flight': agent_action_flight.get_stats(),
+            'idempotency': agent_action_replay.get_stats()
+        }
+    })
+
+@app.route('/live_history')
+def get_live_history():
+    """Historial de métricas en vivo (cola, agentes disponibles, en llamada...) para sparklines
+
+    ?metric=queue_depth&campaign=all&window=3600&points=120; sin metric devuelve
+    el último valor de cada serie.
+    """
+    try:
+        metric = request.args.get('metric')
+        if not metric:
+            return jsonify({'success': True, 'latest': live_history.latest(), 'stats': live_history.get_stats()})
+
+        window = min(request.args.get('window', 3600, type=float), 7 * 86400)
+        history = live_history.query(metric, request.args.get('campaign', 'all'), window,
+                                     points=request.args.get('points', type=int))
+        if history is None:
+            return jsonify({'success': False, 'message': f'Serie no encontrada: {metric}'}), 404
+
+        return json_response(dict(history, success=True))
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'Error: {str(e)}'})
+
+@app.route('/alerts')
+def get_alerts():
+    """Alertas de SLA activas, últimas notificaciones y reglas vigentes"""
+    try:
+        return jsonify({
+            'success': True,
+            'active': alert_engine.active(),
+            'recent': alert_engine.history(),
+            'rules': [rule.to_dict() for rule in alert_engine.rules]
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'Error: {str(e)}'})
+
+@app.route('/reports/service_level')
+def service_level_report():
+    """AHT, ASA, abandono, nivel de servicio y percentiles por campaña y agente
+
+    ?start=YYYY-MM-DD&end=YYYY-MM-DD (incluido)&thresholds=20,30,60&percentiles=50,90,95&refresh=1
+    """
+    try:
+        today = datetime.now().date()
+        start = datetime.strptime(request.args['start'], '%Y-%m-%d').date() if request.args.get('start') else today
+        end = datetime.strptime(request.args['end'], '%Y-%m-%d').date() if request.args.get('end') else start
+        if end < start:
+            return jsonify({'success': False, 'message': 'end debe ser igual o posterior a start'}), 400
+
+        def numbers(name):
+            value = request.args.get(name)
+            return tuple(float(item) for item in value.split(',') if item.strip()) if value else None
+
+        report = service_level_reports.report(start, end, numbers('thresholds'), numbers('percentiles'),
+                                              request.args.get('short_abandon', type=float),
+                                              refresh=bool(request.args.get('refresh')))
+        return json_response(dict(report, success=True))
+    except ValueError as e:
+        return jsonify({'success': False, 'message': f'Parámetro inválido: {str(e)}'}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'Error: {str(e)}'})
+
+@app.route('/reference_data')
+def reference_data():
+    """Campañas y grupos inbound de Vicidial (desde caché)"""
+    try:
+        return jsonify({
+            'success': True,
+            'campaigns': [campaign.to_dict() for campaign in vicidial_api.list_campaigns()],
+            'inbound_groups': [group.to_dict() for group in vicidial_api.list_inbound_groups()],
+            'cache': vicidial_api.reference_cache.get_stats()
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'Error: {str(e)}'})
+
+@app.route('/vicidial_api_metrics')
+def vicidial_api_metrics():
+    """Latencias por función de la API Vicidial"""
+    return jsonify({
+        'success': True,
+        'metrics': vicidial_api.get_metrics(),
+        'agent_status_coalescing': vicidial_api.status_flight.get_stats()
+    })
+
+def init_local_db():
+    create_tables()
+    return True
+
+
+def init_vicidial_db():
+    """Abrir la primera conexión del pool y comprobarla"""
+    with vicidial_pool.connection() as connection:
+        connection.ping(reconnect=False)
+    return True
+
+
+def init_call_monitor():
+    """Conexión propia del monitor y su ciclo en un hilo aparte"""
+    if not live_monitor.monitor.connect():
+        raise RuntimeError('Monitor sin conexión a la BD de Vicidial')
+    thread = threading.Thread(target=live_monitor.run, name='call-monitor')
+    thread.daemon = True
+    thread.start()
+    alert_engine.start()
+    return True
+
+
+def init_vicidial_api():
+    """Comprobar la API precargando la caché de campañas"""
+    if not vicidial_api.list_campaigns():
+        raise RuntimeError('campaigns_list sin respuesta válida')
+    return True
+
+
+# Dependencias que se conectan en segundo plano al arrancar
+startup = StartupManager()
+startup.register('local_db', init_local_db, required='local_db' in Config.READINESS_REQUIRED)
+startup.register('vicidial_db', init_vicidial_db, required='vicidial_db' in Config.READINESS_REQUIRED,
+                 breaker='vicidial_db')
+startup.register('vicidial_api', init_vicidial_api, required='vicidial_api' in Config.READINESS_REQUIRED,
+                 breaker='vicidial_api')
+startup.register('ami', init_ami, required='ami' in Config.READINESS_REQUIRED, breaker='ami')
+startup.register('ami_realtime', init_realtime, required='ami_realtime' in Config.READINESS_REQUIRED)
+startup.register('call_monitor', init_call_monitor, required='call_monitor' in Config.READINESS_REQUIRED)
+
+
+@app.route('/healthz')
+def healthz():
+    """Liveness: el proceso responde (no depende de nada externo)"""
+    return jsonify({'success': True, 'status': 'alive'})
+
+
+@app.route('/readyz')
+def readyz():
+    """Readiness: dependencias requeridas conectadas (503 mientras no lo estén)"""
+    state = startup.get_state()
+    return jsonify(dict(state, success=state['ready'])), 200 if state['ready'] else 503
+
+
 # Crear tablas al iniciar
 def create_tables():
     with app.app_context():
         db.create_all()
+        apply_migrations(db)
 
         # Crear usuario de prueba si no existe
         if not User.query.first():
@@ -342,9 +846,7 @@ def ami_agent_login():
 
         if response:
             # Actualizar estado local
-            user.is_logged_in_vicidial = True
-            user.agent_status = 'READY'
-            db.session.commit()
+            agent_status_store.set(user.id, 'READY', is_logged_in=True)
 
             return jsonify({
                 'success': True,
@@ -375,9 +877,7 @@ def ami_agent_logout():
         )
 
         # Actualizar estado local
-        user.is_logged_in_vicidial = False
-        user.agent_status = 'LOGOUT'
-        db.session.commit()
+        agent_status_store.set(user.id, 'LOGOUT', is_logged_in=False)
 
         return jsonify({
             'success': True,
@@ -403,8 +903,7 @@ def ami_pause_agent():
         response = vicidial_ami.pause_agent(user.vicidial_phone_login, 'DEMOIN', reason)
 
         # Actualizar estado local
-        user.agent_status = 'PAUSED'
-        db.session.commit()
+        agent_status_store.set(user.id, 'PAUSED')
 
         return jsonify({
             'success': True,
@@ -429,8 +928,7 @@ def ami_unpause_agent():
         response = vicidial_ami.unpause_agent(user.vicidial_phone_login, 'DEMOIN')
 
         # Actualizar estado local
-        user.agent_status = 'READY'
-        db.session.commit()
+        agent_status_store.set(user.id, 'READY')
 
         return jsonify({
             'success': True,
@@ -485,7 +983,7 @@ def debug_queues():
 def debug_sip_peer(extension):
     try:
         # Actualizar la función para usar la extensión pasada
-        response = vicidial_ami.manager.send_action({
+        response = vicidial_ami.send_action({
             'Action': 'SIPshowpeer',
             'Peer': extension
         })
@@ -498,80 +996,73 @@ def debug_sip_peer(extension):
 
 @app.route('/agent_calls/<int:agent_id>')
 def agent_calls(agent_id):
+    """Llamada actual del agente (ETag/304 y long-polling con ?wait=)"""
     try:
         user = User.query.get_or_404(agent_id)
 
-        # Conectar a BD Vicidial para obtener llamadas
-        connection = pymysql.connect(
-            host='195.26.249.9',
-            port=3306,
-            user='custom',
-            password='ldb0LBeham5VWkJ1shCbLNJIdX4',
-            database='VIbdz0BWDgJBaoq',
-            charset='utf8mb4'
-        )
-
-        with connection.cursor() as cursor:
-            # Obtener llamadas del agente
-            cursor.execute("""
-               SELECT vac.uniqueid,
-                      vac.lead_id,
-                      vac.status,
-                      vac.campaign_id,
-                      vl.phone_number,
-                      vac.start_time
-               FROM vicidial_auto_calls vac
-                        LEFT JOIN vicidial_list vl ON vac.lead_id = vl.lead_id
-               WHERE vac.agent_user = %s
-                 AND vac.status IN ('LIVE', 'QUEUE', 'INCALL', 'RING')
-               ORDER BY vac.start_time DESC LIMIT 1
-           """, (user.vicidial_user,))
-
-
-            call_data = cursor.fetchone()
-            calls = []
-
-            if call_data:
-                # Obtener información del cliente
+        def build():
+            # Conexión del pool: con long-polling se consulta varias veces por pedido
+            with vicidial_pool.connection() as connection, connection.cursor() as cursor:
+                # Obtener llamadas del agente
                 cursor.execute("""
-                    SELECT first_name, last_name, city, state, address1
-                    FROM vicidial_list 
-                    WHERE lead_id = %s
-                """, (call_data[1],))
-
-                customer_data = cursor.fetchone()
-
-                call = {
-                    'uniqueid': call_data[0],
-                    'lead_id': call_data[1],
-                    'status': call_data[2],
-                    'campaign_id': call_data[3],
-                    'phone_number': call_data[4],
-                    'start_time': call_data[5].strftime('%Y-%m-%d %H:%M:%S') if call_data[5] else None,
-                    'first_name': customer_data[0] if customer_data else '',
-                    'last_name': customer_data[1] if customer_data else '',
-                    'city': customer_data[2] if customer_data else '',
-                    'state': customer_data[3] if customer_data else '',
-                    'address1': customer_data[4] if customer_data else ''
-                }
-                calls.append(call)
-
-            # Obtener estado del agente
-            cursor.execute("""
-                SELECT status FROM vicidial_live_agents 
-                WHERE user = %s
-            """, (user.vicidial_user,))
+                   SELECT vac.uniqueid,
+                          vac.lead_id,
+                          vac.status,
+                          vac.campaign_id,
+                          vl.phone_number,
+                          vac.start_time
+                   FROM vicidial_auto_calls vac
+                            LEFT JOIN vicidial_list vl ON vac.lead_id = vl.lead_id
+                   WHERE vac.agent_user = %s
+                     AND vac.status IN ('LIVE', 'QUEUE', 'INCALL', 'RING')
+                   ORDER BY vac.start_time DESC LIMIT 1
+               """, (user.vicidial_user,))
+
+
+                call_data = cursor.fetchone()
+                calls = []
+
+                if call_data:
+                    # Obtener información del cliente
+                    cursor.execute("""
+                        SELECT first_name, last_name, city, state, address1
+                        FROM vicidial_list 
+                        WHERE lead_id = %s
+                    """, (call_data[1],))
+
+                    customer_data = cursor.fetchone()
+
+                    call = {
+                        'uniqueid': call_data[0],
+                        'lead_id': call_data[1],
+                        'status': call_data[2],
+                        'campaign_id': call_data[3],
+                        'phone_number': call_data[4],
+                        'start_time': call_data[5].strftime('%Y-%m-%d %H:%M:%S') if call_data[5] else None,
+                        'first_name': customer_data[0] if customer_data else '',
+                        'last_name': customer_data[1] if customer_data else '',
+                        'city': customer_data[2] if customer_data else '',
+                        'state': customer_data[3] if customer_data else '',
+                        'address1': customer_data[4] if customer_data else ''
+                    }
+                    calls.append(call)
+
+                # Obtener estado del agente
+                cursor.execute("""
+                    SELECT status FROM vicidial_live_agents 
+                    WHERE user = %s
+                """, (user.vicidial_user,))
 
-            agent_status_result = cursor.fetchone()
-            agent_status = agent_status_result[0] if agent_status_result else 'LOGOUT'
+                agent_status_result = cursor.fetchone()
+                agent_status = agent_status_result[0] if agent_status_result else 'LOGOUT'
 
-        connection.close()
+            return {
+                'success': True,
+                'calls': calls,
+                'agent_status': agent_status
+            }
 
-        return jsonify({
-            'success': True,
-            'calls': calls,
-            'agent_status': agent_status
-        })
+        return conditional_json(build, agent_state_keys(user))
 
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
@@ -595,34 +1086,40 @@ def agent_unpause():
         return jsonify({'success': False, 'error': str(e)})
 
 
-@app.route('/vicidial_agent_login', methods=['POST'])
-def vicidial_agent_login():
-    """Login completo del agente en Vicidial con MeetMe automático"""
-    try:
-        data = request.get_json()
-        agent_id = data['agent_id']
-        user = User.query.get_or_404(agent_id)
+# ===== WORKFLOWS DE LOGIN / LOGOUT (se ejecutan como jobs en segundo plano) =====
 
-        # Conectar a BD Vicidial
-        connection = pymysql.connect(
-            host='195.26.249.9',
-            port=3306,
-            user='custom',
-            password='ldb0LBeham5VWkJ1shCbLNJIdX4',
-            database='VIbdz0BWDgJBaoq',
-            charset='utf8mb4'
-        )
+def login_step_assign_room(ctx):
+    """Asignar sala MeetMe disponible"""
+    ctx['meetme_room'] = assign_meetme_room(ctx['vicidial_user'])
+
+
+def login_step_register(ctx):
+    """Todas las escrituras en Vicidial del login en una transacción y una conexión del pool
+
+    Configura inbound, limpia e inserta en vicidial_live_agents, registra LOGIN y
+    verifica el estado antes del commit. Si algo falla se hace rollback completo,
+    por eso el paso se puede reintentar.
+    """
+    timings = ctx.setdefault('timings', {})
+
+    def timed(name, start):
+        timings[name] = round((time.perf_counter() - start) * 1000, 1)
+        return time.perf_counter()
 
+    with vicidial_pool.connection() as connection:
         with connection.cursor() as cursor:
-            # 1. Eliminar agente si ya existe (limpieza)
+            start = time.perf_counter()
+
+            # 1. Configurar agente para inbound calls
+            apply_inbound_setup(cursor, ctx['vicidial_user'])
+            start = timed('inbound_setup', start)
+
+            # 2. Eliminar agente si ya existe (limpieza)
             cursor.execute("""
                            DELETE
                            FROM vicidial_live_agents
                            WHERE user = %s
-                           """, (user.vicidial_user,))
-
-            # 2. Asignar sala MeetMe disponible
-            meetme_room = assign_meetme_room(user.vicidial_user)
+                           """, (ctx['vicidial_user'],))
 
             # 3. Insertar agente en vicidial_live_agents CON estado READY
             cursor.execute("""
@@ -638,12 +1135,13 @@ def vicidial_agent_login():
                                    %s, %s, 0, '',
                                    NOW(), 0)
                            """, (
-                               user.vicidial_user,
-                               str(meetme_room),
+                               ctx['vicidial_user'],
+                               str(ctx['meetme_room']),
                                ' colain ',  # IMPORTANTE: closer_campaigns con colain
-                               user.vicidial_user_level or 1,
-                               f'CRM AUTO LOGIN MeetMe {meetme_room}'
+                               ctx['user_level'],
+                               f"CRM AUTO LOGIN MeetMe {ctx['meetme_room']}"
                            ))
+            start = timed('live_agent', start)
 
             # 4. Registrar en vicidial_agent_log
             cursor.execute("""
@@ -657,57 +1155,130 @@ def vicidial_agent_login():
                                    0, 0, 'LOGIN', 0,
                                    %s, %s, '')
                            """, (
-                               user.vicidial_user,
-                               user.vicidial_user_group or 'ADMIN',
-                               f'CRM AUTO LOGIN MeetMe {meetme_room}'
+                               ctx['vicidial_user'],
+                               ctx['user_group'],
+                               f"CRM AUTO LOGIN MeetMe {ctx['meetme_room']}"
                            ))
+            start = timed('agent_log', start)
 
-            connection.commit()
+            # 5. Verificar que quedó en READY (misma transacción)
+            cursor.execute("""
+                           SELECT status
+                           FROM vicidial_live_agents
+                           WHERE user = %s
+                           """, (ctx['vicidial_user'],))
 
-        connection.close()
+            final_status = cursor.fetchone()
+            ctx['final_status'] = final_status[0] if final_status else 'NOT_FOUND'
+            start = timed('verify', start)
 
-        # 5. Configurar agente para inbound calls
-        setup_agent_for_inbound(user.vicidial_user)
+        connection.commit()
+        timed('commit', start)
 
-        # 6. Conectar MicroSIP automáticamente a sala MeetMe
-        connect_result = connect_agent_to_meetme(user.vicidial_phone_login, meetme_room)
 
-        # 7. Actualizar estado local
-        user.is_logged_in_vicidial = True
-        user.agent_status = 'READY'
-        db.session.commit()
+def login_step_connect_meetme(ctx):
+    """Conectar MicroSIP automáticamente a sala MeetMe"""
+    start = time.perf_counter()
+    ctx['connect_result'] = connect_agent_to_meetme(ctx['phone_login'], ctx['meetme_room'])
+    ctx.setdefault('timings', {})['ami_originate'] = round((time.perf_counter() - start) * 1000, 1)
 
-        # 8. Verificar que quedó en READY (doble check)
-        connection = pymysql.connect(
-            host='195.26.249.9',
-            port=3306,
-            user='custom',
-            password='ldb0LBeham5VWkJ1shCbLNJIdX4',
-            database='VIbdz0BWDgJBaoq',
-            charset='utf8mb4'
-        )
 
-        with connection.cursor() as cursor:
-            cursor.execute("""
-                           SELECT status
-                           FROM vicidial_live_agents
-                           WHERE user = %s
-                           """, (user.vicidial_user,))
+def login_step_local_status(ctx):
+    """Actualizar estado local"""
+    agent_status_store.set(ctx['user_id'], 'READY', is_logged_in=True)
 
-            final_status = cursor.fetchone()
-            actual_status = final_status[0] if final_status else 'NOT_FOUND'
 
-        connection.close()
+def login_result(ctx):
+    print(f"🎉 Login completo: {ctx['vicidial_user']} → MeetMe {ctx['meetme_room']} → Estado: {ctx['final_status']}")
+    return {
+        'message': f"Agente {ctx['vicidial_user']} logueado → MeetMe {ctx['meetme_room']} → {ctx['final_status']}",
+        'meetme_room': ctx['meetme_room'],
+        'final_status': ctx['final_status'],
+        'ready_for_calls': ctx['final_status'] == 'READY',
+        'timings': ctx.get('timings', {})
+    }
 
-        print(f"🎉 Login completo: {user.vicidial_user} → MeetMe {meetme_room} → Estado: {actual_status}")
 
-        return jsonify({
-            'success': True,
-            'message': f'Agente {user.vicidial_user} logueado → MeetMe {meetme_room} → {actual_status}',
-            'meetme_room': meetme_room,
-            'final_status': actual_status,
-            'ready_for_calls': actual_status == 'READY'
-        })
+# La transacción en Vicidial y el Originate AMI son independientes: corren a la vez
+LOGIN_STEPS = [
+    Step('assign_meetme_room', login_step_assign_room, idempotent=True),
+    Parallel(
+        Step('register_live_agent', login_step_register, idempotent=True),
+        Step('connect_meetme', login_step_connect_meetme, required=False),
+    ),
+    Step('update_local_status', login_step_local_status, idempotent=True),
+]
+
+
+def agent_job_context(user):
+    """Datos del agente que necesitan los pasos (sin objetos ORM, se usan en otro hilo)"""
+    return {
+        'user_id': user.id,
+        'vicidial_user': user.vicidial_user,
+        'phone_login': user.vicidial_phone_login,
+        'user_level': user.vicidial_user_level or 1,
+        'user_group': user.vicidial_user_group or 'ADMIN'
+    }
+
+
+def request_idempotency_key(data=None):
+    """Idempotency-Key del pedido (cabecera o campo idempotency_key del JSON)"""
+    key = request.headers.get('Idempotency-Key')
+    if not key and data:
+        key = data.get('idempotency_key')
+    return key or None
+
+
+def run_agent_action(action, agent_id, func, *args):
+    """Ejecutar una acción de agente sin duplicarla
+
+    Pedidos iguales que llegan mientras otro está en curso (doble clic) esperan
+    y reciben la misma respuesta; si traen Idempotency-Key, un reintento con la
+    misma clave devuelve la respuesta guardada durante IDEMPOTENCY_TTL.
+    """
+    key = request_idempotency_key(request.get_json(silent=True))
+
+    def execute():
+        return agent_action_flight.do((action, agent_id) + args, func)
+
+    if key:
+        return agent_action_replay.do((action, agent_id, key), execute)
+    return execute()
+
+
+def submit_agent_job(kind, steps, user, finalize, data=None):
+    """Encolar job de login/logout; un pedido repetido se une al job existente"""
+    key = request_idempotency_key(data)
+    return job_runner.submit_once(
+        kind, steps, agent_job_context(user),
+        agent_id=user.id, room=f'agent_{user.vicidial_phone_login}', finalize=finalize,
+        idempotency_key=f'{kind}:{user.id}:{key}' if key else None
+    )
+
+
+def job_accepted(job, message, created=True):
+    """Respuesta inmediata con el id del job"""
+    return jsonify({
+        'success': True,
+        'message': message if created else f'{message} (pedido repetido, mismo job)',
+        'duplicate': not created,
+        'job_id': job.id,
+        'job_status': job.status,
+        'status_url': url_for('get_job', job_id=job.id)
+    }), 202
+
+
+@app.route('/vicidial_agent_login', methods=['POST'])
+def vicidial_agent_login():
+    """Login completo del agente en Vicidial con MeetMe automático (job en segundo plano)"""
+    try:
+        data = request.get_json()
+        agent_id = data['agent_id']
+        user = User.query.get_or_404(agent_id)
+
+        job, created = submit_agent_job('login', LOGIN_STEPS, user, login_result, data)
+
+        return job_accepted(job, f'Login de {user.vicidial_user} en proceso', created)
 
     except Exception as e:
         print(f"Error en vicidial_agent_login: {e}")
@@ -717,66 +1288,61 @@ def vicidial_agent_login():
         })
 
 
-def setup_agent_for_inbound(agent_user):
-    """Configurar agente para recibir llamadas inbound de colain"""
-    try:
-        connection = pymysql.connect(
-            host='195.26.249.9',
-            port=3306,
-            user='custom',
-            password='ldb0LBeham5VWkJ1shCbLNJIdX4',
-            database='VIbdz0BWDgJBaoq',
-            charset='utf8mb4'
-        )
+def apply_inbound_setup(cursor, agent_user):
+    """Configurar agente para recibir llamadas inbound de colain (sin commit)"""
+    # 1. Verificar si el usuario existe en vicidial_users
+    cursor.execute("""
+                   SELECT user, closer_campaigns
+                   FROM vicidial_users
+                   WHERE user = %s
+                   """, (agent_user,))
 
-        with connection.cursor() as cursor:
-            # 1. Verificar si el usuario existe en vicidial_users
-            cursor.execute("""
-                           SELECT user, closer_campaigns
-                           FROM vicidial_users
-                           WHERE user = %s
-                           """, (agent_user,))
+    user_data = cursor.fetchone()
 
-            user_data = cursor.fetchone()
+    if user_data:
+        current_campaigns = user_data[1] or ''
 
-            if user_data:
-                current_campaigns = user_data[1] or ''
+        # 2. Agregar 'colain' si no está en closer_campaigns
+        if 'colain' not in current_campaigns:
+            new_campaigns = f'{current_campaigns} colain '.strip()
 
-                # 2. Agregar 'colain' si no está en closer_campaigns
-                if 'colain' not in current_campaigns:
-                    new_campaigns = f'{current_campaigns} colain '.strip()
+            cursor.execute("""
+                           UPDATE vicidial_users
+                           SET closer_campaigns = %s,
+                               user_level       = 8
+                           WHERE user = %s
+                           """, (f' {new_campaigns} ', agent_user))
 
-                    cursor.execute("""
-                                   UPDATE vicidial_users
-                                   SET closer_campaigns = %s,
-                                       user_level       = 8
-                                   WHERE user = %s
-                                   """, (f' {new_campaigns} ', agent_user))
+            print(f"✅ Usuario {agent_user} configurado con closer_campaigns: {new_campaigns}")
+        else:
+            print(f"✅ Usuario {agent_user} ya tiene 'colain' en closer_campaigns")
 
-                    print(f"✅ Usuario {agent_user} configurado con closer_campaigns: {new_campaigns}")
-                else:
-                    print(f"✅ Usuario {agent_user} ya tiene 'colain' en closer_campaigns")
+    else:
+        print(f"⚠️ Usuario {agent_user} no existe en vicidial_users")
 
-            else:
-                print(f"⚠️ Usuario {agent_user} no existe en vicidial_users")
+    # 3. Verificar/crear entrada en vicidial_user_groups si no existe
+    cursor.execute("""
+                   SELECT user_group
+                   FROM vicidial_user_groups
+                   WHERE user_group = 'ADMIN'
+                   """)
 
-            # 3. Verificar/crear entrada en vicidial_user_groups si no existe
-            cursor.execute("""
-                           SELECT user_group
-                           FROM vicidial_user_groups
-                           WHERE user_group = 'ADMIN'
-                           """)
+    if not cursor.fetchone():
+        cursor.execute("""
+                       INSERT INTO vicidial_user_groups
+                           (user_group, group_name, allowed_campaigns, closer_campaigns)
+                       VALUES ('ADMIN', 'Administrators', 'DEMOIN', ' colain ')
+                       """)
+        print("✅ Grupo ADMIN configurado con colain")
 
-            if not cursor.fetchone():
-                cursor.execute("""
-                               INSERT INTO vicidial_user_groups
-                                   (user_group, group_name, allowed_campaigns, closer_campaigns)
-                               VALUES ('ADMIN', 'Administrators', 'DEMOIN', ' colain ')
-                               """)
-                print("✅ Grupo ADMIN configurado con colain")
 
+def setup_agent_for_inbound(agent_user):
+    """Configurar agente para recibir llamadas inbound de colain"""
+    try:
+        with vicidial_pool.connection() as connection:
+            with connection.cursor() as cursor:
+                apply_inbound_setup(cursor, agent_user)
             connection.commit()
-        connection.close()
 
         return True
 
@@ -784,43 +1350,29 @@ def setup_agent_for_inbound(agent_user):
         print(f"❌ Error configurando agente para inbound: {e}")
         return False
 
-@app.route('/vicidial_agent_logout', methods=['POST'])
-def vicidial_agent_logout():
-    """Logout completo del agente de Vicidial y MeetMe"""
-    try:
-        data = request.get_json()
-        agent_id = data['agent_id']
-        user = User.query.get_or_404(agent_id)
-
-        # Obtener sala MeetMe antes de eliminar
-        connection = pymysql.connect(
-            host='195.26.249.9',
-            port=3306,
-            user='custom',
-            password='ldb0LBeham5VWkJ1shCbLNJIdX4',
-            database='VIbdz0BWDgJBaoq',
-            charset='utf8mb4'
-        )
 
-        meetme_room = None
+def logout_step_unregister(ctx):
+    """Obtener sala MeetMe, eliminar de vicidial_live_agents y registrar LOGOUT (una transacción)"""
+    ctx['meetme_room'] = None
+    with vicidial_pool.connection() as connection:
         with connection.cursor() as cursor:
             # Obtener sala MeetMe actual
             cursor.execute("""
                            SELECT conf_exten
                            FROM vicidial_live_agents
                            WHERE user = %s
-                           """, (user.vicidial_user,))
+                           """, (ctx['vicidial_user'],))
 
             result = cursor.fetchone()
             if result:
-                meetme_room = result[0]
+                ctx['meetme_room'] = result[0]
 
             # 1. Eliminar de vicidial_live_agents
             cursor.execute("""
                            DELETE
                            FROM vicidial_live_agents
                            WHERE user = %s
-                           """, (user.vicidial_user,))
+                           """, (ctx['vicidial_user'],))
 
             # 2. Registrar logout en vicidial_agent_log
             cursor.execute("""
@@ -834,31 +1386,52 @@ def vicidial_agent_logout():
                                    0, 0, 'LOGOUT', 0,
                                    %s, %s, '')
                            """, (
-                               user.vicidial_user,
-                               user.vicidial_user_group or 'ADMIN',
-                               f'CRM LOGOUT MeetMe {meetme_room}' if meetme_room else 'CRM LOGOUT'
+                               ctx['vicidial_user'],
+                               ctx['user_group'],
+                               f"CRM LOGOUT MeetMe {ctx['meetme_room']}" if ctx['meetme_room'] else 'CRM LOGOUT'
                            ))
 
-            connection.commit()
+        connection.commit()
 
-        connection.close()
 
-        # 3. Desconectar de MeetMe
-        if meetme_room:
-            disconnect_agent_from_meetme(user.vicidial_phone_login, meetme_room)
-            print(f"🔌 Agente {user.vicidial_user} desconectado de MeetMe {meetme_room}")
+def logout_step_disconnect_meetme(ctx):
+    """Desconectar de MeetMe"""
+    if ctx['meetme_room']:
+        disconnect_agent_from_meetme(ctx['phone_login'], ctx['meetme_room'])
+        print(f"🔌 Agente {ctx['vicidial_user']} desconectado de MeetMe {ctx['meetme_room']}")
 
-        # 4. Actualizar estado local
-        user.is_logged_in_vicidial = False
-        user.agent_status = 'LOGOUT'
-        db.session.commit()
 
-        print(f"👋 Logout completo: {user.vicidial_user}")
+def logout_step_local_status(ctx):
+    """Actualizar estado local"""
+    agent_status_store.set(ctx['user_id'], 'LOGOUT', is_logged_in=False)
 
-        return jsonify({
-            'success': True,
-            'message': f'Agente {user.vicidial_user} deslogueado de MeetMe {meetme_room}'
-        })
+
+def logout_result(ctx):
+    print(f"👋 Logout completo: {ctx['vicidial_user']}")
+    return {
+        'message': f"Agente {ctx['vicidial_user']} deslogueado de MeetMe {ctx['meetme_room']}",
+        'meetme_room': ctx['meetme_room']
+    }
+
+
+LOGOUT_STEPS = [
+    Step('unregister_live_agent', logout_step_unregister),
+    Step('disconnect_meetme', logout_step_disconnect_meetme, idempotent=True, required=False),
+    Step('update_local_status', logout_step_local_status, idempotent=True),
+]
+
+
+@app.route('/vicidial_agent_logout', methods=['POST'])
+def vicidial_agent_logout():
+    """Logout completo del agente de Vicidial y MeetMe (job en segundo plano)"""
+    try:
+        data = request.get_json()
+        agent_id = data['agent_id']
+        user = User.query.get_or_404(agent_id)
+
+        job, created = submit_agent_job('logout', LOGOUT_STEPS, user, logout_result, data)
+
+        return job_accepted(job, f'Logout de {user.vicidial_user} en proceso', created)
 
     except Exception as e:
         print(f"Error en vicidial_agent_logout: {e}")
@@ -867,45 +1440,73 @@ def vicidial_agent_logout():
             'message': f'Error: {str(e)}'
         })
 
-@app.route('/vicidial_agent_pause', methods=['POST'])
-def vicidial_agent_pause():
-    """Pausar agente en Vicidial"""
-    try:
-        data = request.get_json()
-        agent_id = data['agent_id']
-        reason = data.get('reason', 'BREAK')
-        user = User.query.get_or_404(agent_id)
 
-        # Conectar a BD Vicidial
-        connection = pymysql.connect(
-            host='195.26.249.9',
-            port=3306,
-            user='custom',
-            password='ldb0LBeham5VWkJ1shCbLNJIdX4',
-            database='VIbdz0BWDgJBaoq',
-            charset='utf8mb4'
-        )
+@app.route('/jobs/<job_id>')
+def get_job(job_id):
+    """Estado y progreso de un job"""
+    job = job_runner.get(job_id)
+    if not job:
+        return jsonify({'success': False, 'message': 'Job no encontrado'}), 404
 
+    return jsonify({'success': True, 'job': job.to_dict()})
+
+def pause_in_vicidial(user_id, vicidial_user, reason):
+    """Pausar agente en vicidial_live_agents y en el estado local"""
+    with vicidial_pool.connection() as connection:
         with connection.cursor() as cursor:
             # Actualizar estado a PAUSED
             cursor.execute("""
                 UPDATE vicidial_live_agents 
                 SET status = 'PAUSED', pause_code = %s, last_state_change = NOW()
                 WHERE user = %s
-            """, (reason, user.vicidial_user))
+            """, (reason, vicidial_user))
 
-            connection.commit()
+        connection.commit()
 
-        connection.close()
+    # Actualizar estado local
+    agent_status_store.set(user_id, 'PAUSED')
 
-        # Actualizar estado local
-        user.agent_status = 'PAUSED'
-        db.session.commit()
+    return {
+        'success': True,
+        'message': f'Agente pausado: {reason}'
+    }
 
-        return jsonify({
-            'success': True,
-            'message': f'Agente pausado: {reason}'
-        })
+
+def unpause_in_vicidial(user_id, vicidial_user):
+    """Poner agente en READY en vicidial_live_agents y en el estado local"""
+    with vicidial_pool.connection() as connection:
+        with connection.cursor() as cursor:
+            # Actualizar estado a READY
+            cursor.execute("""
+                UPDATE vicidial_live_agents 
+                SET status = 'READY', pause_code = '', last_state_change = NOW()
+                WHERE user = %s
+            """, (vicidial_user,))
+
+        connection.commit()
+
+    # Actualizar estado local
+    agent_status_store.set(user_id, 'READY')
+
+    return {
+        'success': True,
+        'message': 'Agente listo para recibir llamadas'
+    }
+
+
+@app.route('/vicidial_agent_pause', methods=['POST'])
+def vicidial_agent_pause():
+    """Pausar agente en Vicidial"""
+    try:
+        data = request.get_json()
+        agent_id = data['agent_id']
+        reason = data.get('reason', 'BREAK')
+        user = User.query.get_or_404(agent_id)
+
+        result = run_agent_action(
+            'pause', user.id, lambda: pause_in_vicidial(user.id, user.vicidial_user, reason), reason
+        )
+        return jsonify(result)
 
     except Exception as e:
         return jsonify({
@@ -921,36 +1522,10 @@ def vicidial_agent_unpause():
         agent_id = data['agent_id']
         user = User.query.get_or_404(agent_id)
 
-        # Conectar a BD Vicidial
-        connection = pymysql.connect(
-            host='195.26.249.9',
-            port=3306,
-            user='custom',
-            password='ldb0LBeham5VWkJ1shCbLNJIdX4',
-            database='VIbdz0BWDgJBaoq',
-            charset='utf8mb4'
+        result = run_agent_action(
+            'unpause', user.id, lambda: unpause_in_vicidial(user.id, user.vicidial_user)
         )
-
-        with connection.cursor() as cursor:
-            # Actualizar estado a READY
-            cursor.execute("""
-                UPDATE vicidial_live_agents 
-                SET status = 'READY', pause_code = '', last_state_change = NOW()
-                WHERE user = %s
-            """, (user.vicidial_user,))
-
-            connection.commit()
-
-        connection.close()
-
-        # Actualizar estado local
-        user.agent_status = 'READY'
-        db.session.commit()
-
-        return jsonify({
-            'success': True,
-            'message': 'Agente listo para recibir llamadas'
-        })
+        return jsonify(result)
 
     except Exception as e:
         return jsonify({
@@ -1075,50 +1650,42 @@ def simulate_call(agent_id):
 
 @app.route('/get_agent_complete_status/<int:agent_id>')
 def get_agent_complete_status(agent_id):
-    """Estado completo del agente"""
+    """Estado completo del agente (ETag/304 y long-polling con ?wait=)"""
     try:
         user = User.query.get_or_404(agent_id)
 
-        connection = pymysql.connect(
-            host='195.26.249.9',
-            port=3306,
-            user='custom',
-            password='ldb0LBeham5VWkJ1shCbLNJIdX4',
-            database='VIbdz0BWDgJBaoq',
-            charset='utf8mb4'
-        )
-
-        with connection.cursor() as cursor:
-            # Estado del agente
-            cursor.execute("""
-                           SELECT status, campaign_id, calls_today, pause_code, last_state_change
-                           FROM vicidial_live_agents
-                           WHERE user = %s
-                           """, (user.vicidial_user,))
+        def build():
+            with vicidial_pool.connection() as connection, connection.cursor() as cursor:
+                # Estado del agente
+                cursor.execute("""
+                               SELECT status, campaign_id, calls_today, pause_code, last_state_change
+                               FROM vicidial_live_agents
+                               WHERE user = %s
+                               """, (user.vicidial_user,))
 
-            agent_data = cursor.fetchone()
+                agent_data = cursor.fetchone()
 
-            # Llamadas del día
-            cursor.execute("""
-                           SELECT COUNT(*), COALESCE(SUM(length_in_sec), 0)
-                           FROM vicidial_call_log
-                           WHERE user = %s
-                             AND start_time >= CURDATE()
-                           """, (user.vicidial_user,))
+                # Llamadas del día
+                cursor.execute("""
+                               SELECT COUNT(*), COALESCE(SUM(length_in_sec), 0)
+                               FROM vicidial_call_log
+                               WHERE user = %s
+                                 AND start_time >= CURDATE()
+                               """, (user.vicidial_user,))
 
-            call_stats = cursor.fetchone()
+                call_stats = cursor.fetchone()
 
-        connection.close()
+            return {
+                'success': True,
+                'agent_status': agent_data[0] if agent_data else 'LOGOUT',
+                'campaign': agent_data[1] if agent_data else None,
+                'calls_today': call_stats[0] if call_stats else 0,
+                'talk_time_seconds': call_stats[1] if call_stats else 0,
+                'logged_in': agent_data is not None,
+                'last_change': agent_data[4].isoformat() if agent_data and agent_data[4] else None
+            }
 
-        return jsonify({
-            'success': True,
-            'agent_status': agent_data[0] if agent_data else 'LOGOUT',
-            'campaign': agent_data[1] if agent_data else None,
-            'calls_today': call_stats[0] if call_stats else 0,
-            'talk_time_seconds': call_stats[1] if call_stats else 0,
-            'logged_in': agent_data is not None,
-            'last_change': agent_data[4].isoformat() if agent_data and agent_data[4] else None
-        })
+        return conditional_json(build, agent_state_keys(user))
 
     except Exception as e:
         return jsonify({
@@ -1166,14 +1733,7 @@ def sync_agent_status():
         user = User.query.get_or_404(agent_id)
 
         # Obtener estado real de Vicidial
-        connection = pymysql.connect(
-            host='195.26.249.9',
-            port=3306,
-            user='custom',
-            password='ldb0LBeham5VWkJ1shCbLNJIdX4',
-            database='VIbdz0BWDgJBaoq',
-            charset='utf8mb4'
-        )
+        connection = get_vicidial_connection()
 
         with connection.cursor() as cursor:
             cursor.execute("""
@@ -1186,20 +1746,16 @@ def sync_agent_status():
 
             if result:
                 vicidial_status = result[0]
-                user.is_logged_in_vicidial = True
-                user.agent_status = vicidial_status
+                agent_status_store.set(user.id, vicidial_status, is_logged_in=True)
             else:
-                user.is_logged_in_vicidial = False
-                user.agent_status = 'LOGOUT'
-
-            db.session.commit()
+                agent_status_store.set(user.id, 'LOGOUT', is_logged_in=False)
 
         connection.close()
 
         return jsonify({
             'success': True,
             'message': 'Estado sincronizado',
-            'local_status': user.agent_status,
+            'local_status': agent_status_store.current(user)['agent_status'],
             'vicidial_status': vicidial_status if result else 'LOGOUT'
         })
 
@@ -1252,14 +1808,7 @@ def debug_inbound_config(agent_id):
     try:
         user = User.query.get_or_404(agent_id)
 
-        connection = pymysql.connect(
-            host='195.26.249.9',
-            port=3306,
-            user='custom',
-            password='ldb0LBeham5VWkJ1shCbLNJIdX4',
-            database='VIbdz0BWDgJBaoq',
-            charset='utf8mb4'
-        )
+        connection = get_vicidial_connection()
 
         debug_info = {}
 
@@ -1339,14 +1888,7 @@ def debug_inbound_config(agent_id):
 def debug_inbound_calls():
     """Ver llamadas entrantes en tiempo real"""
     try:
-        connection = pymysql.connect(
-            host='195.26.249.9',
-            port=3306,
-            user='custom',
-            password='ldb0LBeham5VWkJ1shCbLNJIdX4',
-            database='VIbdz0BWDgJBaoq',
-            charset='utf8mb4'
-        )
+        connection = get_vicidial_connection()
 
         with connection.cursor() as cursor:
             # Llamadas en cola DEMOIN
@@ -1357,7 +1899,7 @@ def debug_inbound_calls():
                            ORDER BY start_time DESC LIMIT 10
                            """)
 
-            active_calls = cursor.fetchall()
+            active_calls = rows_to_lists(cursor, cursor.fetchall())
 
             # Agentes activos
             cursor.execute("""
@@ -1366,11 +1908,11 @@ def debug_inbound_calls():
                            ORDER BY last_state_change DESC
                            """)
 
-            agents = cursor.fetchall()
+            agents = rows_to_lists(cursor, cursor.fetchall())
 
         connection.close()
 
-        return jsonify({
+        return json_response({
             'success': True,
             'active_calls': active_calls,
             'agents': agents,
@@ -1385,14 +1927,7 @@ def debug_inbound_calls():
 def debug_did_routing():
     """Debug del enrutamiento DID"""
     try:
-        connection = pymysql.connect(
-            host='195.26.249.9',
-            port=3306,
-            user='custom',
-            password='ldb0LBeham5VWkJ1shCbLNJIdX4',
-            database='VIbdz0BWDgJBaoq',
-            charset='utf8mb4'
-        )
+        connection = get_vicidial_connection()
 
         with connection.cursor() as cursor:
             # DIDs configurados
@@ -1429,14 +1964,7 @@ def debug_did_routing():
 def monitor_real_calls():
     """Monitorear llamadas reales que entran al sistema"""
     try:
-        connection = pymysql.connect(
-            host='195.26.249.9',
-            port=3306,
-            user='custom',
-            password='ldb0LBeham5VWkJ1shCbLNJIdX4',
-            database='VIbdz0BWDgJBaoq',
-            charset='utf8mb4'
-        )
+        connection = get_vicidial_connection()
 
         with connection.cursor() as cursor:
             # Llamadas de los últimos 5 minutos
@@ -1460,7 +1988,7 @@ def monitor_real_calls():
                                LIMIT 20
                            """)
 
-            recent_calls = cursor.fetchall()
+            calls_data = rows_to_dicts(cursor, cursor.fetchall())
 
             # Logs del sistema de los últimos minutos
             cursor.execute("""
@@ -1470,39 +1998,11 @@ def monitor_real_calls():
                            ORDER BY event_time DESC LIMIT 10
                            """)
 
-            recent_logs = cursor.fetchall()
+            logs_data = rows_to_dicts(cursor, cursor.fetchall())
 
         connection.close()
 
-        # Convertir datetime a string
-        calls_data = []
-        for call in recent_calls:
-            call_dict = {
-                'uniqueid': call[0],
-                'lead_id': call[1],
-                'phone_number': call[2],
-                'status': call[3],
-                'start_time': call[4].strftime('%Y-%m-%d %H:%M:%S') if call[4] else None,
-                'agent_user': call[5],
-                'campaign_id': call[6],
-                'first_name': call[7],
-                'last_name': call[8],
-                'city': call[9],
-                'state': call[10]
-            }
-            calls_data.append(call_dict)
-
-        logs_data = []
-        for log in recent_logs:
-            log_dict = {
-                'event_time': log[0].strftime('%Y-%m-%d %H:%M:%S') if log[0] else None,
-                'user': log[1],
-                'status': log[2],
-                'comments': log[3]
-            }
-            logs_data.append(log_dict)
-
-        return jsonify({
+        return json_response({
             'success': True,
             'recent_calls': calls_data,
             'recent_logs': logs_data,
@@ -1517,14 +2017,7 @@ def monitor_real_calls():
 def debug_call_assignment():
     """Debug específico para asignación de llamadas"""
     try:
-        connection = pymysql.connect(
-            host='195.26.249.9',
-            port=3306,
-            user='custom',
-            password='ldb0LBeham5VWkJ1shCbLNJIdX4',
-            database='VIbdz0BWDgJBaoq',
-            charset='utf8mb4'
-        )
+        connection = get_vicidial_connection()
 
         with connection.cursor() as cursor:
             # 1. Llamadas recientes del número que llamó
@@ -1544,7 +2037,7 @@ def debug_call_assignment():
                            ORDER BY start_time DESC LIMIT 5
                            """)
 
-            caller_calls = cursor.fetchall()
+            caller_calls = rows_to_lists(cursor, cursor.fetchall())
 
             # 2. Estado actual de agentes para colain
             cursor.execute("""
@@ -1555,7 +2048,7 @@ def debug_call_assignment():
                            ORDER BY last_state_change DESC
                            """)
 
-            available_agents = cursor.fetchall()
+            available_agents = rows_to_lists(cursor, cursor.fetchall())
 
             # 3. Logs del AGI para el número
             cursor.execute("""
@@ -1566,7 +2059,7 @@ def debug_call_assignment():
                            ORDER BY event_time DESC LIMIT 10
                            """)
 
-            agi_logs = cursor.fetchall()
+            agi_logs = rows_to_lists(cursor, cursor.fetchall())
 
             # 4. Verificar configuración del grupo colain
             cursor.execute("""
@@ -1581,11 +2074,11 @@ def debug_call_assignment():
                            WHERE group_id = 'colain'
                            """)
 
-            group_config = cursor.fetchone()
+            group_config = row_to_list(cursor, cursor.fetchone())
 
         connection.close()
 
-        return jsonify({
+        return json_response({
             'success': True,
             'caller_calls': caller_calls,
             'available_agents': available_agents,
@@ -1609,14 +2102,7 @@ def force_call_to_agent(phone_number, agent_id):
         user = User.query.get_or_404(agent_id)
 
         # Obtener sala MeetMe del agente
-        connection = pymysql.connect(
-            host='195.26.249.9',
-            port=3306,
-            user='custom',
-            password='ldb0LBeham5VWkJ1shCbLNJIdX4',
-            database='VIbdz0BWDgJBaoq',
-            charset='utf8mb4'
-        )
+        connection = get_vicidial_connection()
 
         with connection.cursor() as cursor:
             # Obtener conferencia del agente
@@ -1663,7 +2149,7 @@ def force_call_to_agent(phone_number, agent_id):
             # Crear llamada simulada en MeetMe
             if vicidial_ami.connected:
                 # Originar llamada que conecte el número a la sala del agente
-                connect_response = vicidial_ami.manager.send_action({
+                connect_response = vicidial_ami.send_action({
                     'Action': 'Originate',
                     'Channel': f'Local/{phone_number}@default',  # Canal del cliente
                     'Application': 'MeetMe',
@@ -1699,14 +2185,7 @@ def force_call_to_agent(phone_number, agent_id):
 def fix_inbound_group():
     """Verificar y corregir configuración del grupo colain"""
     try:
-        connection = pymysql.connect(
-            host='195.26.249.9',
-            port=3306,
-            user='custom',
-            password='ldb0LBeham5VWkJ1shCbLNJIdX4',
-            database='VIbdz0BWDgJBaoq',
-            charset='utf8mb4'
-        )
+        connection = get_vicidial_connection()
 
         with connection.cursor() as cursor:
             # Verificar configuración actual
@@ -1762,14 +2241,7 @@ def force_agent_ready(agent_id):
     try:
         user = User.query.get_or_404(agent_id)
 
-        connection = pymysql.connect(
-            host='195.26.249.9',
-            port=3306,
-            user='custom',
-            password='ldb0LBeham5VWkJ1shCbLNJIdX4',
-            database='VIbdz0BWDgJBaoq',
-            charset='utf8mb4'
-        )
+        connection = get_vicidial_connection()
 
         with connection.cursor() as cursor:
             # Verificar estado actual
@@ -1797,8 +2269,7 @@ def force_agent_ready(agent_id):
                 print(f"✅ {message}")
 
                 # Actualizar estado local también
-                user.agent_status = 'READY'
-                db.session.commit()
+                agent_status_store.set(user.id, 'READY')
 
             else:
                 # Si no existe, crear entrada
@@ -1853,26 +2324,26 @@ def debug_agent_sip(agent_id):
 
         if vicidial_ami.connected:
             # 1. Verificar si la extensión SIP existe
-            sip_response = vicidial_ami.manager.send_action({
+            sip_response = vicidial_ami.send_action({
                 'Action': 'SIPshowpeer',
                 'Peer': extension
             })
             debug_info['sip_peer'] = str(sip_response)
 
             # 2. Verificar peers SIP registrados
-            sip_peers = vicidial_ami.manager.send_action({
+            sip_peers = vicidial_ami.send_action({
                 'Action': 'SIPpeers'
             })
             debug_info['sip_peers'] = str(sip_peers)
 
             # 3. Verificar MeetMe disponible
-            meetme_list = vicidial_ami.manager.send_action({
+            meetme_list = vicidial_ami.send_action({
                 'Action': 'MeetmeList'
             })
             debug_info['meetme_available'] = str(meetme_list)
 
             # 4. Test de MeetMe específico
-            meetme_test = vicidial_ami.manager.send_action({
+            meetme_test = vicidial_ami.send_action({
                 'Action': 'MeetmeList',
                 'Conference': '8600051'
             })
@@ -1918,6 +2389,20 @@ def on_leave_agent(data):
     print(f"👤 Agente {extension} salió de su sala")
 
 
+@socketio.on('join_supervisor')
+def on_join_supervisor(data=None):
+    """Supervisor se une a la sala de alertas de SLA y recibe las activas"""
+    join_room('supervisors')
+    emit('joined', {'room': 'supervisors', 'alerts': alert_engine.active()})
+    print(f"👔 Supervisor se unió a la sala de alertas")
+
+
+@socketio.on('leave_supervisor')
+def on_leave_supervisor(data=None):
+    """Supervisor sale de la sala de alertas"""
+    leave_room('supervisors')
+
+
 @socketio.on('agent_ready')
 def on_agent_ready(data):
     """Agente se une a su sala"""
@@ -1968,6 +2453,7 @@ def assign_meetme_room(agent_user):
         return 8600051
 
 
+@traced('is_meetme_room_free')
 def is_meetme_room_free(room_number):
     """Verificar si sala MeetMe está libre"""
     try:
@@ -1976,7 +2462,7 @@ def is_meetme_room_free(room_number):
             return True
 
         # Verificar via AMI si la sala está en uso
-        response = vicidial_ami.manager.send_action({
+        response = vicidial_ami.send_action({
             'Action': 'MeetmeList',
             'Conference': str(room_number)
         })
@@ -1994,6 +2480,7 @@ def is_meetme_room_free(room_number):
         return True  # Asumir que está libre si hay error
 
 
+@traced('connect_agent_to_meetme')
 def connect_agent_to_meetme(extension, meetme_room):
     """Versión mejorada con fallbacks"""
     try:
@@ -2003,7 +2490,7 @@ def connect_agent_to_meetme(extension, meetme_room):
 
         # Método 1: Originate directo
         print(f"🎯 Método 1: Originate directo SIP/{extension}")
-        response1 = vicidial_ami.manager.send_action({
+        response1 = vicidial_ami.send_action({
             'Action': 'Originate',
             'Channel': f'SIP/{extension}',
             'Context': 'default',
@@ -2020,7 +2507,7 @@ def connect_agent_to_meetme(extension, meetme_room):
 
         # Método 2: Local channel
         print(f"🎯 Método 2: Local channel")
-        response2 = vicidial_ami.manager.send_action({
+        response2 = vicidial_ami.send_action({
             'Action': 'Originate',
             'Channel': f'Local/{extension}@from-internal',
             'Application': 'MeetMe',
@@ -2055,14 +2542,7 @@ def connect_agent_to_meetme(extension, meetme_room):
 def update_agent_conference(agent_user, meetme_room):
     """Actualizar BD con sala MeetMe asignada"""
     try:
-        connection = pymysql.connect(
-            host='195.26.249.9',
-            port=3306,
-            user='custom',
-            password='ldb0LBeham5VWkJ1shCbLNJIdX4',
-            database='VIbdz0BWDgJBaoq',
-            charset='utf8mb4'
-        )
+        connection = get_vicidial_connection()
 
         with connection.cursor() as cursor:
             # Actualizar conf_exten con el número de sala MeetMe
@@ -2090,7 +2570,7 @@ def disconnect_agent_from_meetme(extension, meetme_room=None):
             return True
 
         # Opción 1: Hangup específico del canal SIP
-        hangup_response = vicidial_ami.manager.send_action({
+        hangup_response = vicidial_ami.send_action({
             'Action': 'Hangup',
             'Channel': f'SIP/{extension}',
             'Cause': '16'  # Normal call clearing
@@ -2101,7 +2581,7 @@ def disconnect_agent_from_meetme(extension, meetme_room=None):
 
         # Opción 2: Si tenemos el número de sala, kick del MeetMe
         if meetme_room:
-            kick_response = vicidial_ami.manager.send_action({
+            kick_response = vicidial_ami.send_action({
                 'Action': 'MeetmeKick',
                 'Meetme': str(meetme_room),
                 'Usernum': 'all'
@@ -2119,14 +2599,7 @@ def simulate_incoming_call_to_meetme(agent_user, caller_number="+51987654321"):
     """Simular llamada entrante que va directo a MeetMe del agente"""
     try:
         # Buscar en qué sala MeetMe está el agente
-        connection = pymysql.connect(
-            host='195.26.249.9',
-            port=3306,
-            user='custom',
-            password='ldb0LBeham5VWkJ1shCbLNJIdX4',
-            database='VIbdz0BWDgJBaoq',
-            charset='utf8mb4'
-        )
+        connection = get_vicidial_connection()
 
         with connection.cursor() as cursor:
             cursor.execute("""
@@ -2154,7 +2627,7 @@ def simulate_incoming_call_to_meetme(agent_user, caller_number="+51987654321"):
 
         # Conectar llamada simulada a la sala MeetMe
         if vicidial_ami.connected:
-            call_response = vicidial_ami.manager.send_action({
+            call_response = vicidial_ami.send_action({
                 'Action': 'Originate',
                 'Channel': f'Local/{caller_number}@default',
                 'Application': 'MeetMe',
@@ -2181,7 +2654,5 @@ def simulate_incoming_call_to_meetme(agent_user, caller_number="+51987654321"):
 
 
 if __name__ == '__main__':
-    create_tables()  # Llamar aquí
-    init_ami()  # Inicializar AMI
-    init_realtime()  # Inicializar AMI tiempo real
+    startup.start()  # Tablas, BD Vicidial, API y AMI en segundo plano; HTTP arranca ya
     socketio.run(app, debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
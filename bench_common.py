@@ -0,0 +1,80 @@
+import json
+import threading
+import time
+
+
+def percentile(sorted_samples, pct):
+    """Percentil por rango más cercano sobre una lista ya ordenada"""
+    if not sorted_samples:
+        return 0.0
+    index = min(len(sorted_samples) - 1, int(round(pct / 100 * (len(sorted_samples) - 1))))
+    return sorted_samples[index]
+
+
+class LatencyRecorder:
+    """Acumula latencias y errores por operación desde varios hilos"""
+
+    def __init__(self):
+        self.samples = {}
+        self.errors = {}
+        self._lock = threading.Lock()
+        self.started_at = time.perf_counter()
+        self.finished_at = None
+
+    def record(self, operation, elapsed_ms, ok=True):
+        with self._lock:
+            self.samples.setdefault(operation, []).append(elapsed_ms)
+            if not ok:
+                self.errors[operation] = self.errors.get(operation, 0) + 1
+
+    def timed(self, operation, func, *args, **kwargs):
+        """Ejecutar func midiendo su latencia; ok si no lanza excepción y no devuelve False/None"""
+        start = time.perf_counter()
+        ok = True
+        result = None
+        try:
+            result = func(*args, **kwargs)
+            ok = result is not None and result is not False
+        except Exception:
+            ok = False
+        self.record(operation, (time.perf_counter() - start) * 1000, ok)
+        return result
+
+    def finish(self):
+        self.finished_at = time.perf_counter()
+
+    def summary(self):
+        """Throughput, percentiles y tasa de error por operación"""
+        elapsed = (self.finished_at or time.perf_counter()) - self.started_at
+        with self._lock:
+            items = {op: sorted(values) for op, values in self.samples.items()}
+            errors = dict(self.errors)
+
+        result = {}
+        for operation, values in items.items():
+            result[operation] = {
+                'count': len(values),
+                'errors': errors.get(operation, 0),
+                'error_rate': round(errors.get(operation, 0) / len(values), 4),
+                'throughput_rps': round(len(values) / elapsed, 1) if elapsed else 0.0,
+                'p50_ms': round(percentile(values, 50), 2),
+                'p95_ms': round(percentile(values, 95), 2),
+                'p99_ms': round(percentile(values, 99), 2),
+                'max_ms': round(values[-1], 2)
+            }
+        return result
+
+
+def print_report(title, summary):
+    """Imprimir tabla de resultados"""
+    print(f"\n📊 {title}")
+    print(f"   {'operación':<32}{'n':>7}{'err%':>7}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}")
+    for operation, row in sorted(summary.items()):
+        print(f"   {operation:<32}{row['count']:>7}{row['error_rate'] * 100:>6.1f}%{row['throughput_rps']:>9.1f}"
+              f"{row['p50_ms']:>9.1f}{row['p95_ms']:>9.1f}{row['p99_ms']:>9.1f}{row['max_ms']:>9.1f}")
+
+
+def save_report(path, report):
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"💾 Reporte guardado en {path}")
@@ -0,0 +1,376 @@
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import timeit
+from datetime import datetime, timedelta
+from bench_common import save_report
+
+# Registro de micro-benchmarks: {nombre: función que prepara y devuelve el callable a medir}
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    def decorator(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return decorator
+
+
+# Datos sintéticos
+
+class FakeEvent:
+    """Mismo acceso que un evento de pyst2: .name, .headers y event['Header']"""
+
+    def __init__(self, name, headers):
+        self.name = name
+        self.headers = dict(headers, Event=name)
+
+    def __getitem__(self, key):
+        return self.headers[key]
+
+
+class FakeSocketIO:
+    def __init__(self):
+        self.emits = 0
+
+    def emit(self, event, data=None, room=None, **kwargs):
+        self.emits += 1
+
+
+class FakeCursor:
+    def __init__(self, columns, rows):
+        self.description = [(name,) for name in columns]
+        self._rows = rows
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=None):
+        return len(self._rows)
+
+    def fetchall(self):
+        return self._rows
+
+
+class FakeConnection:
+    """Conexión que devuelve siempre las mismas filas (sin red ni MySQL)"""
+
+    def __init__(self, columns, rows):
+        self.columns = columns
+        self.rows = rows
+
+    def cursor(self):
+        return FakeCursor(self.columns, self.rows)
+
+
+class FakeAMI:
+    """AMI conectado donde las primeras `busy` salas MeetMe están ocupadas"""
+
+    BUSY_RESPONSE = 'Response: Success\r\n' + 'Event: MeetmeList\r\nConference: 8600051\r\nUserNumber: 1\r\n' * 3
+
+    def __init__(self, busy=0):
+        self.connected = True
+        self.busy = busy
+
+    def send_action(self, action):
+        room = int(action.get('Conference', 0))
+        if room - 8600051 < self.busy:
+            return self.BUSY_RESPONSE
+        return 'Response: Error\r\nMessage: No active conferences.\r\n'
+
+
+def new_channel_event(extension='7001', sequence=1):
+    return FakeEvent('Newchannel', {
+        'Privilege': 'call,all', 'Channel': f'SIP/{extension}-{sequence:08x}', 'ChannelState': '4',
+        'ChannelStateDesc': 'Ring', 'CallerIDNum': '987654321', 'CallerIDName': '', 'Exten': extension,
+        'Context': 'default', 'Uniqueid': f'1700000000.{sequence}'})
+
+
+def bridge_event(extension='7001', sequence=1):
+    return FakeEvent('Bridge', {
+        'Privilege': 'call,all', 'Bridgestate': 'Link', 'Bridgetype': 'core',
+        'Channel1': f'Local/987654321@default-{sequence:08x};2', 'Channel2': f'SIP/{extension}-{sequence:08x}',
+        'Uniqueid1': f'1700000000.{sequence + 1}', 'Uniqueid2': f'1700000000.{sequence}'})
+
+
+def hangup_event(extension='7001', sequence=1):
+    return FakeEvent('Hangup', {
+        'Privilege': 'call,all', 'Channel': f'SIP/{extension}-{sequence:08x}',
+        'Uniqueid': f'1700000000.{sequence}', 'CallerIDNum': '987654321',
+        'Cause': '16', 'Cause-txt': 'Normal Clearing'})
+
+
+def varset_event():
+    """El evento más frecuente en un AMI real y que nadie procesa"""
+    return FakeEvent('VarSet', {'Privilege': 'dialplan,all', 'Channel': 'SIP/7001-00000001',
+                                'Variable': 'BRIDGEPEER', 'Value': 'Local/987654321@default-00000001;2',
+                                'Uniqueid': '1700000000.1'})
+
+
+LIVE_CALL_COLUMNS = ('uniqueid', 'lead_id', 'agent_user', 'status', 'campaign_id', 'phone_number',
+                     'server_ip', 'start_time', 'start_epoch', 'channel', 'first_name', 'last_name', 'city', 'state',
+                     'address1')
+LIVE_AGENT_COLUMNS = ('user', 'status', 'campaign_id', 'conf_exten', 'server_ip', 'last_call_time',
+                      'calls_today', 'pause_code', 'last_state_change', 'last_state_epoch')
+
+
+def live_call_rows(count):
+    now = datetime(2024, 1, 1, 12, 0, 0)
+    return [(f'1700000000.{i}', 1000 + i, f'agent{i % 50}', random.choice(['LIVE', 'QUEUE', 'INCALL', 'RING']),
+             'DEMOIN', f'9{10000000 + i}', '195.26.249.9', now - timedelta(seconds=i),
+             int(now.timestamp()) - i, f'SIP/{7000 + i % 50}-{i:08x}',
+             'Juan', 'Pérez', 'Lima', 'LI', 'Av. Arequipa 123') for i in range(count)]
+
+
+def live_agent_rows(count):
+    now = datetime(2024, 1, 1, 12, 0, 0)
+    return [(f'agent{i}', random.choice(['READY', 'INCALL', 'PAUSED']), 'DEMOIN', f'86000{51 + i % 49}',
+             '195.26.249.9', now - timedelta(seconds=30 + i), i % 40, '' if i % 3 else 'BREAK',
+             now - timedelta(seconds=i), int(now.timestamp()) - i) for i in range(count)]
+
+
+# Benchmarks
+
+def make_realtime():
+    from profiler import profiler
+    from vicidial_realtime import VicidialRealtime
+
+    realtime = VicidialRealtime(FakeSocketIO())
+    handlers = {
+        'Newchannel': profiler.wrap('ami:Newchannel', realtime.on_new_channel),
+        'Bridge': profiler.wrap('ami:Bridge', realtime.on_bridge),
+        'Hangup': profiler.wrap('ami:Hangup', realtime.on_hangup),
+    }
+    return realtime, handlers
+
+
+@benchmark('realtime.on_new_channel')
+def bench_on_new_channel():
+    realtime, handlers = make_realtime()
+    event = new_channel_event()
+    handler = handlers['Newchannel']
+    return lambda: handler(event, None)
+
+
+@benchmark('realtime.on_new_channel_non_sip')
+def bench_on_new_channel_non_sip():
+    realtime, handlers = make_realtime()
+    event = FakeEvent('Newchannel', {'Channel': 'Local/987654321@default-00000001;1',
+                                     'CallerIDNum': '987654321', 'Context': 'default'})
+    handler = handlers['Newchannel']
+    return lambda: handler(event, None)
+
+
+@benchmark('realtime.on_bridge')
+def bench_on_bridge():
+    realtime, handlers = make_realtime()
+    handlers['Newchannel'](new_channel_event(), None)
+    event = bridge_event()
+    handler = handlers['Bridge']
+    return lambda: handler(event, None)
+
+
+@benchmark('realtime.on_hangup')
+def bench_on_hangup():
+    # Incluye volver a registrar la llamada (una asignación de dict) para que haya qué colgar
+    realtime, handlers = make_realtime()
+    event = hangup_event()
+    call_info = {'channel': event['Channel'], 'caller_id': '987654321', 'extension': '7001',
+                 'timestamp': '12:00:00', 'status': 'connected'}
+    active_calls = realtime.active_calls
+    handler = handlers['Hangup']
+
+    def run():
+        active_calls[event['Channel']] = call_info
+        handler(event, None)
+    return run
+
+
+@benchmark('realtime.call_lifecycle')
+def bench_call_lifecycle():
+    realtime, handlers = make_realtime()
+    events = [(handlers['Newchannel'], new_channel_event()), (handlers['Bridge'], bridge_event()),
+              (handlers['Hangup'], hangup_event())]
+
+    def run():
+        for handler, event in events:
+            handler(event, None)
+    return run
+
+
+def make_ami():
+    from vicidial_ami import VicidialAMI
+
+    ami = VicidialAMI()
+    ami.register_event_callback('Newchannel', lambda event: None)
+    return ami
+
+
+@benchmark('ami._event_handler_logged')
+def bench_ami_event_logged():
+    ami = make_ami()
+    event = new_channel_event()
+    return lambda: ami._event_handler(event, None)
+
+
+@benchmark('ami._event_handler_ignored')
+def bench_ami_event_ignored():
+    ami = make_ami()
+    event = varset_event()
+    return lambda: ami._event_handler(event, None)
+
+
+def make_monitor(columns, rows):
+    from call_monitor import VicidialCallMonitor
+
+    monitor = VicidialCallMonitor()
+    monitor.connection = FakeConnection(columns, rows)
+    return monitor
+
+
+@benchmark('call_monitor.get_live_calls_200')
+def bench_live_calls():
+    monitor = make_monitor(LIVE_CALL_COLUMNS, live_call_rows(200))
+    return monitor.get_live_calls
+
+
+@benchmark('call_monitor.get_live_agents_500')
+def bench_live_agents():
+    monitor = make_monitor(LIVE_AGENT_COLUMNS, live_agent_rows(500))
+    return monitor.get_live_agents
+
+
+def make_meetme(busy):
+    import app
+
+    app.vicidial_ami = FakeAMI(busy)
+    return lambda: app.assign_meetme_room('agent1')
+
+
+@benchmark('app.assign_meetme_room_free')
+def bench_meetme_free():
+    return make_meetme(busy=0)
+
+
+@benchmark('app.assign_meetme_room_busy_20')
+def bench_meetme_busy():
+    return make_meetme(busy=20)
+
+
+# Medición
+
+def measure(func, repeat, min_time):
+    """Microsegundos por llamada: mejor y mediana de `repeat` rondas de >= min_time segundos"""
+    timer = timeit.Timer(func)
+    number, elapsed = timer.autorange()
+    number = max(1, int(number * min_time / max(elapsed, 1e-9)))
+    rounds = [t / number * 1e6 for t in timer.repeat(repeat=repeat, number=number)]
+    return {'best_us': round(min(rounds), 3), 'median_us': round(statistics.median(rounds), 3),
+            'number': number}
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(names, repeat, min_time):
+    results = {}
+    skipped = {}
+    # Los handlers imprimen en cada evento: a /dev/null como stdout de producción redirigido
+    with open(os.devnull, 'w') as devnull:
+        for name in names:
+            try:
+                with contextlib.redirect_stdout(devnull):
+                    func = BENCHMARKS[name]()
+                    results[name] = measure(func, repeat, min_time)
+            except ImportError as e:
+                skipped[name] = str(e)
+                print(f"⚠️ {name} omitido: {e}")
+                continue
+            print(f"   {name:<40}{results[name]['best_us']:>12.2f}{results[name]['median_us']:>12.2f}")
+    return results, skipped
+
+
+def compare(results, baseline, threshold):
+    """Regresiones: benchmarks cuyo mejor tiempo supera el de la línea base en más de threshold"""
+    regressions = []
+    print(f"\n📏 Comparación con línea base {baseline.get('revision') or ''} (umbral +{threshold:.0%})")
+    print(f"   {'benchmark':<40}{'base µs':>12}{'ahora µs':>12}{'cambio':>10}")
+    for name, result in sorted(results.items()):
+        base = baseline['results'].get(name)
+        if base is None:
+            print(f"   {name:<40}{'-':>12}{result['best_us']:>12.2f}{'nuevo':>10}")
+            continue
+        change = result['best_us'] / base['best_us'] - 1
+        mark = '❌' if change > threshold else ('✅' if change < -threshold else '  ')
+        print(f"   {name:<40}{base['best_us']:>12.2f}{result['best_us']:>12.2f}{change:>+9.1%} {mark}")
+        if change > threshold:
+            regressions.append({'benchmark': name, 'baseline_us': base['best_us'],
+                                'current_us': result['best_us'], 'change': round(change, 4)})
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Micro-benchmarks de rutas calientes (eventos AMI, filas, MeetMe)')
+    parser.add_argument('--filter', help='Solo benchmarks cuyo nombre contiene este texto')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--min-time', type=float, default=0.2, help='Segundos mínimos por ronda')
+    parser.add_argument('--save-baseline', metavar='ARCHIVO', help='Guardar resultados como línea base')
+    parser.add_argument('--compare', metavar='ARCHIVO', help='Comparar con una línea base guardada')
+    parser.add_argument('--threshold', type=float, default=0.15,
+                        help='Fracción de empeoramiento que cuenta como regresión (0.15 = 15%%)')
+    parser.add_argument('--list', action='store_true', help='Listar benchmarks y salir')
+    parser.add_argument('--output', help='Guardar reporte JSON en este archivo')
+    args = parser.parse_args()
+
+    names = [name for name in BENCHMARKS if not args.filter or args.filter in name]
+    if args.list:
+        print('\n'.join(names))
+        sys.exit(0)
+
+    random.seed(1234)  # mismas filas sintéticas en cada corrida
+    print(f"\n⏱️ Micro-benchmarks (mejor y mediana de {args.repeat}, µs por llamada)")
+    print(f"   {'benchmark':<40}{'mejor':>12}{'mediana':>12}")
+    results, skipped = run_benchmarks(names, args.repeat, args.min_time)
+
+    report = {
+        'revision': git_revision(),
+        'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'results': results,
+        'skipped': skipped
+    }
+
+    regressions = []
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline.get('python') != report['python'] or baseline.get('machine') != report['machine']:
+            print(f"⚠️ Línea base tomada con Python {baseline.get('python')} en {baseline.get('machine')}: "
+                  f"los tiempos pueden no ser comparables")
+        regressions = compare(results, baseline, args.threshold)
+        report['baseline'] = args.compare
+        report['regressions'] = regressions
+
+    if args.save_baseline:
+        save_report(args.save_baseline, report)
+    if args.output:
+        save_report(args.output, report)
+
+    if regressions:
+        print(f"\n❌ {len(regressions)} regresión(es) sobre el umbral de {args.threshold:.0%}")
+        sys.exit(1)
@@ -0,0 +1,108 @@
+import argparse
+import json
+import random
+import timeit
+from datetime import datetime, timedelta
+from bench_common import save_report
+import row_serializer
+from row_serializer import RowSerializer
+
+# Mismas columnas que monitor_real_calls
+COLUMNS = ('uniqueid', 'lead_id', 'phone_number', 'status', 'start_time', 'agent_user',
+           'campaign_id', 'first_name', 'last_name', 'city', 'state')
+
+
+class FakeCursor:
+    description = [(name,) for name in COLUMNS]
+
+
+def make_rows(count):
+    now = datetime.now()
+    return [
+        (f'{1700000000 + i}.{i}', 1000 + i, f'9{random.randint(10000000, 99999999)}',
+         random.choice(['LIVE', 'QUEUE', 'INCALL', 'RING']), now - timedelta(seconds=i),
+         f'agent{i % 50}', 'DEMOIN', 'Juan', 'Pérez', 'Lima', 'LI')
+        for i in range(count)
+    ]
+
+
+def legacy_default(value):
+    """Lo que hace jsonify con un datetime (formato HTTP)"""
+    if isinstance(value, datetime):
+        return value.strftime('%a, %d %b %Y %H:%M:%S GMT')
+    raise TypeError(type(value).__name__)
+
+
+def legacy(rows):
+    """Código actual: dict fila por fila, strftime por campo y json de la stdlib"""
+    calls_data = []
+    for call in rows:
+        call_dict = {
+            'uniqueid': call[0],
+            'lead_id': call[1],
+            'phone_number': call[2],
+            'status': call[3],
+            'start_time': call[4].strftime('%Y-%m-%d %H:%M:%S') if call[4] else None,
+            'agent_user': call[5],
+            'campaign_id': call[6],
+            'first_name': call[7],
+            'last_name': call[8],
+            'city': call[9],
+            'state': call[10]
+        }
+        calls_data.append(call_dict)
+    return json.dumps({'success': True, 'recent_calls': calls_data}, default=legacy_default,
+                      sort_keys=True).encode('utf-8')
+
+
+def legacy_raw(rows):
+    """jsonify directo de fetchall() (debug_inbound_calls, debug_call_assignment)"""
+    return json.dumps({'success': True, 'rows': rows}, default=legacy_default, sort_keys=True).encode('utf-8')
+
+
+def fast(rows):
+    return row_serializer.dumps({'success': True,
+                                 'recent_calls': RowSerializer.from_cursor(FakeCursor).dicts(rows)})
+
+
+def fast_raw(rows):
+    return row_serializer.dumps({'success': True, 'rows': RowSerializer.from_cursor(FakeCursor).lists(rows)})
+
+
+def measure(func, rows, repeat):
+    number = max(1, 20000 // len(rows))
+    best = min(timeit.repeat(lambda: func(rows), number=number, repeat=repeat)) / number
+    return best * 1000
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark del serializador de filas contra el código actual')
+    parser.add_argument('--rows', type=int, nargs='+', default=[20, 200, 2000])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--no-orjson', action='store_true', help='Forzar json de la stdlib')
+    parser.add_argument('--output', help='Guardar reporte JSON en este archivo')
+    args = parser.parse_args()
+
+    if args.no_orjson:
+        row_serializer.orjson = None
+    backend = 'orjson' if row_serializer.orjson else 'json'
+
+    report = {'backend': backend, 'results': {}}
+    print(f"\n📊 Serialización de filas (backend {backend}, mejor de {args.repeat}, ms por payload)")
+    print(f"   {'filas':>7}{'dicts actual':>15}{'dicts rápido':>15}{'x':>7}{'listas actual':>16}{'listas rápido':>16}{'x':>7}")
+    for count in args.rows:
+        rows = make_rows(count)
+        result = {
+            'dicts_legacy_ms': measure(legacy, rows, args.repeat),
+            'dicts_fast_ms': measure(fast, rows, args.repeat),
+            'lists_legacy_ms': measure(legacy_raw, rows, args.repeat),
+            'lists_fast_ms': measure(fast_raw, rows, args.repeat),
+        }
+        report['results'][count] = {key: round(value, 4) for key, value in result.items()}
+        print(f"   {count:>7}{result['dicts_legacy_ms']:>15.3f}{result['dicts_fast_ms']:>15.3f}"
+              f"{result['dicts_legacy_ms'] / result['dicts_fast_ms']:>6.1f}x"
+              f"{result['lists_legacy_ms']:>16.3f}{result['lists_fast_ms']:>16.3f}"
+              f"{result['lists_legacy_ms'] / result['lists_fast_ms']:>6.1f}x")
+
+    if args.output:
+        save_report(args.output, report)
@@ -0,0 +1,139 @@
+import argparse
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from bench_common import LatencyRecorder, print_report, save_report
+from vicidial_stub_server import VicidialStubServer
+
+
+def agent_data(index):
+    return {
+        'name': f'Bench Agent {index}',
+        'email': f'bench{index}@example.com',
+        'vicidial_user': f'bench{index}',
+        'vicidial_user_pass': 'bench',
+        'vicidial_phone_login': str(7000 + index),
+        'vicidial_phone_pass': 'bench'
+    }
+
+
+def bench_api(args):
+    """Ciclo de turno completo por agente directamente contra VicidialAPI"""
+    from vicidial_api import VicidialAPI
+
+    api = VicidialAPI()
+    recorder = LatencyRecorder()
+
+    def ok(response):
+        return response if response and 'SUCCESS' in response else None
+
+    def agent_cycle(index):
+        data = agent_data(index)
+        user = data['vicidial_user']
+        recorder.timed('add_user', lambda: ok(api.create_agent(data)))
+        recorder.timed('add_phone', lambda: ok(api.create_phone(data)))
+        recorder.timed('update_user', lambda: ok(api.update_user_phone(data)))
+        recorder.timed('external_login', lambda: ok(api.agent_login(user, 'bench', data['vicidial_phone_login'], 'bench', 'DEMOIN')))
+        for _ in range(args.status_polls):
+            recorder.timed('user_status', api.get_agent_status, user)
+        recorder.timed('change_agent_status', lambda: ok(api.set_agent_status(user, 'PAUSED', 'BREAK')))
+        recorder.timed('change_agent_status', lambda: ok(api.set_agent_status(user, 'READY')))
+        recorder.timed('campaigns_list', api.list_campaigns)
+        recorder.timed('external_logout', lambda: ok(api.agent_logout(user)))
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        list(executor.map(agent_cycle, range(args.agents)))
+
+    recorder.finish()
+    summary = recorder.summary()
+    print_report(f'VicidialAPI: {args.agents} agentes, concurrencia {args.concurrency}', summary)
+    return {'summary': summary, 'client_metrics': api.get_metrics(),
+            'coalescing': api.status_flight.get_stats()}
+
+
+def bench_flask(args):
+    """Mismas operaciones a través de las rutas Flask"""
+    from app import app, db, User, create_tables
+
+    create_tables()
+    with app.app_context():
+        user_ids = []
+        for index in range(args.agents):
+            data = agent_data(args.agents + index)
+            user = User.query.filter_by(vicidial_user=data['vicidial_user']).first()
+            if not user:
+                user = User(**{key: value for key, value in data.items()})
+                db.session.add(user)
+            user_ids.append(user)
+        db.session.commit()
+        user_ids = [user.id for user in user_ids]
+
+        # Los usuarios deben existir en el Vicidial simulado para poder loguearse
+        from vicidial_api import VicidialAPI
+        api = VicidialAPI()
+        for index in range(args.agents):
+            api.create_agent_complete(agent_data(args.agents + index))
+
+    recorder = LatencyRecorder()
+    local = threading.local()
+
+    def client():
+        if not hasattr(local, 'client'):
+            local.client = app.test_client()
+        return local.client
+
+    def request(operation, method, url, **kwargs):
+        def call():
+            response = getattr(client(), method)(url, **kwargs)
+            body = response.get_json(silent=True) or {}
+            return response if response.status_code < 400 and body.get('success') else None
+        recorder.timed(operation, call)
+
+    def agent_cycle(user_id):
+        request('POST /agent_login', 'post', '/agent_login', json={'user_id': user_id, 'campaign': 'DEMOIN'})
+        for _ in range(args.status_polls):
+            request('GET /get_agent_status', 'get', f'/get_agent_status/{user_id}')
+        request('POST /agent_logout', 'post', '/agent_logout', json={'user_id': user_id})
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        list(executor.map(agent_cycle, user_ids))
+
+    recorder.finish()
+    summary = recorder.summary()
+    print_report(f'Rutas Flask: {args.agents} agentes, concurrencia {args.concurrency}', summary)
+    return {'summary': summary}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark de VicidialAPI y rutas Flask contra Vicidial simulado')
+    parser.add_argument('--agents', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--status-polls', type=int, default=5)
+    parser.add_argument('--latency-ms', type=float, default=20)
+    parser.add_argument('--jitter-ms', type=float, default=10)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--url', help='Usar un non_agent_api.php ya levantado en lugar del simulado')
+    parser.add_argument('--skip-flask', action='store_true')
+    parser.add_argument('--output', help='Guardar reporte JSON en este archivo')
+    args = parser.parse_args()
+
+    stub = None
+    if not args.url:
+        stub = VicidialStubServer(port=0, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                                  error_rate=args.error_rate).start()
+
+    # Config lee el entorno al importarse: configurar antes de importar la API o la app
+    os.environ['VICIDIAL_API_URL'] = args.url or stub.url
+    os.environ.setdefault('LOCAL_DATABASE_URI', f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}")
+
+    report = {'api': bench_api(args)}
+    if not args.skip_flask:
+        report['flask'] = bench_flask(args)
+
+    if stub:
+        print(f"\n🧪 Peticiones atendidas por el simulado: {stub.state.requests}")
+        stub.stop()
+
+    if args.output:
+        save_report(args.output, report)
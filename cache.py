@@ -0,0 +1,239 @@
+import threading
+import time
+
+
+class _Entry:
+    __slots__ = ('value', 'loaded_at', 'refreshing')
+
+    def __init__(self, value, loaded_at):
+        self.value = value
+        self.loaded_at = loaded_at
+        self.refreshing = False
+
+
+class TTLCache:
+    """Caché con TTL, refresco en segundo plano y stale-while-revalidate
+
+    - Edad < refresh_ahead * ttl: se devuelve el valor sin más.
+    - Edad < ttl: se devuelve el valor y se refresca en segundo plano.
+    - Edad < ttl + stale_ttl: se devuelve el valor viejo y se refresca en segundo plano.
+    - Más viejo (o sin valor): se carga en el hilo actual (una sola carga por clave).
+
+    max_entries: al superarlo se eliminan las entradas vencidas y, si no
+    alcanza, las cargadas hace más tiempo (con sus locks de clave).
+    """
+
+    def __init__(self, ttl, stale_ttl=0, refresh_ahead=0.8, name='cache', max_entries=1000):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.refresh_ahead = refresh_ahead
+        self.name = name
+        self.max_entries = max_entries
+        self._entries = {}
+        self._key_locks = {}
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'stale_hits': 0, 'misses': 0, 'refreshes': 0, 'errors': 0, 'evictions': 0}
+
+    def _key_lock(self, key):
+        with self._lock:
+            if key not in self._key_locks:
+                self._key_locks[key] = threading.Lock()
+            return self._key_locks[key]
+
+    def _count(self, stat):
+        with self._lock:
+            self._stats[stat] += 1
+
+    def _load(self, key, loader):
+        """Cargar y guardar; un resultado None (error de la API) no se guarda"""
+        value = loader()
+        if value is None:
+            self._count('errors')
+            return None
+
+        with self._lock:
+            self._entries[key] = _Entry(value, time.monotonic())
+            if len(self._entries) > self.max_entries:
+                self._evict()
+        return value
+
+    def _evict(self):
+        """Bajar a max_entries: primero lo vencido, después lo más viejo (con el lock tomado)"""
+        now = time.monotonic()
+        max_age = self.ttl + self.stale_ttl
+        evicted = [key for key, entry in self._entries.items() if now - entry.loaded_at >= max_age]
+        excess = len(self._entries) - len(evicted) - self.max_entries
+        if excess > 0:
+            fresh = sorted((entry.loaded_at, key) for key, entry in self._entries.items()
+                           if now - entry.loaded_at < max_age)
+            evicted += [key for _, key in fresh[:excess]]
+
+        for key in evicted:
+            del self._entries[key]
+        self._stats['evictions'] += len(evicted)
+
+        # Locks de claves sin entrada que nadie está usando
+        for key in [key for key, lock in self._key_locks.items() if key not in self._entries and not lock.locked()]:
+            del self._key_locks[key]
+
+    def _refresh_in_background(self, key, entry, loader):
+        with self._lock:
+            if entry.refreshing:
+                return
+            entry.refreshing = True
+            self._stats['refreshes'] += 1
+
+        def refresh():
+            try:
+                self._load(key, loader)
+            except Exception as e:
+                self._count('errors')
+                print(f"⚠️ Error refrescando {self.name}[{key}]: {e}")
+            finally:
+                entry.refreshing = False
+
+        thread = threading.Thread(target=refresh, name=f'{self.name}-refresh')
+        thread.daemon = True
+        thread.start()
+
+    def get(self, key, loader):
+        """Obtener valor de la caché usando loader() para cargarlo si hace falta"""
+        with self._lock:
+            entry = self._entries.get(key)
+
+        if entry is not None:
+            age = time.monotonic() - entry.loaded_at
+
+            if age < self.ttl + self.stale_ttl:
+                self._count('hits' if age < self.ttl else 'stale_hits')
+                if age >= self.ttl * self.refresh_ahead:
+                    self._refresh_in_background(key, entry, loader)
+                return entry.value
+
+        # Sin valor utilizable: solo un hilo carga, el resto espera su resultado
+        with self._key_lock(key):
+            with self._lock:
+                current = self._entries.get(key)
+            if current is not None and current is not entry:
+                self._count('hits')
+                return current.value
+
+            self._count('misses')
+            try:
+                value = self._load(key, loader)
+            except Exception as e:
+                # Circuito abierto o error de red: mejor un valor viejo que nada
+                if entry is None:
+                    raise
+                self._count('errors')
+                print(f"⚠️ Error recargando {self.name}[{key}], se usa el valor anterior: {e}")
+                return entry.value
+
+            # Si la API falla, mejor un valor viejo que nada
+            if value is None and entry is not None:
+                return entry.value
+            return value
+
+    def invalidate(self, key=None):
+        """Invalidar una clave o toda la caché"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self._stats, keys=len(self._entries))
+
+
+class _Call:
+    __slots__ = ('event', 'value', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SingleFlight:
+    """Coalescencia de llamadas idénticas concurrentes (single-flight)
+
+    Las llamadas con la misma clave que llegan mientras otra está en curso
+    esperan y comparten su resultado; el resultado se reutiliza durante result_ttl.
+    forget() sube la generación de la clave: una llamada que empezó antes no
+    guarda su resultado y las siguientes no se suman a ella.
+    """
+
+    def __init__(self, result_ttl=0.0, name='singleflight'):
+        self.result_ttl = result_ttl
+        self.name = name
+        self._calls = {}
+        self._results = {}
+        self._generations = {}  # {clave: número de forget()}
+        self._lock = threading.Lock()
+        self._stats = {'executions': 0, 'coalesced': 0, 'result_hits': 0, 'errors': 0}
+
+    def do(self, key, func):
+        """Ejecutar func() una sola vez para todas las llamadas concurrentes con esta clave"""
+        with self._lock:
+            result = self._results.get(key)
+            if result is not None and time.monotonic() - result[1] < self.result_ttl:
+                self._stats['result_hits'] += 1
+                return result[0]
+
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+                generation = self._generations.get(key, 0)
+                self._stats['executions'] += 1
+            else:
+                self._stats['coalesced'] += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = func()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+                if call.error is not None or call.value is None:
+                    self._stats['errors'] += 1
+                elif self.result_ttl and self._generations.get(key, 0) == generation:
+                    self._prune()
+                    self._results[key] = (call.value, time.monotonic())
+            call.event.set()
+
+        return call.value
+
+    def _prune(self):
+        """Eliminar resultados vencidos (se llama con el lock tomado)"""
+        if len(self._results) < 1000:
+            return
+        now = time.monotonic()
+        for key in [k for k, (_, stored_at) in self._results.items() if now - stored_at >= self.result_ttl]:
+            del self._results[key]
+
+    def forget(self, key):
+        """Descartar el resultado guardado de una clave (p. ej. tras cambiar el estado)"""
+        with self._lock:
+            self._results.pop(key, None)
+            self._calls.pop(key, None)
+            self._generations[key] = self._generations.get(key, 0) + 1
+
+    def get_stats(self):
+        with self._lock:
+            total = self._stats['executions'] + self._stats['coalesced'] + self._stats['result_hits']
+            saved = self._stats['coalesced'] + self._stats['result_hits']
+            return dict(self._stats, in_flight=len(self._calls),
+                        saved_ratio=round(saved / total, 3) if total else 0.0)
@@ -1,8 +1,9 @@
-import pymysql
 import time
 import json
 from datetime import datetime
 from config import Config
+from row_serializer import rows_to_dicts
+from vicidial_db import get_vicidial_connection
 
 class VicidialCallMonitor:
     def __init__(self):
@@ -16,14 +17,10 @@ class VicidialCallMonitor:
     def connect(self):
         """Conectar a la base de datos de Vicidial"""
         try:
-            self.connection = pymysql.connect(
-                host=self.host,
-                port=self.port,
-                user=self.user,
-                password=self.password,
-                database=self.database,
-                charset='utf8mb4'
-            )
+            self.connection = get_vicidial_connection()
+            # Autocommit: cada consulta lee datos nuevos; con una transacción abierta
+            # (REPEATABLE READ) la huella del tick siguiente vería la foto anterior
+            self.connection.autocommit(True)
             print("✅ Conectado a base de datos Vicidial")
             return True
         except Exception as e:
@@ -31,7 +28,7 @@ class VicidialCallMonitor:
             return False
 
     def get_live_agents(self):
-        """Obtener agentes activos en tiempo real"""
+        """Obtener agentes activos en tiempo real (None si la consulta falla)"""
         try:
             with self.connection.cursor() as cursor:
                 query = """
@@ -44,32 +41,22 @@ class VicidialCallMonitor:
                     last_call_time,
                     calls_today,
                     pause_code,
-                    last_state_change
+                    last_state_change,
+                    UNIX_TIMESTAMP(last_state_change) AS last_state_epoch
                 FROM vicidial_live_agents 
                 WHERE status != 'LOGOUT'
                 ORDER BY last_state_change DESC
                 """
                 cursor.execute(query)
-                agents = cursor.fetchall()
-
-                # Convertir a lista de diccionarios
-                agent_list = []
-                columns = [desc[0] for desc in cursor.description]
-                for agent in agents:
-                    agent_dict = dict(zip(columns, agent))
-                    # Convertir datetime a string para JSON
-                    for key, value in agent_dict.items():
-                        if isinstance(value, datetime):
-                            agent_dict[key] = value.strftime('%Y-%m-%d %H:%M:%S')
-                    agent_list.append(agent_dict)
+                agent_list = rows_to_dicts(cursor, cursor.fetchall())
 
                 return agent_list
         except Exception as e:
             print(f"❌ Error obteniendo agentes: {e}")
-            return []
+            return None
 
     def get_live_calls(self):
-        """Obtener llamadas activas en tiempo real"""
+        """Obtener llamadas activas en tiempo real (None si la consulta falla)"""
         try:
             with self.connection.cursor() as cursor:
                 query = """
@@ -82,6 +69,7 @@ class VicidialCallMonitor:
                     vac.phone_number,
                     vac.server_ip,
                     vac.start_time,
+                    UNIX_TIMESTAMP(vac.start_time) AS start_epoch,
                     vac.channel,
                     vl.first_name,
                     vl.last_name,
@@ -94,23 +82,12 @@ class VicidialCallMonitor:
                 ORDER BY vac.start_time DESC
                 """
                 cursor.execute(query)
-                calls = cursor.fetchall()
-
-                # Convertir a lista de diccionarios
-                call_list = []
-                columns = [desc[0] for desc in cursor.description]
-                for call in calls:
-                    call_dict = dict(zip(columns, call))
-                    # Convertir datetime a string para JSON
-                    for key, value in call_dict.items():
-                        if isinstance(value, datetime):
-                            call_dict[key] = value.strftime('%Y-%m-%d %H:%M:%S')
-                    call_list.append(call_dict)
+                call_list = rows_to_dicts(cursor, cursor.fetchall())
 
                 return call_list
         except Exception as e:
             print(f"❌ Error obteniendo llamadas: {e}")
-            return []
+            return None
 
     def get_agent_calls(self, agent_user):
         """Obtener llamadas específicas de un agente"""
@@ -135,16 +112,7 @@ class VicidialCallMonitor:
                 ORDER BY vac.start_time DESC
                 """
                 cursor.execute(query, (agent_user,))
-                calls = cursor.fetchall()
-
-                call_list = []
-                columns = [desc[0] for desc in cursor.description]
-                for call in calls:
-                    call_dict = dict(zip(columns, call))
-                    for key, value in call_dict.items():
-                        if isinstance(value, datetime):
-                            call_dict[key] = value.strftime('%Y-%m-%d %H:%M:%S')
-                    call_list.append(call_dict)
+                call_list = rows_to_dicts(cursor, cursor.fetchall())
 
                 return call_list
         except Exception as e:
@@ -214,55 +182,200 @@ class VicidialCallMonitor:
                 LIMIT %s
                 """
                 cursor.execute(query, (limit,))
-                calls = cursor.fetchall()
-
-                call_list = []
-                columns = [desc[0] for desc in cursor.description]
-                for call in calls:
-                    call_dict = dict(zip(columns, call))
-                    for key, value in call_dict.items():
-                        if isinstance(value, datetime):
-                            call_dict[key] = value.strftime('%Y-%m-%d %H:%M:%S')
-                    call_list.append(call_dict)
+                call_list = rows_to_dicts(cursor, cursor.fetchall())
 
                 return call_list
         except Exception as e:
             print(f"❌ Error obteniendo llamadas recientes: {e}")
             return []
 
+    def get_change_markers(self):
+        """Huella barata de vicidial_live_agents y vicidial_auto_calls
+
+        Conteo, último cambio de estado y suma de CRC32 de las columnas que
+        muestran los reportes. No usa last_update_time de vicidial_live_agents:
+        la pantalla del agente lo actualiza cada segundo aunque nada cambie.
+        Devuelve {'agents': (...), 'calls': (...)} o None si falla.
+        """
+        try:
+            with self.connection.cursor() as cursor:
+                cursor.execute("""
+                    SELECT COUNT(*),
+                           MAX(last_state_change),
+                           COALESCE(SUM(CRC32(CONCAT_WS('|', user, status, campaign_id, conf_exten,
+                                                        pause_code, calls_today, last_call_time))), 0)
+                    FROM vicidial_live_agents
+                """)
+                agents = tuple(cursor.fetchone())
+
+                cursor.execute("""
+                    SELECT COUNT(*),
+                           COALESCE(SUM(CRC32(CONCAT_WS('|', uniqueid, status, agent_user, campaign_id,
+                                                        lead_id))), 0)
+                    FROM vicidial_auto_calls
+                """)
+                calls = tuple(cursor.fetchone())
+
+            return {'agents': agents, 'calls': calls}
+        except Exception as e:
+            print(f"❌ Error obteniendo marcadores de cambio: {e}")
+            return None
+
+    def reconnect(self):
+        """Descartar la conexión actual y abrir otra"""
+        if self.connection:
+            try:
+                self.connection.close()
+            except Exception:
+                pass
+        return self.connect()
+
     def close(self):
         """Cerrar conexión"""
         if self.connection:
             self.connection.close()
             print("🔌 Conexión BD cerrada")
 
-# Ejemplo de uso
-if __name__ == "__main__":
-    monitor = VicidialCallMonitor()
 
-    if monitor.connect():
-        print("🎯 Monitoreando llamadas...")
+class AdaptiveMonitor:
+    """Ciclo de monitoreo que solo repite las consultas completas cuando algo cambió
+
+    Cada tick consulta get_change_markers(). Si la huella de agentes o de llamadas
+    cambió, vuelve a leer esa parte (y las stats de campaña), llama on_change con
+    la foto y baja el intervalo a min_interval. Sin cambios, el intervalo crece
+    por `backoff` hasta max_interval: de noche cuesta una consulta barata cada
+    max_interval segundos. Cada full_refresh segundos se consulta todo igual, por
+    si cambió algo que la huella no ve (p. ej. datos del lead). on_tick recibe
+    la foto vigente en cada tick correcto, haya cambiado o no.
+    """
 
-        while True:
-            print(f"\n--- {datetime.now().strftime('%H:%M:%S')} ---")
+    def __init__(self, monitor, on_change=None, on_tick=None, campaign_id='DEMOIN', min_interval=None,
+                 max_interval=None, backoff=None, full_refresh=None):
+        self.monitor = monitor
+        self.on_change = on_change
+        self.on_tick = on_tick
+        self.campaign_id = campaign_id
+        self.min_interval = min_interval or Config.MONITOR_MIN_INTERVAL
+        self.max_interval = max_interval or Config.MONITOR_MAX_INTERVAL
+        self.backoff = backoff or Config.MONITOR_BACKOFF
+        self.full_refresh = full_refresh or Config.MONITOR_FULL_REFRESH
+        self.interval = self.min_interval
+        self.markers = None
+        self.snapshot = {'agents': [], 'calls': [], 'stats': {}, 'updated_at': None}
+        self._last_full = 0.0
+        self.counters = {'ticks': 0, 'unchanged': 0, 'agent_queries': 0, 'call_queries': 0,
+                         'full_refreshes': 0, 'errors': 0}
 
-            # Agentes activos
-            agents = monitor.get_live_agents()
-            print(f"👥 Agentes activos: {len(agents)}")
-            for agent in agents:
-                print(f"   {agent['user']}: {agent['status']} ({agent['campaign_id']})")
+    def tick(self):
+        """Un ciclo; devuelve los segundos hasta el próximo"""
+        self.counters['ticks'] += 1
+        markers = self.monitor.get_change_markers()
+        if markers is None:
+            self.counters['errors'] += 1
+            self.monitor.reconnect()
+            self.interval = min(self.interval * self.backoff, self.max_interval)
+            return self.interval
 
-            # Llamadas en vivo
-            calls = monitor.get_live_calls()
-            print(f"📞 Llamadas activas: {len(calls)}")
-            for call in calls:
-                customer_name = f"{call.get('first_name', '')} {call.get('last_name', '')}"
-                print(f"   {call['phone_number']} -> {call['agent_user']} ({customer_name})")
+        full = time.monotonic() - self._last_full >= self.full_refresh
+        previous = self.markers or {}
+        agents_changed = full or markers['agents'] != previous.get('agents')
+        calls_changed = full or markers['calls'] != previous.get('calls')
 
-            # Stats de campaña
-            stats = monitor.get_campaign_stats('DEMOIN')
-            print(f"📊 DEMOIN: {stats.get('calls_in_queue', 0)} en cola, {stats.get('available_agents', 0)} disponibles")
+        if not (agents_changed or calls_changed):
+            self.markers = markers
+            self.counters['unchanged'] += 1
+            self._emit(self.on_tick, self.snapshot)
+            self.interval = min(self.interval * self.backoff, self.max_interval)
+            return self.interval
 
-            time.sleep(3)  # Actualizar cada 3 segundos
+        # Si falla la consulta de una parte se conserva su huella anterior (y su
+        # foto): el próximo tick la ve cambiada y la vuelve a consultar
+        markers = dict(markers)
+        failed = False
+        if agents_changed:
+            agents = self.monitor.get_live_agents()
+            self.counters['agent_queries'] += 1
+            if agents is None:
+                markers['agents'], agents_changed, failed = previous.get('agents'), False, True
+            else:
+                self.snapshot['agents'] = agents
+        if calls_changed:
+            calls = self.monitor.get_live_calls()
+            self.counters['call_queries'] += 1
+            if calls is None:
+                markers['calls'], calls_changed, failed = previous.get('calls'), False, True
+            else:
+                self.snapshot['calls'] = calls
+        self.markers = markers
+
+        if failed:
+            self.counters['errors'] += 1
+        elif full:
+            self._last_full = time.monotonic()
+            self.counters['full_refreshes'] += 1
+
+        if agents_changed or calls_changed:
+            self.snapshot['stats'] = self.monitor.get_campaign_stats(self.campaign_id) or self.snapshot['stats']
+            self.snapshot['updated_at'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            self._emit(self.on_change, self.snapshot, agents_changed, calls_changed)
+        self._emit(self.on_tick, self.snapshot)
+        self.interval = self.min_interval
+        return self.interval
+
+    def _emit(self, callback, *args):
+        if callback is None:
+            return
+        try:
+            callback(*args)
+        except Exception as e:
+            print(f"⚠️ Error en callback del monitor: {e}")
+
+    def run(self, stop_event=None):
+        """Ciclo hasta que stop_event (threading.Event) se active"""
+        while not (stop_event and stop_event.is_set()):
+            delay = self.tick()
+            if stop_event:
+                stop_event.wait(delay)
+            else:
+                time.sleep(delay)
+
+    def get_stats(self):
+        return dict(self.counters, interval=round(self.interval, 2))
+
+
+def print_snapshot(snapshot, agents_changed, calls_changed):
+    print(f"\n--- {datetime.now().strftime('%H:%M:%S')} ---")
+
+    # Agentes activos
+    agents = snapshot['agents']
+    print(f"👥 Agentes activos: {len(agents)}")
+    for agent in agents:
+        print(f"   {agent['user']}: {agent['status']} ({agent['campaign_id']})")
+
+    # Llamadas en vivo
+    calls = snapshot['calls']
+    print(f"📞 Llamadas activas: {len(calls)}")
+    for call in calls:
+        customer_name = f"{call.get('first_name', '')} {call.get('last_name', '')}"
+        print(f"   {call['phone_number']} -> {call['agent_user']} ({customer_name})")
+
+    # Stats de campaña
+    stats = snapshot['stats']
+    print(f"📊 {stats.get('campaign_id', '')}: {stats.get('calls_in_queue', 0)} en cola, "
+          f"{stats.get('available_agents', 0)} disponibles")
+
+
+# Ejemplo de uso
+if __name__ == "__main__":
+    monitor = VicidialCallMonitor()
+
+    if monitor.connect():
+        print("🎯 Monitoreando llamadas (intervalo adaptativo)...")
+        engine = AdaptiveMonitor(monitor, on_change=print_snapshot)
+        try:
+            engine.run()
+        except KeyboardInterrupt:
+            print(f"\n📈 {engine.get_stats()}")
+            monitor.close()
     else:
-        print("❌ No se pudo conectar al monitor")
\ No newline at end of file
+        print("❌ No se pudo conectar al monitor")
@@ -0,0 +1,146 @@
+import threading
+import time
+from config import Config
+
+
+class CircuitOpenError(Exception):
+    """La dependencia está marcada como caída y se rechaza la llamada sin esperar"""
+
+    def __init__(self, name, retry_in):
+        self.name = name
+        self.retry_in = retry_in
+        super().__init__(
+            f"Dependencia '{name}' no disponible (circuito abierto, nuevo intento en {retry_in:.0f}s)"
+        )
+
+
+class CircuitBreaker:
+    CLOSED = 'CLOSED'
+    OPEN = 'OPEN'
+    HALF_OPEN = 'HALF_OPEN'
+
+    def __init__(self, name, failure_threshold=5, recovery_timeout=30,
+                 slow_call_threshold=None, half_open_max_calls=1):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.slow_call_threshold = slow_call_threshold
+        self.half_open_max_calls = half_open_max_calls
+
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.half_open_calls = 0
+        self.half_open_since = None
+        self.last_error = None
+        self.total_rejected = 0
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Verificar si se permite la llamada; lanza CircuitOpenError si no"""
+        with self._lock:
+            if self.state == self.OPEN:
+                elapsed = time.monotonic() - self.opened_at
+                if elapsed < self.recovery_timeout:
+                    self.total_rejected += 1
+                    raise CircuitOpenError(self.name, self.recovery_timeout - elapsed)
+
+                # Pasó el tiempo de recuperación: dejar pasar una llamada de prueba
+                self.state = self.HALF_OPEN
+                self.half_open_calls = 0
+                self.half_open_since = time.monotonic()
+                print(f"🟡 Circuito {self.name}: HALF_OPEN (probando dependencia)")
+
+            if self.state == self.HALF_OPEN:
+                # Una prueba que no registró éxito ni fallo en recovery_timeout no bloquea el circuito
+                if time.monotonic() - self.half_open_since >= self.recovery_timeout:
+                    self.half_open_calls = 0
+                    self.half_open_since = time.monotonic()
+                if self.half_open_calls >= self.half_open_max_calls:
+                    self.total_rejected += 1
+                    raise CircuitOpenError(self.name, self.recovery_timeout)
+                self.half_open_calls += 1
+
+    def release(self):
+        """Devolver el lugar de una llamada permitida que no llegó a la dependencia"""
+        with self._lock:
+            if self.state == self.HALF_OPEN and self.half_open_calls > 0:
+                self.half_open_calls -= 1
+
+    def record_success(self, elapsed=None):
+        """Registrar llamada exitosa (una llamada demasiado lenta cuenta como fallo)"""
+        if self.slow_call_threshold and elapsed is not None and elapsed > self.slow_call_threshold:
+            self.record_failure(f'Llamada lenta: {elapsed:.2f}s')
+            return
+
+        with self._lock:
+            if self.state != self.CLOSED:
+                print(f"🟢 Circuito {self.name}: CLOSED (dependencia recuperada)")
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            self.half_open_calls = 0
+
+    def record_failure(self, error=None):
+        """Registrar fallo; abre el circuito al superar el umbral"""
+        with self._lock:
+            self.consecutive_failures += 1
+            self.last_error = str(error) if error else None
+
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    print(f"🔴 Circuito {self.name}: OPEN ({self.consecutive_failures} fallos, último: {self.last_error})")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                self.half_open_calls = 0
+
+    def call(self, func, *args, **kwargs):
+        """Ejecutar func protegida por el circuito"""
+        self.before_call()
+        start = time.monotonic()
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            self.record_failure(e)
+            raise
+        self.record_success(time.monotonic() - start)
+        return result
+
+    def get_state(self):
+        """Estado actual del circuito para el endpoint de salud"""
+        with self._lock:
+            retry_in = None
+            if self.state == self.OPEN:
+                retry_in = max(0.0, self.recovery_timeout - (time.monotonic() - self.opened_at))
+
+            return {
+                'state': self.state,
+                'consecutive_failures': self.consecutive_failures,
+                'last_error': self.last_error,
+                'retry_in_seconds': round(retry_in, 1) if retry_in is not None else None,
+                'rejected_calls': self.total_rejected
+            }
+
+
+# Un circuito por dependencia externa (vicidial_api, vicidial_db, ami)
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name):
+    """Obtener (o crear) el circuito de una dependencia"""
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(
+                name,
+                failure_threshold=Config.CIRCUIT_FAILURE_THRESHOLD,
+                recovery_timeout=Config.CIRCUIT_RECOVERY_TIMEOUT,
+                slow_call_threshold=Config.CIRCUIT_SLOW_CALL_THRESHOLD
+            )
+        return _breakers[name]
+
+
+def get_all_states():
+    """Estado de todos los circuitos registrados"""
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {breaker.name: breaker.get_state() for breaker in breakers}
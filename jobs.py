@@ -0,0 +1,281 @@
+import contextvars
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from config import Config
+from tracing import tracer
+
+
+class Step:
+    """Paso de un workflow; func(ctx) recibe el contexto compartido del job
+
+    idempotent: se puede reintentar si falla.
+    required: si es False, un fallo se registra pero el job continúa.
+    """
+
+    def __init__(self, name, func, idempotent=False, required=True):
+        self.name = name
+        self.func = func
+        self.idempotent = idempotent
+        self.required = required
+
+
+class Parallel:
+    """Grupo de pasos independientes que se ejecutan a la vez"""
+
+    def __init__(self, *steps):
+        self.steps = steps
+
+
+def flatten_steps(steps):
+    for step in steps:
+        if isinstance(step, Parallel):
+            yield from step.steps
+        else:
+            yield step
+
+
+class Job:
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+
+    def __init__(self, kind, steps, agent_id=None, room=None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.agent_id = agent_id
+        self.room = room
+        self.idempotency_key = None
+        self.request_trace_id = tracer.current_trace_id()  # traza del pedido que lo creó
+        self.trace_id = None
+        self.status = self.QUEUED
+        self.steps = [{'name': step.name, 'status': 'pending', 'attempts': 0, 'elapsed_ms': None}
+                      for step in flatten_steps(steps)]
+        self.result = None
+        self.error = None
+        self.created_at = datetime.now()
+        self.finished_at = None
+        self.started_monotonic = time.monotonic()
+        self.finished_monotonic = None
+
+    @property
+    def finished(self):
+        return self.status in (self.SUCCEEDED, self.FAILED)
+
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'kind': self.kind,
+            'agent_id': self.agent_id,
+            'status': self.status,
+            'steps': [dict(step) for step in self.steps],
+            'elapsed_ms': round((self.finished_monotonic - self.started_monotonic) * 1000, 1)
+                          if self.finished_monotonic else None,
+            'trace_id': self.trace_id,
+            'result': self.result,
+            'error': self.error,
+            'created_at': self.created_at.strftime('%Y-%m-%d %H:%M:%S'),
+            'finished_at': self.finished_at.strftime('%Y-%m-%d %H:%M:%S') if self.finished_at else None
+        }
+
+
+class JobRunner:
+    """Ejecuta workflows de varios pasos en un pool de hilos y notifica el progreso
+
+    notify(job): se llama al empezar/terminar cada paso y al terminar el job.
+    context_factory(): context manager que envuelve la ejecución (p. ej. app.app_context).
+    """
+
+    def __init__(self, notify=None, context_factory=None, max_workers=None):
+        self.notify = notify
+        self.context_factory = context_factory
+        self.max_retries = Config.JOB_STEP_RETRIES
+        self.retry_delay = Config.JOB_RETRY_DELAY
+        self.executor = ThreadPoolExecutor(max_workers=max_workers or Config.JOB_WORKERS,
+                                           thread_name_prefix='job')
+        # Pool aparte para ramas de Parallel: compartir el de jobs podría bloquearse si está lleno
+        self.branch_executor = ThreadPoolExecutor(max_workers=max_workers or Config.JOB_WORKERS,
+                                                  thread_name_prefix='job-branch')
+        self._jobs = {}
+        self._keys = {}  # {idempotency_key: job_id}
+        self._lock = threading.Lock()
+        self.stats = {'submitted': 0, 'deduplicated': 0}
+
+    def submit(self, kind, steps, ctx, agent_id=None, room=None, finalize=None):
+        """Encolar workflow; devuelve el Job de inmediato
+
+        finalize(ctx): construye job.result a partir del contexto al terminar bien.
+        """
+        job, _ = self.submit_once(kind, steps, ctx, agent_id=agent_id, room=room,
+                                  finalize=finalize, dedup=False)
+        return job
+
+    def submit_once(self, kind, steps, ctx, agent_id=None, room=None, finalize=None,
+                    idempotency_key=None, dedup=True):
+        """Como submit, pero un pedido repetido se une al job existente en vez de lanzar otro
+
+        Devuelve (job, created). Se reutiliza el job de la misma idempotency_key
+        (mientras se conserve, JOB_TTL) o, con dedup, el job en curso del mismo
+        tipo para el agente.
+        """
+        with self._lock:
+            self._prune()
+
+            existing = self._jobs.get(self._keys.get(idempotency_key)) if idempotency_key else None
+            if existing is None and dedup and agent_id is not None:
+                existing = self._find_active(kind, agent_id)
+            if existing is not None:
+                self.stats['deduplicated'] += 1
+                print(f"🔁 Job {kind} {existing.id[:8]} ya existe, pedido repetido unido (agente {agent_id})")
+                return existing, False
+
+            job = Job(kind, steps, agent_id=agent_id, room=room)
+            self._jobs[job.id] = job
+            if idempotency_key:
+                job.idempotency_key = idempotency_key
+                self._keys[idempotency_key] = job.id
+            self.stats['submitted'] += 1
+
+        self.executor.submit(self._run, job, steps, ctx, finalize)
+        print(f"🧵 Job {kind} {job.id[:8]} encolado (agente {agent_id})")
+        return job, True
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def find_active(self, kind, agent_id):
+        """Job en curso (no terminado) de este tipo para el agente"""
+        with self._lock:
+            return self._find_active(kind, agent_id)
+
+    def _find_active(self, kind, agent_id):
+        for job in self._jobs.values():
+            if job.kind == kind and job.agent_id == agent_id and not job.finished:
+                return job
+        return None
+
+    def _prune(self):
+        """Olvidar jobs terminados hace más de JOB_TTL (con el lock tomado)"""
+        now = time.monotonic()
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.finished and job.finished_monotonic is not None
+                   and now - job.finished_monotonic > Config.JOB_TTL]
+        for job_id in expired:
+            job = self._jobs.pop(job_id)
+            if job.idempotency_key:
+                self._keys.pop(job.idempotency_key, None)
+
+    def get_stats(self):
+        with self._lock:
+            active = sum(1 for job in self._jobs.values() if not job.finished)
+            return dict(self.stats, tracked=len(self._jobs), active=active)
+
+    def _notify(self, job):
+        if self.notify:
+            try:
+                self.notify(job)
+            except Exception as e:
+                print(f"⚠️ Error notificando job {job.id[:8]}: {e}")
+
+    def _run(self, job, steps, ctx, finalize):
+        with tracer.trace(f'job:{job.kind}', job_id=job.id, agent_id=job.agent_id,
+                          request_trace_id=job.request_trace_id):
+            job.trace_id = tracer.current_trace_id()
+            if self.context_factory:
+                with self.context_factory():
+                    self._run_steps(job, steps, ctx, finalize)
+            else:
+                self._run_steps(job, steps, ctx, finalize)
+
+    def _run_steps(self, job, steps, ctx, finalize):
+        job.status = Job.RUNNING
+        self._notify(job)
+
+        try:
+            index = 0
+            for step in steps:
+                if isinstance(step, Parallel):
+                    self._run_parallel(job, index, step.steps, ctx)
+                    index += len(step.steps)
+                else:
+                    self._run_optional(job, job.steps[index], step, ctx)
+                    index += 1
+
+            job.result = finalize(ctx) if finalize else None
+            status = Job.SUCCEEDED
+        except Exception as e:
+            job.error = str(e)
+            status = Job.FAILED
+            print(f"❌ Job {job.kind} {job.id[:8]} falló: {e}")
+
+        # Primero la hora de fin: _prune() de otro hilo la usa apenas el job figura terminado
+        job.finished_at = datetime.now()
+        job.finished_monotonic = time.monotonic()
+        job.status = status
+        self._notify(job)
+
+    def _run_optional(self, job, state, step, ctx):
+        """Ejecutar un paso; el fallo de uno no requerido solo se registra"""
+        try:
+            self._run_step(job, state, step, ctx)
+        except Exception as e:
+            if step.required:
+                raise
+            print(f"⚠️ Paso opcional {step.name} falló, se continúa: {e}")
+
+    def _run_branch(self, job, state, step, ctx):
+        if self.context_factory:
+            with self.context_factory():
+                self._run_optional(job, state, step, ctx)
+        else:
+            self._run_optional(job, state, step, ctx)
+
+    def _run_parallel(self, job, index, steps, ctx):
+        """El primer paso corre en este hilo y el resto en branch_executor; espera a todos"""
+        # Cada rama con su copia del contexto para que sus spans cuelguen de la traza del job
+        futures = [self.branch_executor.submit(contextvars.copy_context().run, self._run_branch,
+                                               job, job.steps[index + offset], step, ctx)
+                   for offset, step in enumerate(steps[1:], start=1)]
+
+        error = None
+        try:
+            self._run_optional(job, job.steps[index], steps[0], ctx)
+        except Exception as e:
+            error = e
+
+        for future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                error = error or e
+
+        if error:
+            raise error
+
+    def _run_step(self, job, state, step, ctx):
+        """Ejecutar un paso; los idempotentes se reintentan con espera creciente"""
+        state['status'] = 'running'
+        self._notify(job)
+        start = time.perf_counter()
+
+        while True:
+            state['attempts'] += 1
+            try:
+                with tracer.span(f'step:{step.name}', attempt=state['attempts']):
+                    step.func(ctx)
+                break
+            except Exception as e:
+                if not step.idempotent or state['attempts'] > self.max_retries:
+                    state['status'] = 'failed'
+                    state['error'] = str(e)
+                    state['elapsed_ms'] = round((time.perf_counter() - start) * 1000, 1)
+                    raise
+                print(f"⚠️ Reintentando paso {step.name} ({state['attempts']}/{self.max_retries}): {e}")
+                time.sleep(self.retry_delay * state['attempts'])
+
+        state['status'] = 'done'
+        state['elapsed_ms'] = round((time.perf_counter() - start) * 1000, 1)
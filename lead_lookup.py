@@ -0,0 +1,84 @@
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from cache import TTLCache
+from config import Config
+from vicidial_db import vicidial_pool
+
+LEAD_FIELDS = ('lead_id', 'list_id', 'phone_number', 'first_name', 'last_name', 'city', 'state', 'address1')
+
+# El lead más reciente con ese número (vicidial_list tiene índice por phone_number)
+LEAD_QUERY = f"""
+    SELECT {', '.join(LEAD_FIELDS)}
+    FROM vicidial_list
+    WHERE phone_number IN (%s, %s)
+    ORDER BY lead_id DESC LIMIT 1
+"""
+
+
+def phone_candidates(caller_id):
+    """Número tal cual (solo dígitos) y sin prefijo de país: vicidial_list guarda el número sin phone_code"""
+    digits = re.sub(r'\D', '', caller_id or '')
+    local = digits[-Config.SCREEN_POP_PHONE_DIGITS:] if len(digits) > Config.SCREEN_POP_PHONE_DIGITS else digits
+    return digits, local
+
+
+class LeadLookup:
+    """Datos del cliente por caller id para el screen-pop, con caché por número
+
+    prefetch() consulta en un pool de hilos propio para no frenar el hilo de
+    eventos AMI; un número sin lead también se guarda en caché ({}), así las
+    llamadas repetidas de un número desconocido no vuelven a la BD.
+    """
+
+    def __init__(self, pool=None, ttl=None, max_workers=None):
+        self.pool = pool or vicidial_pool
+        self.cache = TTLCache(ttl or Config.SCREEN_POP_CACHE_TTL, name='lead_lookup',
+                              max_entries=Config.SCREEN_POP_CACHE_MAX_ENTRIES)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers or Config.SCREEN_POP_WORKERS,
+                                           thread_name_prefix='lead-lookup')
+        self._lock = threading.Lock()
+        self.stats = {'prefetches': 0, 'found': 0, 'not_found': 0, 'errors': 0}
+
+    def _count(self, stat):
+        with self._lock:
+            self.stats[stat] += 1
+
+    def _query(self, digits, local):
+        with self.pool.connection() as connection, connection.cursor() as cursor:
+            cursor.execute(LEAD_QUERY, (digits, local))
+            row = cursor.fetchone()
+        return dict(zip(LEAD_FIELDS, row)) if row else {}
+
+    def get(self, caller_id):
+        """Lead del número ({} si no hay); None si el número no tiene dígitos"""
+        digits, local = phone_candidates(caller_id)
+        if not digits:
+            return None
+        # Clave con el número completo: dos números con los mismos últimos dígitos no comparten lead
+        return self.cache.get(digits, lambda: self._query(digits, local))
+
+    def prefetch(self, caller_id, callback):
+        """Buscar el lead en segundo plano y llamar callback(lead) con el resultado"""
+        self._count('prefetches')
+
+        def run():
+            try:
+                lead = self.get(caller_id)
+            except Exception as e:
+                self._count('errors')
+                print(f"⚠️ Error buscando lead de {caller_id}: {e}")
+                return
+            if lead is None:
+                return
+            self._count('found' if lead else 'not_found')
+            try:
+                callback(lead)
+            except Exception as e:
+                print(f"⚠️ Error enviando datos del cliente {caller_id}: {e}")
+
+        return self.executor.submit(run)
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self.stats, cache=self.cache.get_stats())
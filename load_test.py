@@ -0,0 +1,494 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+import aiohttp
+from bench_common import LatencyRecorder, percentile, print_report, save_report
+from ami_stub_server import AMIStubServer
+from vicidial_stub_server import VicidialStubServer
+
+try:
+    import socketio  # python-socketio (cliente asyncio)
+except ImportError:
+    socketio = None
+
+try:
+    import pymysql
+except ImportError:
+    pymysql = None
+
+# Errores de red: cuentan como error de la operación pero el cliente sigue
+NETWORK_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError, OSError)
+if socketio is not None:
+    NETWORK_ERRORS += (socketio.exceptions.SocketIOError,)
+
+SCHEMA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'vicidial_test_schema.sql')
+
+# Operación cuyo p95 define el codo: el poll de 3 s que hace cada agent_view abierto
+KNEE_OPERATION = 'agent_calls'
+
+
+def agent_data(index):
+    return {
+        'name': f'Load Agent {index}',
+        'email': f'load{index}@loadtest.local',
+        'vicidial_user': f'load{index}',
+        'vicidial_user_pass': 'load',
+        'vicidial_phone_login': str(7000 + index),
+        'vicidial_phone_pass': 'load'
+    }
+
+
+def supervisor_email(index):
+    return f'supervisor{index}@loadtest.local'
+
+
+# BD Vicidial de prueba (MariaDB/MySQL local)
+
+def mysql_connect(args):
+    return pymysql.connect(host=args.db_host, port=args.db_port, user=args.db_user,
+                           password=args.db_pass, database=args.db_name, autocommit=True)
+
+
+def setup_vicidial_db(args, agents):
+    """Cargar el esquema mínimo, dar de alta los usuarios y limpiar estado de corridas previas"""
+    with open(SCHEMA_FILE) as f:
+        statements = [s.strip() for s in f.read().split(';') if s.strip()]
+    statements = [s for s in statements if not all(line.startswith('--') for line in s.splitlines())]
+
+    connection = mysql_connect(args)
+    with connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+        cursor.execute("DELETE FROM vicidial_live_agents WHERE user LIKE 'load%'")
+        cursor.execute("DELETE FROM vicidial_auto_calls WHERE agent_user LIKE 'load%'")
+        cursor.executemany("""
+            INSERT IGNORE INTO vicidial_users (user, pass, full_name, user_level, user_group, closer_campaigns)
+            VALUES (%s, %s, %s, 1, 'ADMIN', '')
+        """, [(a['vicidial_user'], a['vicidial_user_pass'], a['name']) for a in agents])
+    connection.close()
+    print(f"🗄️ Esquema de prueba cargado en {args.db_host}:{args.db_port}/{args.db_name} ({len(agents)} usuarios)")
+
+
+class CallGenerator:
+    """Inserta llamadas en vicidial_auto_calls para agentes al azar y las cierra tras call_seconds
+
+    Junto con los Newchannel/Hangup del AMI simulado, hace que /agent_calls
+    cambie de versión como en un piso real.
+    """
+
+    def __init__(self, args, users):
+        self.args = args
+        self.users = users
+        self._stop = threading.Event()
+        self.thread = None
+        self.calls = 0
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name='load-calls')
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self.thread:
+            self.thread.join(timeout=5)
+
+    def _run(self):
+        connection = mysql_connect(self.args)
+        pending = []  # [(cuándo colgar, uniqueid)]
+        try:
+            while not self._stop.wait(random.expovariate(self.args.call_rate)):
+                now = time.time()
+                with connection.cursor() as cursor:
+                    expired = [uid for when, uid in pending if when <= now]
+                    pending = [(when, uid) for when, uid in pending if when > now]
+                    for uniqueid in expired:
+                        cursor.execute("DELETE FROM vicidial_auto_calls WHERE uniqueid = %s", (uniqueid,))
+
+                    self.calls += 1
+                    uniqueid = f'{now:.0f}.{self.calls}'
+                    phone_number = f'9{random.randint(10000000, 99999999)}'
+                    cursor.execute("INSERT INTO vicidial_list (entry_date, status, phone_number, first_name, last_name, city) "
+                                   "VALUES (NOW(), 'NEW', %s, 'Carga', 'Prueba', 'Lima')", (phone_number,))
+                    cursor.execute("""
+                        INSERT INTO vicidial_auto_calls
+                            (server_ip, campaign_id, status, lead_id, uniqueid, channel, phone_number,
+                             call_time, call_type, agent_user, start_time)
+                        VALUES ('127.0.0.1', 'colain', 'LIVE', LAST_INSERT_ID(), %s, %s, %s, NOW(), 'IN', %s, NOW())
+                    """, (uniqueid, f'SIP/{phone_number}', phone_number, random.choice(self.users)))
+                    pending.append((now + self.args.call_seconds, uniqueid))
+        except Exception as e:
+            print(f"❌ Generador de llamadas detenido: {e}")
+        finally:
+            connection.close()
+
+
+# App bajo prueba (subproceso)
+
+def serve_app(args):
+    """Crear tablas, sembrar agentes y supervisores y levantar la app (modo --serve-app)"""
+    from app import app, db, User, create_tables, socketio as app_socketio, startup
+
+    create_tables()
+    seed = {'agents': [], 'supervisors': []}
+    with app.app_context():
+        for index in range(args.seed_agents):
+            data = agent_data(index)
+            user = User.query.filter_by(vicidial_user=data['vicidial_user']).first()
+            if not user:
+                user = User(**data)
+                db.session.add(user)
+            seed['agents'].append(user)
+        for index in range(args.supervisors):
+            email = supervisor_email(index)
+            if not User.query.filter_by(email=email).first():
+                db.session.add(User(name=f'Supervisor {index}', email=email))
+            seed['supervisors'].append(email)
+        db.session.commit()
+        seed['agents'] = [{'id': u.id, 'user': u.vicidial_user, 'extension': u.vicidial_phone_login}
+                          for u in seed['agents']]
+
+    with open(args.seed_file, 'w') as f:
+        json.dump(seed, f)
+
+    startup.start()
+    app_socketio.run(app, host='127.0.0.1', port=args.app_port, debug=False,
+                     use_reloader=False, log_output=False, allow_unsafe_werkzeug=True)
+
+
+def spawn_app(args, env):
+    args.seed_file = os.path.join(args.workdir, 'seed.json')
+    command = [sys.executable, os.path.abspath(__file__), '--serve-app',
+               '--seed-agents', str(max(args.agents)), '--supervisors', str(args.supervisors),
+               '--seed-file', args.seed_file, '--app-port', str(args.app_port)]
+    log = open(args.app_log, 'w')
+    process = subprocess.Popen(command, env=env, stdout=log, stderr=subprocess.STDOUT)
+    print(f"🚀 App bajo prueba en http://127.0.0.1:{args.app_port} (pid {process.pid}, salida en {args.app_log})")
+    return process
+
+
+async def wait_until_ready(base_url, timeout):
+    """Esperar /healthz y luego /readyz; sin readiness se sigue igual (p. ej. sin MariaDB)"""
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        alive = False
+        while time.monotonic() < deadline:
+            try:
+                path = '/readyz' if alive else '/healthz'
+                async with session.get(base_url + path) as response:
+                    if response.status == 200:
+                        if alive:
+                            print("✅ App lista (/readyz)")
+                            return True
+                        alive = True
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.5)
+    if not alive:
+        raise RuntimeError(f'La app no respondió /healthz en {timeout}s')
+    print("⚠️ /readyz sigue en 503, se continúa (revisar dependencias en el log de la app)")
+    return False
+
+
+# Clientes simulados
+
+class Timer:
+    def __init__(self, recorder, operation):
+        self.recorder = recorder
+        self.operation = operation
+        self.ok = True
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None and not issubclass(exc_type, NETWORK_ERRORS):
+            return False
+        self.recorder.record(self.operation, (time.perf_counter() - self.start) * 1000,
+                             self.ok and exc_type is None)
+        return exc_type is not None
+
+
+async def post_json(session, url, payload, recorder, operation):
+    with Timer(recorder, operation) as timer:
+        async with session.post(url, json=payload, headers={'Idempotency-Key': uuid.uuid4().hex}) as response:
+            data = await response.json(content_type=None)
+            timer.ok = response.status < 400 and data.get('success', False)
+            return data
+    return None
+
+
+async def run_job(session, base_url, path, agent_id, recorder, kind, poll_interval=0.5, timeout=60):
+    """Encolar login/logout y esperar el job; mide el tiempo hasta que termina"""
+    start = time.perf_counter()
+    data = await post_json(session, base_url + path, {'agent_id': agent_id}, recorder, f'{kind}_submit')
+    if not data or not data.get('job_id'):
+        recorder.record(f'{kind}_job', (time.perf_counter() - start) * 1000, False)
+        return False
+
+    deadline = time.monotonic() + timeout
+    status = None
+    while time.monotonic() < deadline:
+        await asyncio.sleep(poll_interval)
+        with Timer(recorder, 'job_poll') as timer:
+            async with session.get(f"{base_url}/jobs/{data['job_id']}") as response:
+                timer.ok = response.status == 200
+                status = (await response.json(content_type=None)).get('job', {}).get('status')
+        if status in ('succeeded', 'failed'):
+            break
+
+    recorder.record(f'{kind}_job', (time.perf_counter() - start) * 1000, status == 'succeeded')
+    return status == 'succeeded'
+
+
+async def run_agent(base_url, agent, recorder, args, stop_at, counters):
+    """Un navegador de agente: sala Socket.IO, login, poll de 3 s, pausas y logout"""
+    sio = None
+    async with aiohttp.ClientSession() as session:
+        if socketio is not None:
+            sio = socketio.AsyncClient(reconnection=False)
+            joined = asyncio.Event()
+            sio.on('joined', lambda data: joined.set())
+            sio.on('*', lambda event, *data: counters.__setitem__('ws_events', counters['ws_events'] + 1))
+            with Timer(recorder, 'ws_join') as timer:
+                await sio.connect(base_url, transports=['websocket'], wait_timeout=10)
+                await sio.emit('join_agent', {'extension': agent['extension']})
+                await asyncio.wait_for(joined.wait(), 10)
+            if not timer.ok:
+                sio = None
+
+        await run_job(session, base_url, '/vicidial_agent_login', agent['id'], recorder, 'login')
+
+        etag = None
+        paused = False
+        while time.monotonic() < stop_at:
+            headers = {'If-None-Match': etag} if etag else {}
+            with Timer(recorder, KNEE_OPERATION) as timer:
+                async with session.get(f"{base_url}/agent_calls/{agent['id']}", headers=headers) as response:
+                    timer.ok = response.status in (200, 304)
+                    if response.status == 200:
+                        etag = response.headers.get('ETag')
+                        await response.read()
+                    counters['not_modified' if response.status == 304 else 'modified'] += 1
+
+            if random.random() < args.pause_probability:
+                path, operation = ('/vicidial_agent_unpause', 'unpause') if paused else ('/vicidial_agent_pause', 'pause')
+                payload = {'agent_id': agent['id'], 'reason': 'BREAK'}
+                if await post_json(session, base_url + path, payload, recorder, operation):
+                    paused = not paused
+
+            await asyncio.sleep(args.poll_interval)
+
+        await run_job(session, base_url, '/vicidial_agent_logout', agent['id'], recorder, 'logout')
+
+        if sio is not None:
+            await sio.emit('leave_agent', {'extension': agent['extension']})
+            await sio.disconnect()
+
+
+async def run_supervisor(base_url, email, recorder, args, stop_at):
+    """Supervisor con el dashboard abierto (recarga cada dashboard_interval como dashboard.html)"""
+    async with aiohttp.ClientSession(cookie_jar=aiohttp.CookieJar(unsafe=True)) as session:
+        with Timer(recorder, 'supervisor_login') as timer:
+            async with session.post(base_url + '/login', data={'email': email}) as response:
+                await response.read()
+                timer.ok = response.status == 200 and response.url.path == '/dashboard'
+
+        while time.monotonic() < stop_at:
+            with Timer(recorder, 'dashboard') as timer:
+                async with session.get(base_url + '/dashboard', allow_redirects=False) as response:
+                    await response.read()
+                    timer.ok = response.status == 200
+            await asyncio.sleep(args.dashboard_interval)
+
+
+async def run_level(base_url, seed, count, args):
+    """Un nivel de carga: count agentes que entran escalonados durante ramp segundos"""
+    recorder = LatencyRecorder()
+    counters = {'ws_events': 0, 'modified': 0, 'not_modified': 0}
+    stop_at = time.monotonic() + args.ramp + args.duration
+    agents = seed['agents'][:count]
+
+    async def delayed(delay, coroutine):
+        await asyncio.sleep(delay)
+        try:
+            await coroutine
+        except Exception as e:
+            recorder.record('client_error', 0, False)
+            print(f"⚠️ Cliente simulado falló: {type(e).__name__}: {e}")
+
+    tasks = [delayed(random.uniform(0, args.ramp), run_agent(base_url, agent, recorder, args, stop_at, counters))
+             for agent in agents]
+    tasks += [delayed(random.uniform(0, args.ramp), run_supervisor(base_url, email, recorder, args, stop_at))
+              for email in seed['supervisors']]
+    await asyncio.gather(*tasks)
+    recorder.finish()
+
+    async with aiohttp.ClientSession() as session:
+        async with session.get(base_url + '/health') as response:
+            health = await response.json(content_type=None)
+
+    summary = recorder.summary()
+    total = sum(row['count'] for row in summary.values())
+    errors = sum(row['errors'] for row in summary.values())
+    all_samples = sorted(v for values in recorder.samples.values() for v in values)
+    return {
+        'agents': count,
+        'supervisors': len(seed['supervisors']),
+        'summary': summary,
+        'total_requests': total,
+        'throughput_rps': round(total / (recorder.finished_at - recorder.started_at), 1),
+        'error_rate': round(errors / total, 4) if total else 0.0,
+        'p95_ms': round(percentile(all_samples, 95), 2),
+        'client_counters': counters,
+        'server': {key: health.get(key) for key in ('vicidial_db_pool', 'jobs', 'circuits')}
+    }
+
+
+def find_knee(levels, factor, max_error_rate):
+    """Primer nivel donde el p95 del poll supera factor × el del primer nivel o hay demasiados errores"""
+    baseline = levels[0]['summary'].get(KNEE_OPERATION, {}).get('p95_ms')
+    for level in levels:
+        p95 = level['summary'].get(KNEE_OPERATION, {}).get('p95_ms')
+        if level['error_rate'] > max_error_rate:
+            return level['agents'], f"tasa de error {level['error_rate']:.1%} > {max_error_rate:.0%}"
+        if baseline and p95 and p95 > baseline * factor:
+            return level['agents'], f'p95 {KNEE_OPERATION} {p95:.0f} ms > {factor:g}× base ({baseline:.0f} ms)'
+    return None, 'sin codo en los niveles probados'
+
+
+async def run_all(args, seed):
+    base_url = f'http://127.0.0.1:{args.app_port}'
+    await wait_until_ready(base_url, args.ready_timeout)
+
+    levels = []
+    for count in args.agents:
+        print(f"\n🏁 Nivel {count} agentes + {args.supervisors} supervisores "
+              f"(rampa {args.ramp:g}s, duración {args.duration:g}s)")
+        level = await run_level(base_url, seed, count, args)
+        levels.append(level)
+        print_report(f'{count} agentes: {level["throughput_rps"]} rps, '
+                     f'error {level["error_rate"]:.2%}, p95 global {level["p95_ms"]} ms', level['summary'])
+        await asyncio.sleep(args.cooldown)
+    return levels
+
+
+def print_levels(levels, knee, reason):
+    print(f"\n📈 Resumen por nivel ({KNEE_OPERATION} = poll de 3 s del agente)")
+    print(f"   {'agentes':>8}{'rps':>9}{'err%':>7}{'p50':>9}{'p95':>9}{'p99':>9}{'304%':>7}")
+    for level in levels:
+        row = level['summary'].get(KNEE_OPERATION, {})
+        polls = level['client_counters']['modified'] + level['client_counters']['not_modified']
+        hit = level['client_counters']['not_modified'] / polls if polls else 0.0
+        print(f"   {level['agents']:>8}{level['throughput_rps']:>9.1f}{level['error_rate'] * 100:>6.1f}%"
+              f"{row.get('p50_ms', 0):>9.1f}{row.get('p95_ms', 0):>9.1f}{row.get('p99_ms', 0):>9.1f}{hit * 100:>6.1f}%")
+    if knee:
+        print(f"\n🦵 Codo en {knee} agentes: {reason}")
+    else:
+        print(f"\n✅ {reason}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Prueba de carga de un piso de agentes contra Vicidial simulado')
+    parser.add_argument('--agents', type=int, nargs='+', default=[50, 200, 500], help='Niveles de agentes')
+    parser.add_argument('--supervisors', type=int, default=5)
+    parser.add_argument('--duration', type=float, default=60, help='Segundos de carga estable por nivel')
+    parser.add_argument('--ramp', type=float, default=15, help='Segundos en que entran los agentes')
+    parser.add_argument('--cooldown', type=float, default=5)
+    parser.add_argument('--poll-interval', type=float, default=3, help='Poll de /agent_calls (agent_view.html)')
+    parser.add_argument('--dashboard-interval', type=float, default=30, help='Recarga del dashboard')
+    parser.add_argument('--pause-probability', type=float, default=0.05, help='Por ciclo de poll')
+    parser.add_argument('--call-rate', type=float, default=2.0, help='Llamadas nuevas por segundo (BD y AMI)')
+    parser.add_argument('--call-seconds', type=float, default=30)
+    parser.add_argument('--api-latency-ms', type=float, default=20)
+    parser.add_argument('--ami-latency-ms', type=float, default=5)
+    parser.add_argument('--knee-factor', type=float, default=2.0)
+    parser.add_argument('--max-error-rate', type=float, default=0.01)
+    parser.add_argument('--app-port', type=int, default=5055)
+    parser.add_argument('--app-log', default='load_test_app.log')
+    parser.add_argument('--ready-timeout', type=float, default=60)
+    parser.add_argument('--db-host', default='127.0.0.1', help='MariaDB/MySQL local con vicidial_test_schema.sql')
+    parser.add_argument('--db-port', type=int, default=3306)
+    parser.add_argument('--db-user', default='root')
+    parser.add_argument('--db-pass', default='')
+    parser.add_argument('--db-name', default='vicidial_test')
+    parser.add_argument('--skip-db-setup', action='store_true')
+    parser.add_argument('--output', help='Guardar reporte JSON en este archivo')
+    # Modo interno: el proceso hijo que sirve la app
+    parser.add_argument('--serve-app', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--seed-agents', type=int, default=0, help=argparse.SUPPRESS)
+    parser.add_argument('--seed-file', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve_app:
+        serve_app(args)
+        sys.exit(0)
+
+    if pymysql is None:
+        sys.exit("❌ pymysql es necesario para preparar la BD de prueba")
+    if socketio is None:
+        print("⚠️ python-socketio no instalado: los agentes no abren Socket.IO (solo HTTP)")
+
+    args.workdir = tempfile.mkdtemp(prefix='crm-load-')
+    agents = [agent_data(index) for index in range(max(args.agents))]
+    if not args.skip_db_setup:
+        setup_vicidial_db(args, agents)
+
+    api_stub = VicidialStubServer(port=0, latency_ms=args.api_latency_ms, jitter_ms=args.api_latency_ms / 2).start()
+    ami_stub = AMIStubServer(port=0, latency_ms=args.ami_latency_ms, event_rate=args.call_rate,
+                             call_seconds=args.call_seconds,
+                             extensions=[a['vicidial_phone_login'] for a in agents]).start()
+
+    # Config lee el entorno al importarse: todo lo externo apunta a los simulados
+    env = dict(os.environ,
+               LOCAL_DATABASE_URI=f"sqlite:///{os.path.join(args.workdir, 'load.db')}",
+               VICIDIAL_API_URL=api_stub.url,
+               VICIDIAL_DB_HOST=args.db_host, VICIDIAL_DB_PORT=str(args.db_port),
+               VICIDIAL_DB_USER=args.db_user, VICIDIAL_DB_PASS=args.db_pass, VICIDIAL_DB_NAME=args.db_name,
+               VICIDIAL_AMI_HOST=ami_stub.host, VICIDIAL_AMI_PORT=str(ami_stub.port),
+               VICIDIAL_AMI_USER=ami_stub.username, VICIDIAL_AMI_SECRET=ami_stub.secret,
+               READINESS_REQUIRED='local_db,vicidial_db,ami,ami_realtime',
+               PYTHONUNBUFFERED='1')
+    process = spawn_app(args, env)
+    calls = None
+
+    try:
+        deadline = time.monotonic() + args.ready_timeout
+        while not os.path.exists(args.seed_file):
+            if process.poll() is not None or time.monotonic() > deadline:
+                sys.exit(f"❌ La app no arrancó, ver {args.app_log}")
+            time.sleep(0.2)
+        time.sleep(0.2)
+        with open(args.seed_file) as f:
+            seed = json.load(f)
+
+        if args.call_rate > 0:
+            calls = CallGenerator(args, [a['user'] for a in seed['agents']]).start()
+
+        levels = asyncio.run(run_all(args, seed))
+        knee, reason = find_knee(levels, args.knee_factor, args.max_error_rate)
+        print_levels(levels, knee, reason)
+        print(f"\n🧪 Simulados: {api_stub.state.requests} pedidos API, AMI {ami_stub.counters}"
+              f"{f', {calls.calls} llamadas en BD' if calls else ''}")
+
+        if args.output:
+            save_report(args.output, {'levels': levels, 'knee': {'agents': knee, 'reason': reason},
+                                      'ami_stub': ami_stub.counters, 'api_stub_requests': api_stub.state.requests,
+                                      'args': {k: v for k, v in vars(args).items() if k != 'workdir'}})
+    finally:
+        if calls:
+            calls.stop()
+        process.terminate()
+        process.wait(timeout=10)
+        api_stub.stop()
+        ami_stub.stop()
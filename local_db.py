@@ -0,0 +1,76 @@
+import sqlite3
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+from config import Config
+from metrics import query_name
+from tracing import NOOP_SPAN, tracer
+
+# Índices que db.create_all() no agrega a tablas que ya existen
+MIGRATIONS = [
+    'CREATE INDEX IF NOT EXISTS ix_user_email ON "user" (email)',
+    'CREATE INDEX IF NOT EXISTS ix_agent_session_user_status ON agent_session (user_id, status)',
+]
+
+
+@event.listens_for(Engine, 'connect')
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Aplicar pragmas de rendimiento a cada conexión SQLite nueva"""
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+
+    cursor = dbapi_connection.cursor()
+    # WAL: los lectores no bloquean al escritor y cada commit no reescribe el archivo principal
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute(f'PRAGMA busy_timeout={Config.SQLITE_BUSY_TIMEOUT_MS}')
+    # NORMAL es seguro con WAL (se puede perder el último commit ante un corte de luz, no corromper)
+    cursor.execute(f'PRAGMA synchronous={Config.SQLITE_SYNCHRONOUS}')
+    cursor.execute(f'PRAGMA cache_size=-{Config.SQLITE_CACHE_SIZE_KB}')
+    cursor.execute('PRAGMA temp_store=MEMORY')
+    cursor.close()
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _start_sql_span(conn, cursor, statement, parameters, context, executemany):
+    span = tracer.span(f'{conn.dialect.name}:{query_name(statement)}')
+    if span is not NOOP_SPAN:
+        span.__enter__()
+        conn.info.setdefault('trace_spans', []).append(span)
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _end_sql_span(conn, cursor, statement, parameters, context, executemany):
+    spans = conn.info.get('trace_spans')
+    if spans:
+        spans.pop().__exit__(None, None, None)
+
+
+@event.listens_for(Engine, 'handle_error')
+def _fail_sql_span(exception_context):
+    spans = exception_context.connection.info.get('trace_spans') if exception_context.connection else None
+    if spans:
+        error = exception_context.original_exception
+        spans.pop().__exit__(type(error), error, None)
+
+
+def engine_options():
+    """Opciones del engine para SQLALCHEMY_ENGINE_OPTIONS"""
+    if not Config.LOCAL_DATABASE_URI.startswith('sqlite'):
+        return {}
+
+    return {
+        'connect_args': {
+            # Espera del driver antes de lanzar "database is locked" (segundos)
+            'timeout': Config.SQLITE_BUSY_TIMEOUT_MS / 1000,
+            'check_same_thread': False
+        }
+    }
+
+
+def apply_migrations(db):
+    """Crear índices faltantes en bases locales creadas antes de agregarlos"""
+    if db.engine.dialect.name != 'sqlite':
+        return
+
+    with db.engine.begin() as connection:
+        for statement in MIGRATIONS:
+            connection.execute(text(statement))
@@ -0,0 +1,137 @@
+import re
+import threading
+from bisect import bisect_left
+from functools import lru_cache
+
+# Buckets en segundos (los de prometheus_client)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues, amount=1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            items = sorted(self._values.items())
+        for labelvalues, value in items:
+            lines.append(f'{self.name}{_labels(self.labelnames, labelvalues)} {_format(value)}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # {labelvalues: [conteos por bucket (+Inf al final), suma]}
+        self._lock = threading.Lock()
+
+    def observe(self, seconds, *labelvalues):
+        index = bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += seconds
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            items = sorted((labelvalues, list(counts), total) for labelvalues, (counts, total) in self._series.items())
+
+        for labelvalues, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                labels = _labels(self.labelnames, labelvalues, [('le', _format(bound))])
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _labels(self.labelnames, labelvalues)
+            lines.append(f'{self.name}_sum{labels} {_format(total)}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Formato de texto de Prometheus (0.0.4)"""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+HTTP_REQUEST_SECONDS = registry.register(Histogram(
+    'crm_http_request_duration_seconds', 'Latencia de rutas Flask', ('route', 'method', 'status')))
+SQL_QUERY_SECONDS = registry.register(Histogram(
+    'crm_vicidial_sql_query_duration_seconds', 'Tiempo de consultas a la BD de Vicidial', ('query',)))
+VICIDIAL_API_SECONDS = registry.register(Histogram(
+    'crm_vicidial_api_request_duration_seconds', 'Latencia de funciones de non_agent_api.php (con reintentos)',
+    ('function', 'outcome')))
+AMI_ACTION_SECONDS = registry.register(Histogram(
+    'crm_ami_action_duration_seconds', 'Ida y vuelta de acciones AMI', ('action', 'client', 'outcome')))
+AMI_EVENTS = registry.register(Counter(
+    'crm_ami_events_total', 'Eventos AMI recibidos por tipo', ('event', 'client')))
+SOCKETIO_EMITS = registry.register(Counter(
+    'crm_socketio_emits_total', 'Eventos Socket.IO emitidos por sala', ('event', 'room')))
+
+
+_SQL_TABLE = re.compile(r'\b(?:from|into|update|join)\s+`?(\w+)', re.IGNORECASE)
+
+
+@lru_cache(maxsize=512)
+def query_name(query):
+    """Nombre corto de una consulta para la etiqueta: 'select:vicidial_live_agents'"""
+    stripped = query.lstrip()
+    verb = stripped.split(None, 1)[0].lower() if stripped else 'unknown'
+    match = _SQL_TABLE.search(stripped)
+    return f'{verb}:{match.group(1)}' if match else verb
+
+
+def room_label(room):
+    """Etiqueta de sala: las salas propias se conservan, los sid de un cliente se agrupan"""
+    if room is None:
+        return 'broadcast'
+    if isinstance(room, (list, tuple, set)):
+        return 'multiple'
+    room = str(room)
+    if room.startswith('agent_') or room == 'supervisors':
+        return room
+    return 'client'
@@ -0,0 +1,202 @@
+import cProfile
+import marshal
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+from config import Config
+
+MODES = ('stack', 'cprofile')
+
+
+class SamplingProfiler:
+    """Profiler bajo demanda para rutas Flask y handlers AMI
+
+    Apagado, begin() solo lee self.enabled y devuelve None. Encendido, perfila
+    una fracción sample_rate de las llamadas:
+      stack: un hilo toma muestras de la pila de los hilos perfilados cada
+             interval segundos (formato "folded" para flamegraph.pl/speedscope).
+      cprofile: cProfile por llamada, acumulado por nombre en pstats.Stats.
+             Solo puede haber un cProfile activo a la vez, las llamadas
+             concurrentes se omiten (contador skipped).
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.mode = Config.PROFILER_MODE
+        self.sample_rate = Config.PROFILER_SAMPLE_RATE
+        self.interval = Config.PROFILER_INTERVAL
+        self._lock = threading.Lock()
+        self._cprofile_lock = threading.Lock()
+        self._active = {}   # {thread_id: nombre} hilos perfilados en modo stack
+        self._stacks = {}   # {pila folded: muestras}
+        self._stats = {}    # {nombre: pstats.Stats}
+        self._sampler = None
+        self.counters = {'sampled': 0, 'skipped': 0, 'stack_samples': 0}
+        self.enabled_at = None
+
+    def configure(self, enabled=None, mode=None, sample_rate=None, interval=None):
+        if mode is not None:
+            if mode not in MODES:
+                raise ValueError(f'Modo inválido: {mode} (usar {", ".join(MODES)})')
+            self.mode = mode
+        if sample_rate is not None:
+            self.sample_rate = min(max(float(sample_rate), 0.0), 1.0)
+        if interval is not None:
+            self.interval = max(float(interval), 0.001)
+        if enabled is not None:
+            self.enabled = bool(enabled)
+            self.enabled_at = time.time() if self.enabled else None
+            print(f"🔬 Profiler {'activado' if self.enabled else 'desactivado'} "
+                  f"(modo {self.mode}, muestreo {self.sample_rate:.0%})")
+
+    def begin(self, name):
+        """Empezar a perfilar una llamada si le toca; devuelve un token para end()"""
+        if not self.enabled or random.random() >= self.sample_rate:
+            return None
+
+        if self.mode == 'cprofile':
+            if not self._cprofile_lock.acquire(blocking=False):
+                self.counters['skipped'] += 1
+                return None
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:  # otra herramienta de profiling ya está activa
+                self._cprofile_lock.release()
+                self.counters['skipped'] += 1
+                return None
+            self.counters['sampled'] += 1
+            return ('cprofile', name, profile)
+
+        thread_id = threading.get_ident()
+        with self._lock:
+            self._active[thread_id] = name
+            self.counters['sampled'] += 1
+            if self._sampler is None or not self._sampler.is_alive():
+                self._sampler = threading.Thread(target=self._sample_stacks, name='profiler-sampler')
+                self._sampler.daemon = True
+                self._sampler.start()
+        return ('stack', name, thread_id)
+
+    def end(self, token):
+        if token is None:
+            return
+
+        mode, name, handle = token
+        if mode == 'cprofile':
+            handle.disable()
+            self._cprofile_lock.release()
+            with self._lock:
+                if name in self._stats:
+                    self._stats[name].add(handle)
+                else:
+                    self._stats[name] = pstats.Stats(handle)
+        else:
+            with self._lock:
+                self._active.pop(handle, None)
+
+    def wrap(self, name, func):
+        """Envolver un callback (p. ej. handler AMI) para que se pueda perfilar"""
+        def wrapper(*args, **kwargs):
+            if not self.enabled:
+                return func(*args, **kwargs)
+            token = self.begin(name)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.end(token)
+        return wrapper
+
+    def _sample_stacks(self):
+        while self.enabled and self.mode == 'stack':
+            time.sleep(self.interval)
+            with self._lock:
+                active = dict(self._active)
+            if not active:
+                continue
+
+            frames = sys._current_frames()
+            samples = []
+            for thread_id, name in active.items():
+                frame = frames.get(thread_id)
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                    frame = frame.f_back
+                samples.append(';'.join([name] + stack[::-1]))
+
+            with self._lock:
+                for folded in samples:
+                    self._stacks[folded] = self._stacks.get(folded, 0) + 1
+                self.counters['stack_samples'] += len(samples)
+
+    def reset(self):
+        with self._lock:
+            self._stacks.clear()
+            self._stats.clear()
+            self.counters = {'sampled': 0, 'skipped': 0, 'stack_samples': 0}
+
+    def folded_stacks(self):
+        """Pilas en formato folded ("a;b;c N" por línea), listo para flamegraph"""
+        with self._lock:
+            items = sorted(self._stacks.items())
+        return ''.join(f'{stack} {count}\n' for stack, count in items)
+
+    def _merged_stats(self, name=None):
+        with self._lock:
+            selected = [stats for key, stats in self._stats.items() if name is None or key == name]
+            if not selected:
+                return None
+            merged = pstats.Stats()
+            merged.add(*selected)
+            return merged
+
+    def pstats_bytes(self, name=None):
+        """Datos en formato .pstats (cargar con pstats.Stats o snakeviz); None si no hay"""
+        merged = self._merged_stats(name)
+        if merged is None:
+            return None
+        return marshal.dumps(merged.stats)
+
+    def top_functions(self, name=None, limit=20):
+        """Funciones con más tiempo acumulado (modo cprofile)"""
+        merged = self._merged_stats(name)
+        if merged is None:
+            return []
+
+        rows = sorted(merged.stats.items(), key=lambda item: item[1][3], reverse=True)[:limit]
+        return [{
+            'function': f'{func} ({os.path.basename(filename)}:{line})',
+            'calls': calls,
+            'total_ms': round(total * 1000, 2),
+            'cumulative_ms': round(cumulative * 1000, 2)
+        } for (filename, line, func), (_, calls, total, cumulative, _) in rows]
+
+    def top_stacks(self, limit=20):
+        """Pilas más muestreadas (modo stack)"""
+        with self._lock:
+            items = sorted(self._stacks.items(), key=lambda item: item[1], reverse=True)[:limit]
+        return [{'stack': stack.split(';')[-3:], 'scope': stack.split(';')[0], 'samples': count}
+                for stack, count in items]
+
+    def get_state(self):
+        with self._lock:
+            scopes = sorted(self._stats)
+            active = len(self._active)
+        return {
+            'enabled': self.enabled,
+            'mode': self.mode,
+            'sample_rate': self.sample_rate,
+            'interval': self.interval,
+            'enabled_at': self.enabled_at,
+            'active_scopes': active,
+            'cprofile_scopes': scopes,
+            'counters': dict(self.counters)
+        }
+
+
+profiler = SamplingProfiler()
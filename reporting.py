@@ -0,0 +1,323 @@
+import argparse
+import json
+import time
+from datetime import date, datetime, timedelta
+import numpy as np
+from cache import TTLCache
+from config import Config
+from vicidial_db import VicidialSSCursor, get_vicidial_connection
+
+# Llamadas inbound: queue_seconds es la espera en cola; user VDCL/VDAD = nadie contestó
+INBOUND_QUERY = """
+    SELECT campaign_id, user, queue_seconds, length_in_sec
+    FROM vicidial_closer_log
+    WHERE call_date >= %s AND call_date < %s
+"""
+
+# Llamadas outbound: sin cola, contestada si un agente tuvo la llamada
+OUTBOUND_QUERY = """
+    SELECT campaign_id, user, 0, length_in_sec
+    FROM vicidial_call_log
+    WHERE start_time >= %s AND start_time < %s
+"""
+
+SYSTEM_USERS = ('', 'VDCL', 'VDAD')
+
+
+class Encoder:
+    """Códigos enteros para textos (campaña, agente) para agrupar con np.bincount"""
+
+    def __init__(self):
+        self.index = {}
+        self.names = []
+
+    def encode(self, values):
+        index = self.index
+        for value in set(values) - index.keys():
+            index[value] = len(self.names)
+            self.names.append(value)
+        return np.fromiter(map(index.__getitem__, values), dtype=np.int32, count=len(values))
+
+
+class CallData:
+    """Columnas de un período como arrays de NumPy"""
+
+    def __init__(self, campaigns, agents, campaign, agent, queue, length):
+        self.campaigns = campaigns  # nombres, índice = código
+        self.agents = agents
+        self.campaign = campaign
+        self.agent = agent
+        self.queue = queue
+        self.length = length
+        system = np.array([agents.index(name) for name in SYSTEM_USERS if name in agents], dtype=np.int32)
+        self.answered = ~np.isin(agent, system)
+
+    def __len__(self):
+        return len(self.campaign)
+
+
+def load_calls(query, start, end, batch_size=None):
+    """Leer el período por lotes (cursor sin buffer) y convertir cada lote a arrays"""
+    batch_size = batch_size or Config.REPORT_BATCH_SIZE
+    campaigns, agents = Encoder(), Encoder()
+    parts = {'campaign': [], 'agent': [], 'queue': [], 'length': []}
+
+    connection = get_vicidial_connection()
+    try:
+        with connection.cursor(VicidialSSCursor) as cursor:
+            cursor.execute(query, (start, end))
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                campaign, agent, queue, length = zip(*rows)
+                parts['campaign'].append(campaigns.encode([c or '' for c in campaign]))
+                parts['agent'].append(agents.encode([a or '' for a in agent]))
+                parts['queue'].append(np.array(queue, dtype=np.float64))  # None -> nan
+                parts['length'].append(np.array(length, dtype=np.float64))
+    finally:
+        connection.close()
+
+    def join(arrays, dtype):
+        return np.concatenate(arrays) if arrays else np.empty(0, dtype=dtype)
+
+    return CallData(campaigns.names, agents.names,
+                    join(parts['campaign'], np.int32), join(parts['agent'], np.int32),
+                    np.nan_to_num(join(parts['queue'], np.float64)),
+                    np.nan_to_num(join(parts['length'], np.float64)))
+
+
+def _ratio(numerator, denominator):
+    numerator = np.asarray(numerator, dtype=np.float64)
+    return np.divide(numerator, denominator, out=np.full(numerator.shape, np.nan), where=denominator > 0)
+
+
+def grouped_percentiles(codes, values, groups, percentiles):
+    """Percentiles por grupo sin recorrer los grupos: un lexsort y un índice por percentil
+
+    Rango más cercano, igual que bench_common.percentile.
+    """
+    counts = np.bincount(codes, minlength=groups)
+    result = {p: np.full(groups, np.nan) for p in percentiles}
+    if not len(values):
+        return result
+    ordered = values[np.lexsort((values, codes))]
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    present = counts > 0
+    for p in percentiles:
+        offsets = np.rint(p / 100 * np.maximum(counts - 1, 0)).astype(np.int64)
+        result[p][present] = ordered[(starts + offsets)[present]]
+    return result
+
+
+def inbound_metrics(codes, groups, data, thresholds, percentiles, short_abandon):
+    """Métricas de servicio por grupo (campaña, agente o total)
+
+    Las llamadas no contestadas con menos de short_abandon segundos en cola no
+    cuentan para el abandono ni para el nivel de servicio.
+    """
+    answered = data.answered
+    short = ~answered & (data.queue < short_abandon)
+    handle = np.clip(data.length - data.queue, 0, None)
+
+    offered = np.bincount(codes, minlength=groups)
+    counted = offered - np.bincount(codes[short], minlength=groups)
+    answered_count = np.bincount(codes[answered], minlength=groups)
+    abandoned = np.bincount(codes[~answered & ~short], minlength=groups)
+    queue_answered = np.bincount(codes[answered], weights=data.queue[answered], minlength=groups)
+    handle_total = np.bincount(codes[answered], weights=handle[answered], minlength=groups)
+
+    metrics = {
+        'offered': offered,
+        'answered': answered_count,
+        'abandoned': abandoned,
+        'short_abandoned': offered - counted,
+        'abandon_rate': _ratio(abandoned, counted),
+        'asa_sec': _ratio(queue_answered, answered_count),
+        'aht_sec': _ratio(handle_total, answered_count),
+        'handle_sec': handle_total,
+    }
+    for threshold in thresholds:
+        within = np.bincount(codes[answered & (data.queue <= threshold)], minlength=groups)
+        metrics[f'service_level_{threshold:g}s'] = _ratio(within, counted)
+
+    answered_codes = codes[answered]
+    for p, values in grouped_percentiles(answered_codes, handle[answered], groups, percentiles).items():
+        metrics[f'aht_p{p:g}_sec'] = values
+    for p, values in grouped_percentiles(answered_codes, data.queue[answered], groups, percentiles).items():
+        metrics[f'wait_p{p:g}_sec'] = values
+    return metrics
+
+
+def outbound_metrics(codes, groups, data, percentiles):
+    """Métricas outbound: sin cola no hay ASA, abandono ni nivel de servicio
+
+    Una llamada marcada que no llegó a un agente (no contestó, ocupado, buzón)
+    no es un abandono; se reporta la tasa de contacto (answered / dialed).
+    """
+    answered = data.answered
+    handle = np.clip(data.length - data.queue, 0, None)
+
+    dialed = np.bincount(codes, minlength=groups)
+    answered_count = np.bincount(codes[answered], minlength=groups)
+    handle_total = np.bincount(codes[answered], weights=handle[answered], minlength=groups)
+
+    metrics = {
+        'dialed': dialed,
+        'answered': answered_count,
+        'answer_rate': _ratio(answered_count, dialed),
+        'aht_sec': _ratio(handle_total, answered_count),
+        'handle_sec': handle_total,
+    }
+    for p, values in grouped_percentiles(codes[answered], handle[answered], groups, percentiles).items():
+        metrics[f'aht_p{p:g}_sec'] = values
+    return metrics
+
+
+def agent_metrics(data, percentiles):
+    """Por agente: llamadas atendidas, tiempo total y AHT con percentiles"""
+    answered = data.answered
+    codes = data.agent[answered]
+    handle = np.clip(data.length - data.queue, 0, None)[answered]
+    groups = len(data.agents)
+
+    calls = np.bincount(codes, minlength=groups)
+    total = np.bincount(codes, weights=handle, minlength=groups)
+    metrics = {'calls': calls, 'handle_sec': total, 'aht_sec': _ratio(total, calls)}
+    for p, values in grouped_percentiles(codes, handle, groups, percentiles).items():
+        metrics[f'aht_p{p:g}_sec'] = values
+    return metrics, calls > 0
+
+
+def _rows(names, metrics, keep=None):
+    """{nombre: {métrica: valor}} con NaN como None"""
+    result = {}
+    for index, name in enumerate(names):
+        if keep is not None and not keep[index]:
+            continue
+        row = {}
+        for key, values in metrics.items():
+            value = values[index].item()
+            if isinstance(value, float):
+                value = None if value != value else round(value, 4 if 'rate' in key or 'level' in key else 2)
+            row[key] = value
+        result[name] = row
+    return result
+
+
+def summarize(data, thresholds, percentiles, short_abandon, outbound=False):
+    total_codes = np.zeros(len(data), dtype=np.int32)
+    if outbound:
+        campaigns = outbound_metrics(data.campaign, len(data.campaigns), data, percentiles)
+        total = outbound_metrics(total_codes, 1, data, percentiles)
+    else:
+        campaigns = inbound_metrics(data.campaign, len(data.campaigns), data, thresholds, percentiles, short_abandon)
+        total = inbound_metrics(total_codes, 1, data, thresholds, percentiles, short_abandon)
+    agents, active = agent_metrics(data, percentiles)
+    return {
+        'rows': len(data),
+        'total': _rows(['total'], total)['total'],
+        'campaigns': _rows(data.campaigns, campaigns),
+        'agents': _rows(data.agents, agents, keep=active)
+    }
+
+
+def _parse_list(value):
+    return tuple(float(item) for item in str(value).split(',') if item.strip())
+
+
+def _normalize(values, name, low, high, limit=10):
+    """Valores únicos, ordenados y redondeados: parámetros equivalentes comparten la clave de caché"""
+    values = sorted({round(float(value), 1) for value in values})
+    if not values or len(values) > limit:
+        raise ValueError(f'{name}: entre 1 y {limit} valores')
+    if values[0] < low or values[-1] > high:
+        raise ValueError(f'{name}: valores entre {low:g} y {high:g}')
+    return tuple(values)
+
+
+class ServiceLevelReports:
+    """Reportes de AHT, ASA, abandono, nivel de servicio y percentiles por período
+
+    Un período cerrado (termina antes de hoy) no cambia: se guarda
+    REPORT_CLOSED_CACHE_TTL. Uno que incluye hoy, REPORT_CACHE_TTL.
+    """
+
+    def __init__(self, loader=load_calls):
+        self.loader = loader
+        self.open_cache = TTLCache(Config.REPORT_CACHE_TTL, name='reports_open',
+                                   max_entries=Config.REPORT_CACHE_MAX_ENTRIES)
+        self.closed_cache = TTLCache(Config.REPORT_CLOSED_CACHE_TTL, name='reports_closed',
+                                     max_entries=Config.REPORT_CACHE_MAX_ENTRIES)
+
+    def report(self, start, end, thresholds=None, percentiles=None, short_abandon=None, refresh=False):
+        """Reporte de start a end (fechas, ambas incluidas)"""
+        thresholds = _normalize(thresholds or _parse_list(Config.REPORT_SL_THRESHOLDS), 'thresholds', 0, 3600)
+        percentiles = _normalize(percentiles or _parse_list(Config.REPORT_PERCENTILES), 'percentiles', 0, 100)
+        short_abandon = round(Config.REPORT_SHORT_ABANDON if short_abandon is None else float(short_abandon), 1)
+        if not 0 <= short_abandon <= 3600:
+            raise ValueError('short_abandon: valor entre 0 y 3600')
+
+        key = (start, end, thresholds, percentiles, short_abandon)
+        cache = self.closed_cache if end < date.today() else self.open_cache
+        if refresh:
+            cache.invalidate(key)
+        return cache.get(key, lambda: self._build(start, end, thresholds, percentiles, short_abandon))
+
+    def _build(self, start, end, thresholds, percentiles, short_abandon):
+        began = time.perf_counter()
+        period = (datetime.combine(start, datetime.min.time()),
+                  datetime.combine(end + timedelta(days=1), datetime.min.time()))
+
+        inbound = self.loader(INBOUND_QUERY, *period)
+        outbound = self.loader(OUTBOUND_QUERY, *period)
+        loaded = time.perf_counter()
+
+        report = {
+            'period': {'start': start.isoformat(), 'end': end.isoformat()},
+            'generated_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'thresholds_sec': list(thresholds),
+            'percentiles': list(percentiles),
+            'short_abandon_sec': short_abandon,
+            'inbound': summarize(inbound, thresholds, percentiles, short_abandon),
+            'outbound': summarize(outbound, (), percentiles, 0, outbound=True),
+        }
+        report['timings_ms'] = {'load': round((loaded - began) * 1000, 1),
+                                'compute': round((time.perf_counter() - loaded) * 1000, 1)}
+        print(f"📈 Reporte {start}..{end}: {len(inbound)} inbound + {len(outbound)} outbound "
+              f"en {report['timings_ms']['load'] + report['timings_ms']['compute']:.0f} ms")
+        return report
+
+    def get_stats(self):
+        return {'open': self.open_cache.get_stats(), 'closed': self.closed_cache.get_stats()}
+
+
+service_level_reports = ServiceLevelReports()
+
+
+# Uso por línea de comandos
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Reporte de nivel de servicio desde los logs de Vicidial')
+    parser.add_argument('--start', default=date.today().isoformat(), help='YYYY-MM-DD')
+    parser.add_argument('--end', help='YYYY-MM-DD (incluido; por defecto igual a --start)')
+    parser.add_argument('--thresholds', default=Config.REPORT_SL_THRESHOLDS, help='Segundos, separados por coma')
+    parser.add_argument('--percentiles', default=Config.REPORT_PERCENTILES)
+    parser.add_argument('--output', help='Guardar reporte JSON en este archivo')
+    args = parser.parse_args()
+
+    start = date.fromisoformat(args.start)
+    end = date.fromisoformat(args.end) if args.end else start
+    report = service_level_reports.report(start, end, _parse_list(args.thresholds), _parse_list(args.percentiles))
+
+    sl_key = f'service_level_{report["thresholds_sec"][0]:g}s' if report['thresholds_sec'] else None
+    print(f"\n📊 Inbound {start}..{end}")
+    print(f"   {'campaña':<20}{'ofrecidas':>10}{'contest.':>10}{'aband%':>8}{'ASA':>8}{'AHT':>8}{'SL':>8}")
+    for name, row in sorted(report['inbound']['campaigns'].items()) + [('TOTAL', report['inbound']['total'])]:
+        print(f"   {name:<20}{row['offered']:>10}{row['answered']:>10}{(row['abandon_rate'] or 0) * 100:>7.1f}%"
+              f"{row['asa_sec'] or 0:>8.1f}{row['aht_sec'] or 0:>8.1f}"
+              f"{(row[sl_key] or 0) * 100 if sl_key else 0:>7.1f}%")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"💾 Reporte guardado en {args.output}")
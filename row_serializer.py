@@ -0,0 +1,127 @@
+import json
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+try:
+    import orjson
+except ImportError:  # opcional: sin orjson se usa json de la stdlib
+    orjson = None
+
+
+def _datetime(value):
+    return value.isoformat(' ', 'seconds')  # mismo formato que strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _isoformat(value):
+    return value.isoformat()
+
+
+def _identity(value):
+    return value
+
+
+def _bytes(value):
+    return value.decode('utf-8', 'replace')
+
+
+# Conversión por tipo Python de la columna; el resto de tipos se deja tal cual
+CONVERTERS = {
+    datetime: _datetime,
+    date: _isoformat,
+    time: _isoformat,
+    Decimal: float,
+    timedelta: str,
+    bytes: _bytes,
+}
+
+
+class RowSerializer:
+    """Convierte filas de cursor a estructuras JSON en bloque
+
+    Los conversores de cada columna se calculan una sola vez por resultado
+    (primer valor no nulo de la columna) y solo se recorren las columnas que
+    los necesitan; las demás pasan sin tocarse. Un valor de otro tipo en la
+    misma columna (pymysql devuelve las fechas cero '0000-00-00' como str)
+    usa el conversor de su propio tipo.
+    """
+
+    def __init__(self, names):
+        self.names = tuple(names)
+
+    @classmethod
+    def from_cursor(cls, cursor):
+        return cls(column[0] for column in cursor.description)
+
+    def _mappers(self, rows):
+        mappers = []
+        for index in range(len(self.names)):
+            for row in rows:
+                value = row[index]
+                if value is not None:
+                    kind = type(value)
+                    converter = CONVERTERS.get(kind)
+                    if converter:
+                        mappers.append((index, kind, converter))
+                    break
+        return mappers
+
+    def _convert(self, rows, mappers):
+        for row in rows:
+            row = list(row)
+            for index, kind, converter in mappers:
+                value = row[index]
+                if type(value) is kind:
+                    row[index] = converter(value)
+                elif value is not None:
+                    row[index] = CONVERTERS.get(type(value), _identity)(value)
+            yield row
+
+    def lists(self, rows):
+        """Filas como listas (misma forma que jsonify sobre fetchall)"""
+        mappers = self._mappers(rows)
+        if not mappers:
+            return [list(row) for row in rows]
+        return list(self._convert(rows, mappers))
+
+    def dicts(self, rows):
+        """Filas como dicts {columna: valor}"""
+        names = self.names
+        mappers = self._mappers(rows)
+        if not mappers:
+            return [dict(zip(names, row)) for row in rows]
+        return [dict(zip(names, row)) for row in self._convert(rows, mappers)]
+
+
+def rows_to_dicts(cursor, rows):
+    return RowSerializer.from_cursor(cursor).dicts(rows)
+
+
+def rows_to_lists(cursor, rows):
+    return RowSerializer.from_cursor(cursor).lists(rows)
+
+
+def row_to_list(cursor, row):
+    """Una fila (fetchone) como lista, o None"""
+    return RowSerializer.from_cursor(cursor).lists([row])[0] if row else None
+
+
+def _default(value):
+    converter = CONVERTERS.get(type(value))
+    if converter:
+        return converter(value)
+    raise TypeError(f'Tipo no serializable: {type(value).__name__}')
+
+
+def dumps(payload):
+    """Serializar a bytes JSON (orjson si está instalado)"""
+    if orjson is not None:
+        # PASSTHROUGH_DATETIME: fechas con el mismo formato que sin orjson
+        return orjson.dumps(payload, default=_default,
+                            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME)
+    return json.dumps(payload, default=_default, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def json_response(payload, status=200):
+    """Como jsonify, pero con el serializador rápido"""
+    from flask import current_app  # import local: el módulo se usa también en benchmarks sin Flask
+    return current_app.response_class(dumps(payload), status=status, mimetype='application/json')
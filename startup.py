@@ -0,0 +1,123 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from datetime import datetime
+from circuit_breaker import get_breaker
+from config import Config
+
+
+class Dependency:
+    """Dependencia que se conecta en segundo plano al arrancar"""
+
+    PENDING = 'pending'
+    CONNECTING = 'connecting'
+    READY = 'ready'
+    TIMEOUT = 'timeout'
+    FAILED = 'failed'
+
+    def __init__(self, name, connect, required=True, breaker=None):
+        self.name = name
+        self.connect = connect
+        self.required = required
+        self.breaker = breaker
+        self.status = self.PENDING
+        self.attempts = 0
+        self.error = None
+        self.elapsed_ms = None
+        self.ready_at = None
+
+    @property
+    def ready(self):
+        """Conectada al arrancar y con el circuito (si tiene) sin abrir"""
+        if self.status != self.READY:
+            return False
+        return self.breaker is None or get_breaker(self.breaker).get_state()['state'] != 'OPEN'
+
+    def to_dict(self):
+        return {
+            'status': self.status,
+            'ready': self.ready,
+            'required': self.required,
+            'attempts': self.attempts,
+            'error': self.error,
+            'elapsed_ms': self.elapsed_ms,
+            'ready_at': self.ready_at.strftime('%Y-%m-%d %H:%M:%S') if self.ready_at else None
+        }
+
+
+class StartupManager:
+    """Conecta todas las dependencias a la vez sin bloquear el servidor HTTP
+
+    Cada dependencia se reintenta con espera creciente hasta conectar. Un intento
+    que supera STARTUP_CONNECT_TIMEOUT se marca como timeout (el intento sigue en
+    su hilo y no se lanza otro hasta que termine).
+    """
+
+    def __init__(self, timeout=None, retry_delay=None, max_retry_delay=None):
+        self.timeout = timeout or Config.STARTUP_CONNECT_TIMEOUT
+        self.retry_delay = retry_delay or Config.STARTUP_RETRY_DELAY
+        self.max_retry_delay = max_retry_delay or Config.STARTUP_MAX_RETRY_DELAY
+        self.dependencies = {}
+        self.started_at = time.monotonic()
+        self._executor = None
+
+    def register(self, name, connect, required=True, breaker=None):
+        """connect() debe devolver algo verdadero o lanzar excepción si falla"""
+        self.dependencies[name] = Dependency(name, connect, required, breaker)
+
+    def start(self):
+        """Lanzar la conexión de todas las dependencias en segundo plano"""
+        self.started_at = time.monotonic()
+        self._executor = ThreadPoolExecutor(max_workers=len(self.dependencies) or 1,
+                                            thread_name_prefix='startup')
+        for dependency in self.dependencies.values():
+            thread = threading.Thread(target=self._supervise, args=(dependency,),
+                                      name=f'startup-{dependency.name}')
+            thread.daemon = True
+            thread.start()
+        print(f"🚦 Conectando dependencias en segundo plano: {', '.join(self.dependencies)}")
+
+    def _supervise(self, dependency):
+        delay = self.retry_delay
+        while True:
+            dependency.status = Dependency.CONNECTING
+            dependency.attempts += 1
+            start = time.monotonic()
+            future = self._executor.submit(dependency.connect)
+
+            try:
+                try:
+                    ok = future.result(timeout=self.timeout)
+                except FutureTimeoutError:
+                    dependency.status = Dependency.TIMEOUT
+                    dependency.error = f'Sin respuesta tras {self.timeout}s'
+                    print(f"⏱️ {dependency.name}: sin respuesta tras {self.timeout}s, sigue intentando")
+                    ok = future.result()
+
+                if not ok:
+                    raise RuntimeError('la conexión devolvió False')
+
+                dependency.status = Dependency.READY
+                dependency.error = None
+                dependency.elapsed_ms = round((time.monotonic() - start) * 1000, 1)
+                dependency.ready_at = datetime.now()
+                print(f"✅ {dependency.name} listo en {dependency.elapsed_ms} ms (intento {dependency.attempts})")
+                return
+
+            except Exception as e:
+                dependency.status = Dependency.FAILED
+                dependency.error = str(e)
+                print(f"❌ {dependency.name} no disponible ({e}), reintento en {delay:.0f}s")
+
+            time.sleep(delay)
+            delay = min(delay * 2, self.max_retry_delay)
+
+    def is_ready(self):
+        return all(dependency.ready for dependency in self.dependencies.values() if dependency.required)
+
+    def get_state(self):
+        return {
+            'ready': self.is_ready(),
+            'uptime_seconds': round(time.monotonic() - self.started_at, 1),
+            'dependencies': {name: dependency.to_dict() for name, dependency in self.dependencies.items()}
+        }
@@ -0,0 +1,84 @@
+import hashlib
+import threading
+import time
+from flask import current_app, request
+from config import Config
+from row_serializer import json_response
+
+
+class VersionRegistry:
+    """Contadores de versión por clave (p. ej. 'agent:5', 'ext:8001')
+
+    Cada cambio conocido de estado hace bump(); los long-polls esperan con
+    wait_for() a que la suma de sus claves supere la versión que ya tienen.
+    """
+
+    def __init__(self):
+        self._versions = {}
+        self._condition = threading.Condition()
+
+    def bump(self, key):
+        with self._condition:
+            self._versions[key] = self._versions.get(key, 0) + 1
+            self._condition.notify_all()
+
+    def get(self, *keys):
+        with self._condition:
+            return sum(self._versions.get(key, 0) for key in keys)
+
+    def wait_for(self, keys, after, timeout):
+        """Esperar hasta que la versión de keys sea > after o pase timeout; devuelve la versión"""
+        with self._condition:
+            self._condition.wait_for(
+                lambda: sum(self._versions.get(key, 0) for key in keys) > after, timeout
+            )
+            return sum(self._versions.get(key, 0) for key in keys)
+
+
+state_versions = VersionRegistry()
+
+
+def make_etag(body):
+    return '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+
+
+def conditional_json(build, keys):
+    """Responder build() con ETag, 304 si no cambió y long-polling opcional
+
+    Parámetros del cliente:
+      If-None-Match: ETag de la última respuesta -> 304 si el contenido es el mismo.
+      ?version=N: versión de la última respuesta (cabecera X-State-Version).
+      ?wait=S: retener el pedido hasta S segundos (máx. LONG_POLL_MAX_WAIT) esperando un cambio.
+    Durante la espera se recalcula al cambiar la versión o cada LONG_POLL_RECHECK
+    segundos, así también se detectan cambios hechos fuera del CRM.
+    """
+    client_etag = request.headers.get('If-None-Match')
+    since = request.args.get('version', type=int)
+    wait = min(max(request.args.get('wait', 0, type=float), 0), Config.LONG_POLL_MAX_WAIT)
+    deadline = time.monotonic() + wait
+    first_etag = None
+
+    while True:
+        version = state_versions.get(*keys)
+        response = json_response(build())
+        etag = make_etag(response.get_data())
+        first_etag = first_etag or etag
+
+        if client_etag:
+            changed = etag != client_etag
+        else:
+            # Sin ETag del cliente, un cambio hecho fuera del CRM solo se ve en el contenido
+            changed = since is None or version > since or etag != first_etag
+
+        remaining = deadline - time.monotonic()
+        if changed or remaining <= 0:
+            break
+        state_versions.wait_for(keys, version, min(remaining, Config.LONG_POLL_RECHECK))
+
+    if not changed and client_etag:
+        response = current_app.response_class(status=304)
+
+    response.headers['ETag'] = etag
+    response.headers['X-State-Version'] = str(version)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
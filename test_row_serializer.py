@@ -0,0 +1,22 @@
+from datetime import date, datetime
+from decimal import Decimal
+from row_serializer import RowSerializer, dumps
+
+
+def test_converts_by_column_type():
+    rows = [(datetime(2024, 1, 2, 3, 4, 5), Decimal('1.5'), 'x')]
+    assert RowSerializer(['a', 'b', 'c']).lists(rows) == [['2024-01-02 03:04:05', 1.5, 'x']]
+
+
+def test_mixed_types_in_column():
+    # pymysql devuelve las fechas cero como str en una columna DATETIME
+    rows = [(datetime(2024, 1, 2, 3, 4, 5),), ('0000-00-00 00:00:00',), (None,), (date(2024, 1, 2),)]
+    assert RowSerializer(['a']).lists(rows) == [['2024-01-02 03:04:05'], ['0000-00-00 00:00:00'],
+                                                [None], ['2024-01-02']]
+
+
+def test_dicts_and_dumps():
+    rows = [(1, datetime(2024, 1, 2, 3, 4, 5)), (2, '0000-00-00 00:00:00')]
+    dicts = RowSerializer(['id', 'start_time']).dicts(rows)
+    assert dicts[1] == {'id': 2, 'start_time': '0000-00-00 00:00:00'}
+    assert b'"2024-01-02 03:04:05"' in dumps(dicts)
@@ -0,0 +1,224 @@
+import math
+import threading
+import time
+from array import array
+from config import Config
+
+# Niveles de resolución: (nombre, segundos por punto, puntos guardados)
+# 1 hora a 1 s, 1 día a 1 min y 7 días a 15 min
+TIERS = (('1s', 1, 3600), ('1m', 60, 1440), ('15m', 900, 672))
+
+# Métricas que se derivan de cada foto del monitor
+LIVE_METRICS = ('queue_depth', 'live_calls', 'logged_in_agents', 'available_agents',
+                'agents_in_call', 'paused_agents')
+ALL_CAMPAIGNS = 'all'
+
+
+class RingSeries:
+    """Buffer circular de tamaño fijo: un slot por intervalo de `resolution` segundos
+
+    Cada slot guarda suma, conteo, mínimo, máximo y último valor del intervalo;
+    un slot se reutiliza cuando llega un punto del mismo índice una vuelta después.
+    """
+
+    __slots__ = ('resolution', 'slots', '_bucket', '_sum', '_count', '_min', '_max', '_last')
+
+    def __init__(self, resolution, slots):
+        self.resolution = resolution
+        self.slots = slots
+        self._bucket = array('q', [-1]) * slots
+        self._sum = array('d', [0.0]) * slots
+        self._count = array('L', [0]) * slots
+        self._min = array('d', [0.0]) * slots
+        self._max = array('d', [0.0]) * slots
+        self._last = array('d', [0.0]) * slots
+
+    def add(self, timestamp, value):
+        bucket = int(timestamp // self.resolution)
+        index = bucket % self.slots
+        current = self._bucket[index]
+        if current > bucket:
+            return  # muestra más vieja que lo que ya ocupa el slot
+        if current != bucket:
+            self._bucket[index] = bucket
+            self._sum[index] = value
+            self._count[index] = 1
+            self._min[index] = value
+            self._max[index] = value
+        else:
+            self._sum[index] += value
+            self._count[index] += 1
+            if value < self._min[index]:
+                self._min[index] = value
+            if value > self._max[index]:
+                self._max[index] = value
+        self._last[index] = value
+
+    def points(self, start, end):
+        """[inicio, promedio, mín, máx, último] por intervalo entre start y end; None en huecos"""
+        last_bucket = int(end // self.resolution)
+        first_bucket = max(int(start // self.resolution), last_bucket - self.slots + 1)
+        result = []
+        for bucket in range(first_bucket, last_bucket + 1):
+            index = bucket % self.slots
+            if self._bucket[index] == bucket:
+                result.append([bucket * self.resolution, self._sum[index] / self._count[index],
+                               self._min[index], self._max[index], self._last[index]])
+            else:
+                result.append([bucket * self.resolution, None, None, None, None])
+        return result
+
+    @property
+    def span(self):
+        return self.resolution * self.slots
+
+    @property
+    def nbytes(self):
+        return sum(a.itemsize * len(a) for a in (self._bucket, self._sum, self._count,
+                                                   self._min, self._max, self._last))
+
+
+def carry_forward(points, max_gap):
+    """Rellenar huecos con el último valor conocido si el hueco no supera max_gap segundos
+
+    El monitor solo registra en cada tick (hasta MONITOR_MAX_INTERVAL entre ticks
+    sin actividad); entre ticks el valor no cambió.
+    """
+    previous = None
+    for point in points:
+        if point[1] is not None:
+            previous = point
+        elif previous is not None and point[0] - previous[0] <= max_gap:
+            value = previous[4]
+            point[1:] = [value, value, value, value]
+    return points
+
+
+def downsample(points, target):
+    """Agrupar puntos consecutivos hasta quedar con `target` (para sparklines)"""
+    if not target or len(points) <= target:
+        return points
+    size = math.ceil(len(points) / target)
+    result = []
+    for offset in range(0, len(points), size):
+        group = [p for p in points[offset:offset + size] if p[1] is not None]
+        start = points[offset][0]
+        if not group:
+            result.append([start, None, None, None, None])
+            continue
+        result.append([start, sum(p[1] for p in group) / len(group), min(p[2] for p in group),
+                       max(p[3] for p in group), group[-1][4]])
+    return result
+
+
+class TimeSeriesStore:
+    """Historial en memoria fija de métricas en vivo por campaña
+
+    Cada muestra entra a todos los niveles (1 s, 1 min, 15 min), que agregan al
+    recibirla: el submuestreo no necesita un proceso aparte. query() elige el
+    nivel más fino que cubre la ventana pedida.
+    """
+
+    def __init__(self, tiers=TIERS, max_gap=None):
+        self.tiers = tiers
+        self.max_gap = max_gap or Config.TIMESERIES_MAX_GAP
+        self._series = {}  # {(métrica, campaña): [RingSeries por nivel]}
+        self._latest = {}  # {(métrica, campaña): último valor}
+        self._lock = threading.Lock()
+        self.samples = 0
+        self.updated_at = None
+
+    def _get_series(self, key):
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [RingSeries(resolution, slots) for _, resolution, slots in self.tiers]
+        return series
+
+    def record(self, values, timestamp=None):
+        """Registrar una foto {(métrica, campaña): valor}
+
+        Las series conocidas que no vienen en la foto se registran en 0 (una
+        campaña sin llamadas en cola deja de aparecer en la consulta del monitor).
+        """
+        timestamp = timestamp or time.time()
+        with self._lock:
+            for key in self._series.keys() - values.keys():
+                for series in self._series[key]:
+                    series.add(timestamp, 0.0)
+                self._latest[key] = 0.0
+            for key, value in values.items():
+                for series in self._get_series(key):
+                    series.add(timestamp, float(value))
+                self._latest[key] = float(value)
+            self.samples += 1
+            self.updated_at = timestamp
+
+    def query(self, metric, campaign=ALL_CAMPAIGNS, window=3600, points=None, end=None):
+        """Historial de una métrica en los últimos `window` segundos
+
+        points: máximo de puntos a devolver (se agrupan); None devuelve la
+        resolución del nivel elegido. Cada punto es [epoch, promedio, mín, máx, último].
+        """
+        end = end or time.time()
+        with self._lock:
+            series = self._series.get((metric, campaign))
+            if series is None:
+                return None
+            tier = next((i for i, ring in enumerate(series) if ring.span >= window), len(series) - 1)
+            ring = series[tier]
+            raw = ring.points(end - window, end)
+
+        raw = carry_forward(raw, max(self.max_gap, ring.resolution))
+        return {
+            'metric': metric,
+            'campaign': campaign,
+            'window': window,
+            'resolution': self.tiers[tier][0],
+            'points': downsample(raw, points)
+        }
+
+    def latest(self):
+        """Último valor de cada serie: {métrica: {campaña: valor}}"""
+        result = {}
+        with self._lock:
+            for (metric, campaign), value in self._latest.items():
+                result.setdefault(metric, {})[campaign] = value
+        return result
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'series': len(self._series),
+                'samples': self.samples,
+                'memory_kb': round(sum(ring.nbytes for series in self._series.values() for ring in series) / 1024, 1),
+                'tiers': [{'name': name, 'resolution_s': resolution, 'points': slots}
+                          for name, resolution, slots in self.tiers]
+            }
+
+
+def snapshot_values(snapshot):
+    """Métricas por campaña (y total 'all') a partir de una foto de AdaptiveMonitor"""
+    values = {(metric, ALL_CAMPAIGNS): 0 for metric in LIVE_METRICS}
+
+    def count(metric, campaign):
+        for key in ((metric, campaign or ''), (metric, ALL_CAMPAIGNS)):
+            values[key] = values.get(key, 0) + 1
+
+    for agent in snapshot['agents']:
+        campaign = agent.get('campaign_id')
+        status = agent.get('status')
+        count('logged_in_agents', campaign)
+        if status in ('READY', 'CLOSER'):
+            count('available_agents', campaign)
+        elif status in ('INCALL', 'QUEUE'):
+            count('agents_in_call', campaign)
+        elif status == 'PAUSED':
+            count('paused_agents', campaign)
+
+    for call in snapshot['calls']:
+        campaign = call.get('campaign_id')
+        count('live_calls', campaign)
+        if call.get('status') == 'QUEUE':
+            count('queue_depth', campaign)
+
+    return values
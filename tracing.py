@@ -0,0 +1,221 @@
+import contextvars
+import heapq
+import itertools
+import json
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from functools import wraps
+from config import Config
+
+_current_span = contextvars.ContextVar('current_span', default=None)
+_tiebreak = itertools.count()
+
+
+class _NoopSpan:
+    """Span vacío cuando no hay traza activa (sin costo de medición)"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **attributes):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Trace:
+    def __init__(self, name):
+        self.id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.started_at = time.time()
+        self.spans = []
+        self.dropped = 0
+        self.root = None
+        self._lock = threading.Lock()
+
+    def add(self, span):
+        with self._lock:
+            if len(self.spans) >= Config.TRACE_MAX_SPANS:
+                self.dropped += 1
+                return
+            self.spans.append(span)
+
+    def to_dict(self):
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span.offset_ms)
+        return {
+            'trace_id': self.id,
+            'name': self.name,
+            'started_at': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.started_at)),
+            'duration_ms': self.root.duration_ms if self.root else None,
+            'error': self.root.error if self.root else None,
+            'attributes': self.root.attributes if self.root else {},
+            'breakdown_ms': breakdown(spans),
+            'dropped_spans': self.dropped,
+            'spans': [span.to_dict() for span in spans]
+        }
+
+
+class Span:
+    __slots__ = ('trace', 'name', 'span_id', 'parent_id', 'attributes', 'offset_ms',
+                 'duration_ms', 'error', '_start', '_token')
+
+    def __init__(self, trace, name, parent_id, attributes):
+        self.trace = trace
+        self.name = name
+        self.span_id = uuid.uuid4().hex[:8]
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.duration_ms = None
+        self.error = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        self.offset_ms = round((time.time() - self.trace.started_at) * 1000, 2)
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration_ms = round((time.perf_counter() - self._start) * 1000, 2)
+        if exc is not None:
+            self.error = f'{exc_type.__name__}: {exc}'
+        _current_span.reset(self._token)
+        self.trace.add(self)
+        if self.parent_id is None:
+            tracer.finish(self.trace)
+        return False
+
+    def to_dict(self):
+        return {
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'offset_ms': self.offset_ms,
+            'duration_ms': self.duration_ms,
+            'error': self.error,
+            'attributes': self.attributes
+        }
+
+
+def breakdown(spans):
+    """Tiempo por tipo de salto (prefijo antes de ':': sql, sqlite, ami, api, step...)"""
+    totals = {}
+    for span in spans:
+        if span.parent_id is None or span.duration_ms is None:
+            continue
+        kind = span.name.split(':', 1)[0]
+        totals[kind] = round(totals.get(kind, 0.0) + span.duration_ms, 2)
+    return totals
+
+
+class InMemoryExporter:
+    """Guarda las trazas más lentas y las más recientes"""
+
+    def __init__(self, slowest=None, recent=None):
+        self.slowest_limit = slowest or Config.TRACE_SLOWEST_KEEP
+        self._slowest = []  # heap de (duración, desempate, traza)
+        self._recent = deque(maxlen=recent or Config.TRACE_RECENT_KEEP)
+        self._lock = threading.Lock()
+
+    def export(self, trace):
+        item = (trace.root.duration_ms, next(_tiebreak), trace)
+        with self._lock:
+            self._recent.append(trace)
+            if len(self._slowest) < self.slowest_limit:
+                heapq.heappush(self._slowest, item)
+            elif item[0] > self._slowest[0][0]:
+                heapq.heapreplace(self._slowest, item)
+
+    def slowest(self, name=None, limit=20):
+        with self._lock:
+            traces = [trace for _, _, trace in self._slowest]
+        if name:
+            traces = [trace for trace in traces if trace.name == name]
+        return sorted(traces, key=lambda trace: trace.root.duration_ms, reverse=True)[:limit]
+
+    def get(self, trace_id):
+        with self._lock:
+            candidates = list(self._recent) + [trace for _, _, trace in self._slowest]
+        for trace in candidates:
+            if trace.id == trace_id:
+                return trace
+        return None
+
+    def clear(self):
+        with self._lock:
+            self._slowest.clear()
+            self._recent.clear()
+
+
+class FileExporter:
+    """Agrega cada traza como una línea JSON a un archivo"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, trace):
+        line = json.dumps(trace.to_dict(), ensure_ascii=False, default=str)
+        with self._lock:
+            with open(self.path, 'a') as f:
+                f.write(line + '\n')
+
+
+class Tracer:
+    def __init__(self):
+        self.enabled = Config.TRACING_ENABLED
+        self.sample_rate = Config.TRACE_SAMPLE_RATE
+        self.memory = InMemoryExporter()
+        self.exporters = [self.memory]
+        if Config.TRACE_FILE:
+            self.exporters.append(FileExporter(Config.TRACE_FILE))
+
+    def trace(self, name, **attributes):
+        """Span raíz de una traza nueva (pedido HTTP, job, callback AMI)"""
+        if not self.enabled or random.random() >= self.sample_rate:
+            return NOOP_SPAN
+        trace = Trace(name)
+        trace.root = Span(trace, name, None, attributes)
+        return trace.root
+
+    def span(self, name, **attributes):
+        """Span hijo del span activo; no hace nada si no hay traza en curso"""
+        parent = _current_span.get()
+        if parent is None:
+            return NOOP_SPAN
+        return Span(parent.trace, name, parent.span_id, attributes)
+
+    def current_trace_id(self):
+        span = _current_span.get()
+        return span.trace.id if span else None
+
+    def finish(self, trace):
+        for exporter in self.exporters:
+            try:
+                exporter.export(trace)
+            except Exception as e:
+                print(f"⚠️ Error exportando traza {trace.id}: {e}")
+
+
+tracer = Tracer()
+
+
+def traced(name):
+    """Decorador: span alrededor de la función si hay traza activa"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with tracer.span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -2,29 +2,42 @@ import asterisk.manager
 import threading
 import time
 from datetime import datetime
+from circuit_breaker import get_breaker
+from config import Config
+from metrics import AMI_ACTION_SECONDS, AMI_EVENTS
+from profiler import profiler
+from tracing import tracer
 
 
 class VicidialAMI:
     def __init__(self):
-        self.host = '195.26.249.9'
-        self.port = 5038
-        self.username = 'cron'
-        self.secret = '1234'
+        self.host = Config.VICIDIAL_AMI_HOST
+        self.port = Config.VICIDIAL_AMI_PORT
+        self.username = Config.VICIDIAL_AMI_USER
+        self.secret = Config.VICIDIAL_AMI_SECRET
         self.manager = None
         self.connected = False
         self.event_callbacks = {}
+        self.breaker = get_breaker('ami')
 
     def connect(self):
         """Conectar a Asterisk AMI"""
         try:
+            self.breaker.before_call()
+            start = time.monotonic()
             self.manager = asterisk.manager.Manager()
-            self.manager.connect(self.host, self.port)
-            self.manager.login(self.username, self.secret)
+            try:
+                self.manager.connect(self.host, self.port)
+                self.manager.login(self.username, self.secret)
+            except Exception as e:
+                self.breaker.record_failure(e)
+                raise
+            self.breaker.record_success(time.monotonic() - start)
             self.connected = True
             print(f"✅ Conectado a AMI: {self.host}:{self.port}")
 
             # Registrar eventos generales
-            self.manager.register_event('*', self._event_handler)
+            self.manager.register_event('*', profiler.wrap('ami:event_handler', self._event_handler))
             return True
 
         except Exception as e:
@@ -38,9 +51,26 @@ class VicidialAMI:
             self.connected = False
             print("🔌 Desconectado de AMI")
 
+    def send_action(self, action):
+        """Enviar acción AMI protegida por el circuit breaker"""
+        self.breaker.before_call()
+        start = time.monotonic()
+        try:
+            with tracer.span(f"ami:{action.get('Action', 'unknown')}"):
+                response = self.manager.send_action(action)
+        except Exception as e:
+            AMI_ACTION_SECONDS.observe(time.monotonic() - start, action.get('Action', 'unknown'), 'ami', 'error')
+            self.breaker.record_failure(e)
+            raise
+        elapsed = time.monotonic() - start
+        AMI_ACTION_SECONDS.observe(elapsed, action.get('Action', 'unknown'), 'ami', 'ok')
+        self.breaker.record_success(elapsed)
+        return response
+
     def _event_handler(self, event, manager):
         """Manejar eventos entrantes"""
         event_name = event.name
+        AMI_EVENTS.inc(event_name, 'ami')
 
         # Llamar callbacks específicos si existen
         if event_name in self.event_callbacks:
@@ -67,7 +97,7 @@ class VicidialAMI:
         """Login de agente en cola"""
         try:
             # Agregar agente a la cola
-            response = self.manager.send_action({
+            response = self.send_action({
                 'Action': 'QueueAdd',
                 'Queue': queue,
                 'Interface': f'SIP/{extension}',
@@ -94,7 +124,7 @@ class VicidialAMI:
     def agent_logout(self, agent_user, extension, queue='DEMOIN'):
         """Logout de agente de cola"""
         try:
-            response = self.manager.send_action({
+            response = self.send_action({
                 'Action': 'QueueRemove',
                 'Queue': queue,
                 'Interface': f'SIP/{extension}'
@@ -110,7 +140,7 @@ class VicidialAMI:
     def pause_agent(self, extension, queue='DEMOIN', reason='Break'):
         """Pausar agente en cola"""
         try:
-            response = self.manager.send_action({
+            response = self.send_action({
                 'Action': 'QueuePause',
                 'Interface': f'SIP/{extension}',
                 'Queue': queue,
@@ -128,7 +158,7 @@ class VicidialAMI:
     def unpause_agent(self, extension, queue='DEMOIN'):
         """Despausar agente en cola"""
         try:
-            response = self.manager.send_action({
+            response = self.send_action({
                 'Action': 'QueuePause',
                 'Interface': f'SIP/{extension}',
                 'Queue': queue,
@@ -145,7 +175,7 @@ class VicidialAMI:
     def get_queue_status(self, queue='DEMOIN'):
         """Obtener estado de cola"""
         try:
-            response = self.manager.send_action({
+            response = self.send_action({
                 'Action': 'QueueStatus',
                 'Queue': queue
             })
@@ -160,7 +190,7 @@ class VicidialAMI:
     def originate_call(self, extension, number, context='default'):
         """Originar llamada desde extensión"""
         try:
-            response = self.manager.send_action({
+            response = self.send_action({
                 'Action': 'Originate',
                 'Channel': f'SIP/{extension}',
                 'Exten': number,
@@ -180,7 +210,7 @@ class VicidialAMI:
     def hangup_call(self, channel):
         """Colgar llamada específica"""
         try:
-            response = self.manager.send_action({
+            response = self.send_action({
                 'Action': 'Hangup',
                 'Channel': channel
             })
@@ -195,7 +225,7 @@ class VicidialAMI:
     def get_channels(self):
         """Obtener canales activos"""
         try:
-            response = self.manager.send_action({
+            response = self.send_action({
                 'Action': 'CoreShowChannels'
             })
 
@@ -208,7 +238,7 @@ class VicidialAMI:
     def start_monitor(self, channel, filename):
         """Iniciar grabación de llamada"""
         try:
-            response = self.manager.send_action({
+            response = self.send_action({
                 'Action': 'Monitor',
                 'Channel': channel,
                 'File': filename,
@@ -225,7 +255,7 @@ class VicidialAMI:
     def show_queues(self):
         """Mostrar todas las colas disponibles"""
         try:
-            response = self.manager.send_action({
+            response = self.send_action({
                 'Action': 'QueueShow'
             })
 
@@ -239,7 +269,7 @@ class VicidialAMI:
     def show_sip_peers(self):
         """Mostrar peers SIP disponibles"""
         try:
-            response = self.manager.send_action({
+            response = self.send_action({
                 'Action': 'SIPshowpeer',
                 'Peer': '2000'
             })
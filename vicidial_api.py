@@ -1,7 +1,48 @@
 import requests
 import json
+import random
+import threading
+import time
+from collections import deque
 from datetime import datetime
+from requests.adapters import HTTPAdapter
+from cache import SingleFlight, TTLCache
+from circuit_breaker import get_breaker
+from metrics import VICIDIAL_API_SECONDS
+from tracing import tracer
 from config import Config
+from vicidial_parsers import (VicidialResponseError, parse_campaigns, parse_inbound_groups,
+                              parse_user_status)
+
+
+# Funciones de non_agent_api.php que solo leen datos y se pueden reintentar sin riesgo
+IDEMPOTENT_FUNCTIONS = {'version', 'user_status', 'campaigns_list', 'inbound_group_list'}
+
+# Cantidad de latencias recientes que se guardan por función para percentiles
+LATENCY_SAMPLES = 500
+
+
+def should_retry(function, attempt, max_retries, connect_timeout=False, status=None):
+    """Regla de reintentos común a VicidialAPI y AsyncVicidialAPI
+
+    connect_timeout: no se pudo conectar (la petición nunca llegó a Vicidial).
+    status: código HTTP de la respuesta con error, si hubo respuesta.
+    """
+    if attempt >= max_retries:
+        return False
+
+    # Si no se pudo conectar, la petición nunca llegó a Vicidial
+    if connect_timeout:
+        return True
+
+    if function not in IDEMPOTENT_FUNCTIONS:
+        return False
+
+    # Errores 4xx no mejoran reintentando
+    if status is not None and status < 500:
+        return False
+
+    return True
 
 
 class VicidialAPI:
@@ -11,17 +52,145 @@ class VicidialAPI:
         self.agent_api_url = Config.VICIDIAL_AGENT_API_URL
         self.api_user = Config.VICIDIAL_API_USER
         self.api_pass = Config.VICIDIAL_API_PASS
-        self.session = requests.Session()
+        self.timeout = (Config.VICIDIAL_API_CONNECT_TIMEOUT, Config.VICIDIAL_API_READ_TIMEOUT)
+        self.max_retries = Config.VICIDIAL_API_MAX_RETRIES
+        self.backoff_base = Config.VICIDIAL_API_BACKOFF_BASE
+        self.backoff_max = Config.VICIDIAL_API_BACKOFF_MAX
+        self.session = self._create_session()
+        self.breaker = get_breaker('vicidial_api')
+
+        # Datos de referencia (campañas, grupos inbound) cambian pocas veces al día
+        self.reference_cache = TTLCache(
+            ttl=Config.REFERENCE_CACHE_TTL,
+            stale_ttl=Config.REFERENCE_CACHE_STALE_TTL,
+            name='vicidial_reference'
+        )
+
+        # Consultas user_status idénticas y simultáneas comparten una sola petición
+        self.status_flight = SingleFlight(result_ttl=Config.AGENT_STATUS_TTL, name='user_status')
+
+        # Métricas de latencia por función de la API
+        self._metrics = {}
+        self._metrics_lock = threading.Lock()
+
+    def _create_session(self):
+        """Crear sesión HTTP con pool de conexiones keep-alive dimensionado"""
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=Config.VICIDIAL_API_POOL_CONNECTIONS,
+            pool_maxsize=Config.VICIDIAL_API_POOL_MAXSIZE,
+            pool_block=Config.VICIDIAL_API_POOL_BLOCK,
+            max_retries=0  # Los reintentos se controlan en _make_request
+        )
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.headers.update({'Connection': 'keep-alive'})
+        return session
+
+    def _backoff_delay(self, attempt):
+        """Backoff exponencial con jitter completo"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _is_retryable(self, function, error, attempt):
+        """Decidir si un error permite reintentar la petición"""
+        response = getattr(error, 'response', None)
+        return should_retry(function, attempt, self.max_retries,
+                            connect_timeout=isinstance(error, requests.exceptions.ConnectTimeout),
+                            status=response.status_code if response is not None else None)
 
     def _make_request(self, url, params):
         """Hacer petición a la API de Vicidial"""
-        try:
-            response = self.session.get(url, params=params, timeout=30)
-            response.raise_for_status()
-            return response.text
-        except requests.exceptions.RequestException as e:
-            print(f"Error en petición a Vicidial: {e}")
-            return None
+        function = params.get('function', 'unknown')
+
+        # Falla rápido (CircuitOpenError) si non_agent_api.php está caído
+        self.breaker.before_call()
+
+        with tracer.span(f'api:{function}') as span:
+            return self._request_with_retries(url, params, function, span)
+
+    def _request_with_retries(self, url, params, function, span):
+        """Petición con reintentos (los idempotentes y los timeouts de conexión)"""
+        start = time.perf_counter()
+        attempt = 0
+
+        while True:
+            try:
+                response = self.session.get(url, params=params, timeout=self.timeout)
+                response.raise_for_status()
+                self.record_latency(function, start, attempt, ok=True)
+                self.breaker.record_success(time.perf_counter() - start)
+                span.set(attempts=attempt + 1, status=response.status_code)
+                return response.text
+            except requests.exceptions.RequestException as e:
+                if not self._is_retryable(function, e, attempt):
+                    self.record_latency(function, start, attempt, ok=False)
+                    span.set(attempts=attempt + 1, error=str(e))
+                    error_response = getattr(e, 'response', None)
+                    if error_response is not None and error_response.status_code < 500:
+                        # El host respondió: un 4xx no indica que la dependencia esté caída
+                        self.breaker.record_success()
+                    else:
+                        self.breaker.record_failure(e)
+                    print(f"Error en petición a Vicidial: {e}")
+                    return None
+
+                delay = self._backoff_delay(attempt)
+                attempt += 1
+                print(f"⚠️ Reintentando {function} ({attempt}/{self.max_retries}) en {delay:.2f}s: {e}")
+                time.sleep(delay)
+
+    def record_latency(self, function, start, retries, ok):
+        """Registrar latencia total (incluyendo reintentos) de una función"""
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        VICIDIAL_API_SECONDS.observe(elapsed_ms / 1000, function, 'ok' if ok else 'error')
+
+        with self._metrics_lock:
+            stats = self._metrics.get(function)
+            if stats is None:
+                stats = {
+                    'count': 0,
+                    'errors': 0,
+                    'retries': 0,
+                    'total_ms': 0.0,
+                    'max_ms': 0.0,
+                    'samples': deque(maxlen=LATENCY_SAMPLES)
+                }
+                self._metrics[function] = stats
+
+            stats['count'] += 1
+            stats['retries'] += retries
+            stats['total_ms'] += elapsed_ms
+            stats['max_ms'] = max(stats['max_ms'], elapsed_ms)
+            stats['samples'].append(elapsed_ms)
+            if not ok:
+                stats['errors'] += 1
+
+    def get_metrics(self):
+        """Resumen de latencias por función (promedio, percentiles, errores)"""
+        with self._metrics_lock:
+            snapshot = {name: dict(stats, samples=sorted(stats['samples']))
+                        for name, stats in self._metrics.items()}
+
+        def percentile(samples, pct):
+            if not samples:
+                return 0.0
+            index = min(len(samples) - 1, int(round(pct / 100 * (len(samples) - 1))))
+            return samples[index]
+
+        result = {}
+        for name, stats in snapshot.items():
+            samples = stats['samples']
+            result[name] = {
+                'count': stats['count'],
+                'errors': stats['errors'],
+                'retries': stats['retries'],
+                'avg_ms': round(stats['total_ms'] / stats['count'], 2) if stats['count'] else 0.0,
+                'p50_ms': round(percentile(samples, 50), 2),
+                'p95_ms': round(percentile(samples, 95), 2),
+                'p99_ms': round(percentile(samples, 99), 2),
+                'max_ms': round(stats['max_ms'], 2)
+            }
+        return result
 
     def _build_query_string(self, params):
         """Helper para construir query string para debug"""
@@ -73,17 +242,26 @@ class VicidialAPI:
         print(f"URL teléfono: {self.api_url}?{self._build_query_string(params)}")
         return response
 
-    def create_agent_complete(self, agent_data):
-        """Crear agente y teléfono en Vicidial"""
+    def create_agent_complete(self, agent_data, throttle=None):
+        """Crear agente y teléfono en Vicidial
+
+        throttle: función opcional que se llama antes de cada petición (rate limiting)
+        """
         # Crear usuario
+        if throttle:
+            throttle()
         user_response = self.create_agent(agent_data)
         print(f"Respuesta usuario: {user_response}")
 
         # Crear teléfono
+        if throttle:
+            throttle()
         phone_response = self.create_phone(agent_data)
         print(f"Respuesta teléfono: {phone_response}")
 
         # Actualizar usuario para agregar phone_login y phone_pass
+        if throttle:
+            throttle()
         update_response = self.update_user_phone(agent_data)
         print(f"Respuesta actualización: {update_response}")
 
@@ -164,7 +342,7 @@ class VicidialAPI:
         if campaign:
             params['campaign'] = campaign
 
-        return self._make_request(self.api_url, params)
+        return self._change_agent_state(user_id, params)
 
     def agent_logout(self, user_id):
         """Logout de agente usando non_agent_api.php"""
@@ -177,7 +355,7 @@ class VicidialAPI:
             'user_id': user_id
         }
 
-        return self._make_request(self.api_url, params)
+        return self._change_agent_state(user_id, params)
 
     def set_agent_status(self, user_id, status, pause_code=None):
         """Cambiar estado del agente (READY, PAUSED, etc.)"""
@@ -194,10 +372,22 @@ class VicidialAPI:
         if pause_code and status == 'PAUSED':
             params['pause_code'] = pause_code
 
-        return self._make_request(self.api_url, params)
+        return self._change_agent_state(user_id, params)
+
+    def _change_agent_state(self, user_id, params):
+        """Pedido que cambia el estado del agente; después se descarta el user_status guardado"""
+        try:
+            return self._make_request(self.api_url, params)
+        finally:
+            # Al terminar: una consulta hecha durante el cambio pudo leer el estado anterior
+            self.status_flight.forget(user_id)
 
     def get_agent_status(self, user_id):
-        """Obtener estado actual del agente"""
+        """Obtener estado actual del agente (coalescido entre peticiones concurrentes)"""
+        return self.status_flight.do(user_id, lambda: self._fetch_agent_status(user_id))
+
+    def _fetch_agent_status(self, user_id):
+        """Consultar user_status en Vicidial"""
         params = {
             'version': '2.14',
             'source': 'crm',
@@ -231,4 +421,41 @@ class VicidialAPI:
             'function': 'inbound_group_list'
         }
 
-        return self._make_request(self.api_url, params)
\ No newline at end of file
+        return self._make_request(self.api_url, params)
+
+    def _fetch_parsed(self, function, parser):
+        """Pedir función de listado con header y parsearla (None si falla)"""
+        params = {
+            'version': '2.14',
+            'source': 'crm',
+            'user': self.api_user,
+            'pass': self.api_pass,
+            'function': function,
+            'header': 'YES'
+        }
+
+        try:
+            return parser(self._make_request(self.api_url, params))
+        except VicidialResponseError as e:
+            print(f"❌ Error en {function}: {e}")
+            return None
+
+    def list_campaigns(self):
+        """Campañas parseadas (caché con TTL y stale-while-revalidate)"""
+        return self.reference_cache.get(
+            'campaigns_list', lambda: self._fetch_parsed('campaigns_list', parse_campaigns)
+        ) or []
+
+    def list_inbound_groups(self):
+        """Grupos inbound parseados (caché con TTL y stale-while-revalidate)"""
+        return self.reference_cache.get(
+            'inbound_group_list', lambda: self._fetch_parsed('inbound_group_list', parse_inbound_groups)
+        ) or []
+
+    def get_agent_status_info(self, user_id):
+        """Estado del agente parseado como UserStatus (None si no está logueado o hay error)"""
+        try:
+            return parse_user_status(self.get_agent_status(user_id))
+        except VicidialResponseError as e:
+            print(f"⚠️ user_status {user_id}: {e}")
+            return None
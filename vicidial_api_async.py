@@ -0,0 +1,256 @@
+import asyncio
+import random
+import time
+import aiohttp
+from circuit_breaker import get_breaker
+from config import Config
+from metrics import VICIDIAL_API_SECONDS
+from tracing import tracer
+from vicidial_api import should_retry
+
+# Timeout de conexión de aiohttp (ConnectionTimeoutError existe desde aiohttp 3.10)
+CONNECT_TIMEOUT_ERRORS = (aiohttp.ClientConnectorError,) + (
+    (aiohttp.ConnectionTimeoutError,) if hasattr(aiohttp, 'ConnectionTimeoutError') else ())
+
+
+class AsyncVicidialAPI:
+    """Variante asyncio de VicidialAPI para operaciones sobre muchos agentes
+
+    client: VicidialAPI síncrono con el que se comparten las métricas de
+    latencia por función y el caché de user_status (se olvida el estado de
+    cada agente tras cambiarlo: login, logout, pausa).
+    """
+
+    def __init__(self, concurrency=None, client=None):
+        self.host = Config.VICIDIAL_HOST
+        self.api_url = Config.VICIDIAL_API_URL
+        self.api_user = Config.VICIDIAL_API_USER
+        self.api_pass = Config.VICIDIAL_API_PASS
+        self.concurrency = concurrency or Config.VICIDIAL_API_ASYNC_CONCURRENCY
+        self.max_retries = Config.VICIDIAL_API_MAX_RETRIES
+        self.backoff_base = Config.VICIDIAL_API_BACKOFF_BASE
+        self.backoff_max = Config.VICIDIAL_API_BACKOFF_MAX
+        self.breaker = get_breaker('vicidial_api')
+        self.client = client
+        self.session = None
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def open(self):
+        """Crear sesión HTTP con pool keep-alive"""
+        if self.session is None:
+            connector = aiohttp.TCPConnector(limit=Config.VICIDIAL_API_POOL_MAXSIZE, keepalive_timeout=30)
+            timeout = aiohttp.ClientTimeout(
+                connect=Config.VICIDIAL_API_CONNECT_TIMEOUT,
+                sock_read=Config.VICIDIAL_API_READ_TIMEOUT
+            )
+            self.session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    def _params(self, function, **extra):
+        """Parámetros comunes de non_agent_api.php"""
+        params = {
+            'version': '2.14',
+            'source': 'crm',
+            'user': self.api_user,
+            'pass': self.api_pass,
+            'function': function
+        }
+        params.update({key: str(value) for key, value in extra.items() if value is not None})
+        return params
+
+    async def _make_request(self, params):
+        """Hacer petición a la API de Vicidial (mismos reintentos, métricas y spans que VicidialAPI)"""
+        await self.open()
+        function = params['function']
+
+        # Falla rápido (CircuitOpenError) si non_agent_api.php está caído
+        self.breaker.before_call()
+
+        with tracer.span(f'api:{function}') as span:
+            return await self._request_with_retries(params, function, span)
+
+    def _record_latency(self, function, start, retries, ok):
+        if self.client is not None:
+            self.client.record_latency(function, start, retries, ok)
+        else:
+            VICIDIAL_API_SECONDS.observe(time.perf_counter() - start, function, 'ok' if ok else 'error')
+
+    async def _request_with_retries(self, params, function, span):
+        start = time.perf_counter()
+        attempt = 0
+
+        while True:
+            try:
+                async with self.session.get(self.api_url, params=params) as response:
+                    response.raise_for_status()
+                    text = await response.text()
+                self._record_latency(function, start, attempt, ok=True)
+                self.breaker.record_success(time.perf_counter() - start)
+                span.set(attempts=attempt + 1, status=response.status)
+                return text
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                status = e.status if isinstance(e, aiohttp.ClientResponseError) else None
+                if not should_retry(function, attempt, self.max_retries,
+                                    connect_timeout=isinstance(e, CONNECT_TIMEOUT_ERRORS), status=status):
+                    self._record_latency(function, start, attempt, ok=False)
+                    span.set(attempts=attempt + 1, error=str(e))
+                    if status is not None and status < 500:
+                        # El host respondió: un 4xx no indica que la dependencia esté caída
+                        self.breaker.record_success()
+                    else:
+                        self.breaker.record_failure(e)
+                    print(f"Error en petición async a Vicidial ({function}): {e}")
+                    return None
+
+                attempt += 1
+                await asyncio.sleep(random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt))))
+
+    # Mismas funciones que VicidialAPI
+
+    async def create_agent(self, agent_data):
+        """Crear agente en Vicidial"""
+        return await self._make_request(self._params(
+            'add_user',
+            agent_user=agent_data['vicidial_user'],
+            agent_pass=agent_data['vicidial_user_pass'],
+            agent_user_level=agent_data.get('vicidial_user_level', 1),
+            agent_full_name=f"{agent_data.get('name', '')}",
+            agent_user_group=agent_data.get('vicidial_user_group', 'ADMIN'),
+            agent_phone_login=agent_data['vicidial_phone_login'],
+            agent_phone_pass=agent_data['vicidial_phone_pass']
+        ))
+
+    async def create_phone(self, phone_data):
+        """Crear teléfono en Vicidial"""
+        return await self._make_request(self._params(
+            'add_phone',
+            extension=phone_data['vicidial_phone_login'],
+            dialplan_number=phone_data['vicidial_phone_login'],
+            voicemail_id=phone_data['vicidial_phone_login'],
+            phone_login=phone_data['vicidial_phone_login'],
+            phone_pass=phone_data['vicidial_phone_pass'],
+            server_ip='195.26.249.9',
+            protocol='SIP',
+            registration_password=phone_data['vicidial_phone_pass'],
+            phone_full_name=f"Phone {phone_data['vicidial_phone_login']}",
+            local_gmt='-5.00',
+            outbound_cid='5551234567'
+        ))
+
+    async def update_user_phone(self, agent_data):
+        """Actualizar usuario para agregar phone_login y phone_pass"""
+        return await self._make_request(self._params(
+            'update_user',
+            agent_user=agent_data['vicidial_user'],
+            phone_login=agent_data['vicidial_phone_login'],
+            phone_pass=agent_data['vicidial_phone_pass'],
+            full_name=f"{agent_data.get('name', '')}",
+            user_level=agent_data.get('vicidial_user_level', 1),
+            user_group=agent_data.get('vicidial_user_group', 'ADMIN')
+        ))
+
+    async def create_agent_complete(self, agent_data):
+        """Crear agente y teléfono en Vicidial (en orden: usuario, teléfono, actualización)"""
+        return {
+            'user_response': await self.create_agent(agent_data),
+            'phone_response': await self.create_phone(agent_data),
+            'update_response': await self.update_user_phone(agent_data)
+        }
+
+    async def delete_agent(self, user_id):
+        """Eliminar agente de Vicidial"""
+        return await self._make_request(self._params('delete_user', user_id=user_id))
+
+    async def _change_agent_state(self, user_id, params):
+        """Pedido que cambia el estado del agente; después se descarta el user_status guardado"""
+        try:
+            return await self._make_request(params)
+        finally:
+            if self.client is not None:
+                self.client.status_flight.forget(user_id)
+
+    async def agent_login(self, user_id, password, phone_login, phone_pass, campaign=None):
+        """Login de agente usando non_agent_api.php"""
+        return await self._change_agent_state(user_id, self._params(
+            'external_login',
+            user_id=user_id,
+            password=password,
+            phone_login=phone_login,
+            phone_pass=phone_pass,
+            campaign=campaign or None
+        ))
+
+    async def agent_logout(self, user_id):
+        """Logout de agente usando non_agent_api.php"""
+        return await self._change_agent_state(user_id, self._params('external_logout', user_id=user_id))
+
+    async def set_agent_status(self, user_id, status, pause_code=None):
+        """Cambiar estado del agente (READY, PAUSED, etc.)"""
+        return await self._change_agent_state(user_id, self._params(
+            'change_agent_status',
+            user_id=user_id,
+            status=status,
+            pause_code=pause_code if status == 'PAUSED' else None
+        ))
+
+    async def get_agent_status(self, user_id):
+        """Obtener estado actual del agente"""
+        return await self._make_request(self._params('user_status', user_id=user_id))
+
+    async def get_campaigns(self):
+        """Obtener lista de campañas"""
+        return await self._make_request(self._params('campaigns_list'))
+
+    async def get_inbound_groups(self):
+        """Obtener grupos de entrada (closer groups)"""
+        return await self._make_request(self._params('inbound_group_list'))
+
+    # Fan-out con concurrencia acotada
+
+    async def fan_out(self, items, func):
+        """Ejecutar func(item) para cada item; produce (item, resultado) a medida que terminan"""
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def run(item):
+            async with semaphore:
+                try:
+                    return item, await func(item)
+                except Exception as e:
+                    return item, e
+
+        for next_done in asyncio.as_completed([run(item) for item in items]):
+            yield await next_done
+
+    def get_many_agent_statuses(self, user_ids):
+        """Estado de muchos agentes en paralelo"""
+        return self.fan_out(user_ids, self.get_agent_status)
+
+    def logout_many(self, user_ids):
+        """external_logout de muchos agentes en paralelo"""
+        return self.fan_out(user_ids, self.agent_logout)
+
+    def set_status_many(self, user_ids, status, pause_code=None):
+        """change_agent_status para todo un equipo en paralelo"""
+        return self.fan_out(user_ids, lambda user_id: self.set_agent_status(user_id, status, pause_code))
+
+
+def run_fan_out(operation, user_ids, concurrency=None, client=None, **kwargs):
+    """Ejecutar un fan-out desde código síncrono (rutas Flask); devuelve {user_id: resultado}"""
+    async def collect():
+        results = {}
+        async with AsyncVicidialAPI(concurrency, client) as api:
+            async for user_id, result in getattr(api, operation)(user_ids, **kwargs):
+                results[user_id] = result
+        return results
+
+    return asyncio.run(collect())
@@ -0,0 +1,163 @@
+import queue
+import threading
+import time
+from contextlib import contextmanager
+import pymysql
+import pymysql.cursors
+from circuit_breaker import get_breaker
+from config import Config
+from metrics import SQL_QUERY_SECONDS, query_name
+from tracing import tracer
+
+db_breaker = get_breaker('vicidial_db')
+
+
+class VicidialCursor(pymysql.cursors.Cursor):
+    """Cursor que reporta fallos y consultas lentas al circuit breaker y mide cada consulta"""
+
+    def execute(self, query, args=None):
+        name = query_name(query)
+        start = time.monotonic()
+        try:
+            with tracer.span(f'sql:{name}'):
+                result = super().execute(query, args)
+        except (pymysql.err.OperationalError, pymysql.err.InterfaceError) as e:
+            db_breaker.record_failure(e)
+            raise
+        finally:
+            SQL_QUERY_SECONDS.observe(time.monotonic() - start, name)
+        db_breaker.record_success(time.monotonic() - start)
+        return result
+
+
+class VicidialSSCursor(VicidialCursor, pymysql.cursors.SSCursor):
+    """Igual, sin buffer: para leer por lotes con fetchmany() (reportes sobre muchas filas)"""
+
+
+def get_vicidial_connection():
+    """Abrir conexión a la BD de Vicidial (falla rápido si el circuito está abierto)"""
+    db_breaker.before_call()
+    return open_vicidial_connection()
+
+
+def open_vicidial_connection():
+    """Abrir conexión registrando el resultado en el circuito, sin consultarlo antes
+
+    Para quien ya llamó a db_breaker.before_call() (el pool): una segunda
+    consulta en HALF_OPEN se rechazaría y la prueba no terminaría nunca.
+    """
+    start = time.monotonic()
+
+    try:
+        connection = pymysql.connect(
+            host=Config.VICIDIAL_DB_HOST,
+            port=Config.VICIDIAL_DB_PORT,
+            user=Config.VICIDIAL_DB_USER,
+            password=Config.VICIDIAL_DB_PASS,
+            database=Config.VICIDIAL_DB_NAME,
+            charset='utf8mb4',
+            connect_timeout=Config.VICIDIAL_DB_CONNECT_TIMEOUT,
+            read_timeout=Config.VICIDIAL_DB_READ_TIMEOUT,
+            write_timeout=Config.VICIDIAL_DB_READ_TIMEOUT,
+            cursorclass=VicidialCursor
+        )
+    except Exception as e:
+        db_breaker.record_failure(e)
+        raise
+
+    db_breaker.record_success(time.monotonic() - start)
+    return connection
+
+
+class PoolTimeoutError(Exception):
+    """No se liberó ninguna conexión del pool dentro del tiempo de espera"""
+
+
+class VicidialConnectionPool:
+    """Pool de conexiones reutilizables a la BD de Vicidial
+
+    Las conexiones se devuelven con la transacción cerrada (rollback de lo no
+    confirmado) para no arrastrar snapshots viejos. Si el bloque lanza una
+    excepción la conexión se descarta.
+    """
+
+    def __init__(self, factory=None, size=None, checkout_timeout=None, ping_after=None):
+        self.factory = factory or open_vicidial_connection
+        self.size = size or Config.VICIDIAL_DB_POOL_SIZE
+        self.checkout_timeout = checkout_timeout or Config.VICIDIAL_DB_POOL_TIMEOUT
+        self.ping_after = ping_after if ping_after is not None else Config.VICIDIAL_DB_POOL_PING_AFTER
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._lock = threading.Lock()
+        self.stats = {'created': 0, 'reused': 0, 'discarded': 0, 'timeouts': 0, 'in_use': 0}
+
+    def _checkout(self):
+        while True:
+            try:
+                connection, last_used = self._idle.get_nowait()
+            except queue.Empty:
+                break
+
+            # Conexión ociosa mucho tiempo: comprobar que el servidor no la cerró
+            if time.monotonic() - last_used > self.ping_after:
+                try:
+                    connection.ping(reconnect=False)
+                except Exception:
+                    self._discard(connection)
+                    continue
+
+            with self._lock:
+                self.stats['reused'] += 1
+            return connection
+
+        connection = self.factory()
+        with self._lock:
+            self.stats['created'] += 1
+        return connection
+
+    def _discard(self, connection):
+        with self._lock:
+            self.stats['discarded'] += 1
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    @contextmanager
+    def connection(self):
+        """with pool.connection() as connection: ..."""
+        db_breaker.before_call()
+        if not self._slots.acquire(timeout=self.checkout_timeout):
+            with self._lock:
+                self.stats['timeouts'] += 1
+            db_breaker.release()  # no llegó a MySQL: devolver el lugar de prueba de HALF_OPEN
+            raise PoolTimeoutError(f'Sin conexiones libres a Vicidial tras {self.checkout_timeout}s')
+
+        connection = None
+        try:
+            connection = self._checkout()
+            with self._lock:
+                self.stats['in_use'] += 1
+            yield connection
+        except Exception:
+            if connection is not None:
+                self._discard(connection)
+                connection = None
+            raise
+        finally:
+            if connection is not None:
+                try:
+                    connection.rollback()
+                    self._idle.put((connection, time.monotonic()))
+                except Exception:
+                    self._discard(connection)
+            with self._lock:
+                self.stats['in_use'] = max(0, self.stats['in_use'] - 1)
+            self._slots.release()
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self.stats, size=self.size, idle=self._idle.qsize())
+
+
+vicidial_pool = VicidialConnectionPool()
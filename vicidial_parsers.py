@@ -0,0 +1,148 @@
+from dataclasses import dataclass, field, asdict
+
+
+class VicidialResponseError(ValueError):
+    """Respuesta 'ERROR: ...' de non_agent_api.php"""
+
+
+# Orden de columnas por defecto de non_agent_api.php 2.14 cuando no se pide header=YES
+CAMPAIGN_COLUMNS = ('campaign_id', 'campaign_name', 'active', 'user_group', 'dial_method',
+                    'dial_level', 'lead_order', 'dial_statuses')
+INBOUND_GROUP_COLUMNS = ('group_id', 'group_name', 'group_color', 'active', 'user_group')
+USER_STATUS_COLUMNS = ('user', 'user_group', 'status', 'campaign_id', 'calls_today',
+                       'full_name', 'pause_code')
+
+
+@dataclass
+class Campaign:
+    campaign_id: str
+    campaign_name: str = ''
+    active: bool = False
+    user_group: str = ''
+    dial_method: str = ''
+    extra: dict = field(default_factory=dict)
+
+    def to_dict(self):
+        return asdict(self)
+
+
+@dataclass
+class InboundGroup:
+    group_id: str
+    group_name: str = ''
+    active: bool = False
+    user_group: str = ''
+    extra: dict = field(default_factory=dict)
+
+    def to_dict(self):
+        return asdict(self)
+
+
+@dataclass
+class UserStatus:
+    user: str
+    status: str = ''
+    campaign_id: str = ''
+    user_group: str = ''
+    calls_today: int = 0
+    full_name: str = ''
+    pause_code: str = ''
+    extra: dict = field(default_factory=dict)
+
+    def to_dict(self):
+        return asdict(self)
+
+
+def _to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+def parse_rows(text, default_columns):
+    """Convertir respuesta delimitada por '|' en lista de diccionarios
+
+    Si la primera línea es un header (header=YES) se usan sus nombres de columna.
+    """
+    if text is None:
+        raise VicidialResponseError('Sin respuesta de Vicidial')
+
+    lines = [line.strip() for line in text.strip().splitlines() if line.strip()]
+    if lines and lines[0].startswith('ERROR'):
+        raise VicidialResponseError(lines[0])
+
+    columns = default_columns
+    if lines and lines[0].split('|')[0] == default_columns[0]:
+        columns = tuple(lines[0].split('|'))
+        lines = lines[1:]
+
+    rows = []
+    for line in lines:
+        if line.startswith('SUCCESS'):
+            line = line.split(':', 1)[1].strip() if ':' in line else ''
+            if not line:
+                continue
+        values = line.split('|')
+        row = dict(zip(columns, values))
+        # Columnas sin nombre conocido se conservan por posición
+        for index in range(len(columns), len(values)):
+            row[f'field_{index}'] = values[index]
+        rows.append(row)
+
+    return rows
+
+
+def _split_known(row, known):
+    return {key: value for key, value in row.items() if key not in known}
+
+
+def parse_campaigns(text):
+    """Parsear respuesta de campaigns_list"""
+    known = ('campaign_id', 'campaign_name', 'active', 'user_group', 'dial_method')
+    return [
+        Campaign(
+            campaign_id=row.get('campaign_id', ''),
+            campaign_name=row.get('campaign_name', ''),
+            active=row.get('active') == 'Y',
+            user_group=row.get('user_group', ''),
+            dial_method=row.get('dial_method', ''),
+            extra=_split_known(row, known)
+        )
+        for row in parse_rows(text, CAMPAIGN_COLUMNS)
+    ]
+
+
+def parse_inbound_groups(text):
+    """Parsear respuesta de inbound_group_list"""
+    known = ('group_id', 'group_name', 'active', 'user_group')
+    return [
+        InboundGroup(
+            group_id=row.get('group_id', ''),
+            group_name=row.get('group_name', ''),
+            active=row.get('active') == 'Y',
+            user_group=row.get('user_group', ''),
+            extra=_split_known(row, known)
+        )
+        for row in parse_rows(text, INBOUND_GROUP_COLUMNS)
+    ]
+
+
+def parse_user_status(text):
+    """Parsear respuesta de user_status (un solo agente)"""
+    rows = parse_rows(text, USER_STATUS_COLUMNS)
+    if not rows:
+        return None
+
+    row = rows[0]
+    known = ('user', 'status', 'campaign_id', 'user_group', 'calls_today', 'full_name', 'pause_code')
+    return UserStatus(
+        user=row.get('user', ''),
+        status=row.get('status', ''),
+        campaign_id=row.get('campaign_id', ''),
+        user_group=row.get('user_group', ''),
+        calls_today=_to_int(row.get('calls_today')),
+        full_name=row.get('full_name', ''),
+        pause_code=row.get('pause_code', ''),
+        extra=_split_known(row, known)
+    )
@@ -3,28 +3,44 @@ import threading
 import time
 from datetime import datetime
 from flask_socketio import emit
+from circuit_breaker import get_breaker
+from config import Config
+from metrics import AMI_ACTION_SECONDS, AMI_EVENTS
+from profiler import profiler
+from tracing import tracer
 
 
 class VicidialRealtime:
-    def __init__(self, socketio):
+    def __init__(self, socketio, lead_lookup=None):
         self.socketio = socketio
+        self.lead_lookup = lead_lookup  # LeadLookup para el screen-pop; None lo desactiva
         self.ami = None
         self.connected = False
         self.active_calls = {}  # {channel: call_info}
+        self.breaker = get_breaker('ami')
+        self._listeners = []
 
     def connect_ami(self):
         """Conectar a AMI para eventos en tiempo real"""
         try:
+            self.breaker.before_call()
+            start = time.monotonic()
             self.ami = asterisk.manager.Manager()
-            self.ami.connect('195.26.249.9', 5038)
-            self.ami.login('cron', '1234')
+            try:
+                self.ami.connect(Config.VICIDIAL_AMI_HOST, Config.VICIDIAL_AMI_PORT)
+                self.ami.login(Config.VICIDIAL_AMI_USER, Config.VICIDIAL_AMI_SECRET)
+            except Exception as e:
+                self.breaker.record_failure(e)
+                raise
+            self.breaker.record_success(time.monotonic() - start)
             self.connected = True
 
             # Registrar eventos importantes para call center
-            self.ami.register_event('Newchannel', self.on_new_channel)
-            self.ami.register_event('Hangup', self.on_hangup)
-            self.ami.register_event('Bridge', self.on_bridge)
-            self.ami.register_event('QueueMemberStatus', self.on_queue_member_status)
+            self.ami.register_event('Newchannel', profiler.wrap('ami:Newchannel', self.on_new_channel))
+            self.ami.register_event('Hangup', profiler.wrap('ami:Hangup', self.on_hangup))
+            self.ami.register_event('Bridge', profiler.wrap('ami:Bridge', self.on_bridge))
+            self.ami.register_event('QueueMemberStatus', profiler.wrap('ami:QueueMemberStatus', self.on_queue_member_status))
+            self.ami.register_event('*', self._count_event)
 
             print("✅ AMI Tiempo Real conectado")
             return True
@@ -33,6 +49,17 @@ class VicidialRealtime:
             print(f"❌ Error conectando AMI: {e}")
             return False
 
+    def add_listener(self, callback):
+        """Registrar callback(extension, event_name) que se llama en cada evento de un agente"""
+        self._listeners.append(callback)
+
+    def _notify(self, extension, event_name):
+        for callback in self._listeners:
+            try:
+                callback(extension, event_name)
+            except Exception as e:
+                print(f"⚠️ Error en listener de tiempo real: {e}")
+
     def on_new_channel(self, event, manager):
         """Evento: Nuevo canal (llamada iniciando)"""
         try:
@@ -59,8 +86,30 @@ class VicidialRealtime:
 
             # Enviar evento WebSocket al agente específico
             self.socketio.emit('incoming_call', call_info, room=f'agent_{extension}')
+            self._notify(extension, 'incoming_call')
             print(f"📞 Nueva llamada: {caller_id} → Ext {extension}")
 
+            # Screen-pop: datos del cliente antes de que el agente conteste
+            if self.lead_lookup is not None:
+                self.lead_lookup.prefetch(caller_id, lambda lead: self._send_customer_info(channel, lead))
+
+    def _send_customer_info(self, channel, lead):
+        """Enviar el lead a la sala del agente si la llamada sigue activa"""
+        call_info = self.active_calls.get(channel)
+        if call_info is None:
+            return  # colgaron antes de terminar la búsqueda
+
+        call_info['customer'] = lead
+        extension = call_info['extension']
+        self.socketio.emit('customer_info', {
+            'channel': channel,
+            'caller_id': call_info['caller_id'],
+            'extension': extension,
+            'found': bool(lead),
+            'customer': lead
+        }, room=f'agent_{extension}')
+        self._notify(extension, 'customer_info')
+
     def on_bridge(self, event, manager):
         """Evento: Llamada conectada (agente contestó)"""
         try:
@@ -88,8 +137,10 @@ class VicidialRealtime:
                 'channel': agent_channel,
                 'extension': extension,
                 'status': 'connected',
-                'connect_time': self.active_calls[agent_channel]['connect_time']
+                'connect_time': self.active_calls[agent_channel]['connect_time'],
+                'customer': self.active_calls[agent_channel].get('customer')
             }, room=f'agent_{extension}')
+            self._notify(extension, 'call_connected')
 
             print(f"✅ Llamada conectada: Ext {extension}")
 
@@ -113,6 +164,7 @@ class VicidialRealtime:
                 'cause': cause,
                 'end_time': datetime.now().strftime('%H:%M:%S')
             }, room=f'agent_{extension}')
+            self._notify(extension, 'call_ended')
 
             # Remover de llamadas activas
             del self.active_calls[channel]
@@ -136,16 +188,32 @@ class VicidialRealtime:
                 'status': status,
                 'timestamp': datetime.now().strftime('%H:%M:%S')
             })
+            self._notify(extension, 'agent_status_change')
 
             print(f"👤 Estado agente {extension}: {status}")
 
+    def _send_action(self, action):
+        """Enviar acción AMI protegida por el circuit breaker"""
+        start = time.monotonic()
+        outcome = 'error'
+        try:
+            with tracer.span(f"ami:{action.get('Action', 'unknown')}"):
+                response = self.breaker.call(self.ami.send_action, action)
+            outcome = 'ok'
+            return response
+        finally:
+            AMI_ACTION_SECONDS.observe(time.monotonic() - start, action.get('Action', 'unknown'), 'realtime', outcome)
+
+    def _count_event(self, event, manager):
+        AMI_EVENTS.inc(event.name, 'realtime')
+
     def start_recording(self, channel, filename):
         """Iniciar grabación manual"""
         if not self.connected:
             return {'success': False, 'message': 'AMI no conectado'}
 
         try:
-            response = self.ami.send_action({
+            response = self._send_action({
                 'Action': 'Monitor',
                 'Channel': channel,
                 'File': filename,
@@ -164,7 +232,7 @@ class VicidialRealtime:
             return {'success': False, 'message': 'AMI no conectado'}
 
         try:
-            response = self.ami.send_action({
+            response = self._send_action({
                 'Action': 'StopMonitor',
                 'Channel': channel
             })
@@ -180,7 +248,7 @@ class VicidialRealtime:
             return {'success': False, 'message': 'AMI no conectado'}
 
         try:
-            response = self.ami.send_action({
+            response = self._send_action({
                 'Action': 'Transfer',
                 'Channel': channel,
                 'Exten': target_extension,
@@ -199,7 +267,7 @@ class VicidialRealtime:
             return {'success': False, 'message': 'AMI no conectado'}
 
         try:
-            response = self.ami.send_action({
+            response = self._send_action({
                 'Action': 'Hangup',
                 'Channel': channel
             })
@@ -215,7 +283,7 @@ class VicidialRealtime:
             return []
 
         try:
-            response = self.ami.send_action({
+            response = self._send_action({
                 'Action': 'CoreShowChannels'
             })
 
@@ -0,0 +1,219 @@
+import argparse
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+
+class StubState:
+    """Estado en memoria del Vicidial simulado"""
+
+    def __init__(self):
+        self.users = {}
+        self.phones = {}
+        self.live_agents = {}  # {user: {'status', 'campaign_id', 'pause_code', 'calls_today'}}
+        self.campaigns = [
+            ('DEMOIN', 'Demo Inbound', 'Y', 'ADMIN', 'INBOUND_MAN'),
+            ('DEMOOUT', 'Demo Outbound', 'Y', 'ADMIN', 'RATIO')
+        ]
+        self.inbound_groups = [
+            ('colain', 'Cola A', 'blue', 'Y', 'ADMIN'),
+            ('DEMOIN', 'Demo In', 'green', 'Y', 'ADMIN')
+        ]
+        self.lock = threading.Lock()
+        self.requests = 0
+
+
+class VicidialStubServer:
+    """Servidor HTTP local que emula non_agent_api.php para pruebas y benchmarks
+
+    latency_ms / jitter_ms: latencia simulada por petición
+    error_rate: fracción de peticiones que responden HTTP 500
+    api_error_rate: fracción de peticiones que responden 'ERROR: ...' con HTTP 200
+    """
+
+    def __init__(self, host='127.0.0.1', port=8765, latency_ms=0, jitter_ms=0,
+                 error_rate=0.0, api_error_rate=0.0):
+        self.host = host
+        self.port = port
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.api_error_rate = api_error_rate
+        self.state = StubState()
+        self.httpd = None
+        self.thread = None
+
+    @property
+    def url(self):
+        return f'http://{self.host}:{self.port}/vicidial/non_agent_api.php'
+
+    def start(self):
+        """Iniciar servidor en un hilo en segundo plano"""
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                stub._handle(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.httpd.daemon_threads = True
+        self.port = self.httpd.server_address[1]
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name='vicidial-stub')
+        self.thread.daemon = True
+        self.thread.start()
+        print(f"🧪 Vicidial simulado escuchando en {self.url}")
+        return self
+
+    def stop(self):
+        if self.httpd:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+
+    def _handle(self, handler):
+        parsed = urlparse(handler.path)
+        params = {key: values[0] for key, values in parse_qs(parsed.query).items()}
+
+        with self.state.lock:
+            self.state.requests += 1
+
+        delay = self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)
+        if delay > 0:
+            time.sleep(delay / 1000)
+
+        if not parsed.path.endswith('non_agent_api.php'):
+            self._respond(handler, 404, 'Not Found')
+            return
+
+        if random.random() < self.error_rate:
+            self._respond(handler, 500, 'Internal Server Error')
+            return
+
+        function = params.get('function', '')
+        if random.random() < self.api_error_rate:
+            self._respond(handler, 200, f'ERROR: {function} SIMULATED ERROR')
+            return
+
+        method = getattr(self, f'_fn_{function}', None)
+        if method is None:
+            self._respond(handler, 200, f'ERROR: {function} FUNCTION NOT FOUND')
+            return
+
+        with self.state.lock:
+            body = method(params)
+        self._respond(handler, 200, body)
+
+    def _respond(self, handler, status, body):
+        data = (body + '\n').encode('utf-8')
+        handler.send_response(status)
+        handler.send_header('Content-Type', 'text/plain; charset=utf-8')
+        handler.send_header('Content-Length', str(len(data)))
+        handler.end_headers()
+        handler.wfile.write(data)
+
+    # Funciones emuladas (se ejecutan con state.lock tomado)
+
+    def _fn_version(self, params):
+        return 'VERSION: 2.14-stub|BUILD: stub'
+
+    def _fn_add_user(self, params):
+        user = params.get('agent_user', '')
+        if user in self.state.users:
+            return f'ERROR: add_user USER ALREADY EXISTS - {user}'
+        self.state.users[user] = dict(params)
+        return f"SUCCESS: add_user USER HAS BEEN ADDED - {user}|{params.get('agent_pass', '')}"
+
+    def _fn_add_phone(self, params):
+        extension = params.get('extension', '')
+        if extension in self.state.phones:
+            return f'ERROR: add_phone PHONE ALREADY EXISTS - {extension}'
+        self.state.phones[extension] = dict(params)
+        return f'SUCCESS: add_phone PHONE HAS BEEN ADDED - {extension}'
+
+    def _fn_update_user(self, params):
+        user = params.get('agent_user') or params.get('user_id', '')
+        if user not in self.state.users:
+            return f'ERROR: update_user USER DOES NOT EXIST - {user}'
+        self.state.users[user].update(params)
+        return f'SUCCESS: update_user USER HAS BEEN UPDATED - {user}'
+
+    def _fn_delete_user(self, params):
+        user = params.get('user_id', '')
+        self.state.users.pop(user, None)
+        self.state.live_agents.pop(user, None)
+        return f'SUCCESS: delete_user USER HAS BEEN DELETED - {user}'
+
+    def _fn_external_login(self, params):
+        user = params.get('user_id', '')
+        self.state.live_agents[user] = {
+            'status': 'READY',
+            'campaign_id': params.get('campaign', 'DEMOIN'),
+            'pause_code': '',
+            'calls_today': 0
+        }
+        return f'SUCCESS: external_login AGENT LOGGED IN - {user}'
+
+    def _fn_external_logout(self, params):
+        user = params.get('user_id', '')
+        if self.state.live_agents.pop(user, None) is None:
+            return f'ERROR: external_logout AGENT NOT LOGGED IN - {user}'
+        return f'SUCCESS: external_logout AGENT LOGGED OUT - {user}'
+
+    def _fn_change_agent_status(self, params):
+        user = params.get('user_id', '')
+        agent = self.state.live_agents.get(user)
+        if agent is None:
+            return f'ERROR: change_agent_status AGENT NOT LOGGED IN - {user}'
+        agent['status'] = params.get('status', 'READY')
+        agent['pause_code'] = params.get('pause_code', '')
+        return f"SUCCESS: change_agent_status AGENT STATUS CHANGED - {user}|{agent['status']}"
+
+    def _fn_user_status(self, params):
+        user = params.get('user_id', '')
+        agent = self.state.live_agents.get(user)
+        if agent is None:
+            return f'ERROR: user_status USER NOT LOGGED IN - {user}'
+        user_group = self.state.users.get(user, {}).get('agent_user_group', 'ADMIN')
+        full_name = self.state.users.get(user, {}).get('agent_full_name', user)
+        return (f"{user}|{user_group}|{agent['status']}|{agent['campaign_id']}|"
+                f"{agent['calls_today']}|{full_name}|{agent['pause_code']}")
+
+    def _fn_campaigns_list(self, params):
+        lines = ['|'.join(row) for row in self.state.campaigns]
+        if params.get('header') == 'YES':
+            lines.insert(0, 'campaign_id|campaign_name|active|user_group|dial_method')
+        return '\n'.join(lines)
+
+    def _fn_inbound_group_list(self, params):
+        lines = ['|'.join(row) for row in self.state.inbound_groups]
+        if params.get('header') == 'YES':
+            lines.insert(0, 'group_id|group_name|group_color|active|user_group')
+        return '\n'.join(lines)
+
+
+# Uso por línea de comandos
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Servidor local que emula non_agent_api.php')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency-ms', type=float, default=20)
+    parser.add_argument('--jitter-ms', type=float, default=10)
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fracción de respuestas HTTP 500')
+    parser.add_argument('--api-error-rate', type=float, default=0.0, help="Fracción de respuestas 'ERROR:'")
+    args = parser.parse_args()
+
+    server = VicidialStubServer(args.host, args.port, args.latency_ms, args.jitter_ms,
+                                args.error_rate, args.api_error_rate).start()
+    print(f"   Exporta VICIDIAL_API_URL={server.url} para apuntar el CRM aquí. Ctrl+C para salir...")
+
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,199 @@
+-- Esquema mínimo de Vicidial para pruebas de carga contra un MariaDB/MySQL local.
+-- Solo las tablas y columnas que usa el CRM (tipos e índices como en Vicidial).
+-- Uso: mysql -u root vicidial_test < vicidial_test_schema.sql  (load_test.py lo carga al iniciar)
+
+CREATE TABLE IF NOT EXISTS vicidial_users (
+    user_id INT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+    user VARCHAR(20) NOT NULL,
+    pass VARCHAR(100) NOT NULL DEFAULT '',
+    full_name VARCHAR(50) NOT NULL DEFAULT '',
+    user_level TINYINT UNSIGNED NOT NULL DEFAULT 1,
+    user_group VARCHAR(20) NOT NULL DEFAULT 'ADMIN',
+    closer_campaigns TEXT,
+    active ENUM('Y', 'N') NOT NULL DEFAULT 'Y',
+    UNIQUE KEY user (user)
+);
+
+CREATE TABLE IF NOT EXISTS vicidial_user_groups (
+    user_group VARCHAR(20) NOT NULL PRIMARY KEY,
+    group_name VARCHAR(40) NOT NULL DEFAULT '',
+    allowed_campaigns TEXT,
+    closer_campaigns TEXT
+);
+
+CREATE TABLE IF NOT EXISTS vicidial_live_agents (
+    live_agent_id INT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+    user VARCHAR(20),
+    server_ip VARCHAR(15) NOT NULL DEFAULT '',
+    conf_exten VARCHAR(20),
+    extension VARCHAR(100),
+    status ENUM('READY', 'QUEUE', 'INCALL', 'PAUSED', 'CLOSER', 'MQUEUE') DEFAULT 'PAUSED',
+    lead_id INT UNSIGNED NOT NULL DEFAULT 0,
+    campaign_id VARCHAR(20),
+    uniqueid VARCHAR(20),
+    callerid VARCHAR(20),
+    channel VARCHAR(100),
+    random_id INT UNSIGNED,
+    last_call_time DATETIME,
+    last_update_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    last_call_finish DATETIME,
+    closer_campaigns TEXT,
+    call_server_ip VARCHAR(15),
+    user_level INT(2) DEFAULT 0,
+    comments VARCHAR(255),
+    calls_today SMALLINT UNSIGNED DEFAULT 0,
+    pause_code VARCHAR(6) DEFAULT '',
+    last_state_change DATETIME,
+    agent_log_id INT UNSIGNED DEFAULT 0,
+    KEY random_id (random_id),
+    KEY last_call_time (last_call_time),
+    KEY last_update_time (last_update_time),
+    KEY last_call_finish (last_call_finish),
+    KEY user (user)
+);
+
+CREATE TABLE IF NOT EXISTS vicidial_agent_log (
+    agent_log_id INT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+    user VARCHAR(20),
+    server_ip VARCHAR(15) NOT NULL DEFAULT '',
+    event_time DATETIME,
+    lead_id INT UNSIGNED,
+    campaign_id VARCHAR(20),
+    pause_epoch INT UNSIGNED,
+    pause_sec SMALLINT UNSIGNED DEFAULT 0,
+    wait_epoch INT UNSIGNED,
+    wait_sec SMALLINT UNSIGNED DEFAULT 0,
+    talk_epoch INT UNSIGNED,
+    talk_sec SMALLINT UNSIGNED DEFAULT 0,
+    dispo_epoch INT UNSIGNED,
+    dispo_sec SMALLINT UNSIGNED DEFAULT 0,
+    status VARCHAR(6),
+    user_group VARCHAR(20),
+    comments VARCHAR(255),
+    sub_status VARCHAR(6),
+    KEY ual (user, agent_log_id),
+    KEY user (user),
+    KEY event_time (event_time)
+);
+
+CREATE TABLE IF NOT EXISTS vicidial_list (
+    lead_id INT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+    entry_date DATETIME,
+    status VARCHAR(6),
+    user VARCHAR(20),
+    list_id BIGINT UNSIGNED NOT NULL DEFAULT 0,
+    phone_number VARCHAR(18) NOT NULL DEFAULT '',
+    first_name VARCHAR(30),
+    last_name VARCHAR(30),
+    address1 VARCHAR(100),
+    city VARCHAR(50),
+    state VARCHAR(2),
+    KEY phone_number (phone_number),
+    KEY list_id (list_id)
+);
+
+CREATE TABLE IF NOT EXISTS vicidial_auto_calls (
+    auto_call_id INT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+    server_ip VARCHAR(15) NOT NULL DEFAULT '',
+    campaign_id VARCHAR(20),
+    status ENUM('SENT', 'RINGING', 'LIVE', 'XFER', 'PAUSED', 'CLOSER', 'BUSY', 'DISCONNECT', 'IVR', 'QUEUE', 'INCALL', 'RING') DEFAULT 'PAUSED',
+    lead_id INT UNSIGNED NOT NULL DEFAULT 0,
+    uniqueid VARCHAR(20),
+    callerid VARCHAR(20),
+    channel VARCHAR(100),
+    phone_code VARCHAR(10),
+    phone_number VARCHAR(18),
+    call_time DATETIME,
+    call_type ENUM('IN', 'OUT', 'OUTBALANCE') DEFAULT 'OUT',
+    stage VARCHAR(20) DEFAULT 'START',
+    last_update_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    queue_priority TINYINT(2) DEFAULT 0,
+    agent_user VARCHAR(20) DEFAULT '',
+    start_time DATETIME,
+    KEY uniqueid (uniqueid),
+    KEY callerid (callerid),
+    KEY call_time (call_time),
+    KEY last_update_time (last_update_time)
+);
+
+CREATE TABLE IF NOT EXISTS vicidial_call_log (
+    uniqueid VARCHAR(20) PRIMARY KEY NOT NULL,
+    channel VARCHAR(100),
+    server_ip VARCHAR(15),
+    lead_id INT UNSIGNED,
+    campaign_id VARCHAR(20),
+    user VARCHAR(20),
+    phone_number VARCHAR(18),
+    start_time DATETIME,
+    end_time DATETIME,
+    length_in_sec INT(10),
+    status VARCHAR(6),
+    KEY lead_id (lead_id),
+    KEY start_time (start_time)
+);
+
+CREATE TABLE IF NOT EXISTS vicidial_closer_log (
+    closecallid INT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+    lead_id INT UNSIGNED NOT NULL,
+    campaign_id VARCHAR(20),
+    call_date DATETIME,
+    start_epoch INT UNSIGNED,
+    end_epoch INT UNSIGNED,
+    length_in_sec INT(10),
+    status VARCHAR(6),
+    phone_number VARCHAR(18),
+    user VARCHAR(20),
+    queue_seconds DECIMAL(7,2) DEFAULT 0,
+    term_reason ENUM('CALLER', 'AGENT', 'QUEUETIMEOUT', 'ABANDON', 'AFTERHOURS', 'HOLDRECALLXFER',
+                     'HOLDTIME', 'NOAGENT', 'NONE', 'MAXCALLS', 'ACFILTER', 'CLOSETIME') DEFAULT 'NONE',
+    uniqueid VARCHAR(50) NOT NULL DEFAULT '',
+    KEY lead_id (lead_id),
+    KEY call_date (call_date),
+    KEY campaign_id (campaign_id)
+);
+
+CREATE TABLE IF NOT EXISTS vicidial_log (
+    uniqueid VARCHAR(50) PRIMARY KEY NOT NULL,
+    lead_id INT UNSIGNED NOT NULL,
+    campaign_id VARCHAR(20),
+    event_time DATETIME,
+    user VARCHAR(20),
+    status VARCHAR(6),
+    phone_number VARCHAR(18),
+    comments VARCHAR(255),
+    KEY lead_id (lead_id),
+    KEY event_time (event_time)
+);
+
+CREATE TABLE IF NOT EXISTS vicidial_inbound_groups (
+    group_id VARCHAR(20) PRIMARY KEY NOT NULL,
+    group_name VARCHAR(30),
+    group_color VARCHAR(7),
+    active ENUM('Y', 'N'),
+    campaign_id VARCHAR(20),
+    agent_search_method VARCHAR(20) DEFAULT 'LB',
+    call_time_id VARCHAR(20) DEFAULT '24hours',
+    get_call_launch VARCHAR(20) DEFAULT 'NONE',
+    after_hours_action VARCHAR(20) DEFAULT 'MESSAGE',
+    no_agent_action VARCHAR(20) DEFAULT 'MESSAGE'
+);
+
+CREATE TABLE IF NOT EXISTS vicidial_inbound_dids (
+    did_id INT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+    did_pattern VARCHAR(50) NOT NULL,
+    did_description VARCHAR(50),
+    active ENUM('Y', 'N') DEFAULT 'Y',
+    did_route VARCHAR(20) DEFAULT 'EXTEN',
+    extension VARCHAR(50) DEFAULT '9998811112',
+    group_id VARCHAR(20),
+    UNIQUE KEY did_pattern (did_pattern)
+);
+
+INSERT IGNORE INTO vicidial_user_groups (user_group, group_name, allowed_campaigns, closer_campaigns)
+VALUES ('ADMIN', 'Administrators', 'DEMOIN', ' colain ');
+
+INSERT IGNORE INTO vicidial_inbound_groups (group_id, group_name, group_color, active, campaign_id)
+VALUES ('colain', 'Cola A', 'blue', 'Y', 'DEMOIN');
+
+INSERT IGNORE INTO vicidial_inbound_dids (did_pattern, did_description, did_route, group_id)
+VALUES ('5114125924', 'DID principal', 'IN_GROUP', 'colain');